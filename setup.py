@@ -27,7 +27,7 @@ CLASSIFIERS = [
 ]
 INSTALL_REQUIRES = [
     'argparse',  # Python command-line parsing library
-    'pyserial', # Python Serial Port Extension
+    'pyserial>=3.3', # Python Serial Port Extension
     'six',  # Python 2 and 3 compatibility utilities
     'pygcode>=0.1.2', # Basic g-code parser, interpreter, and encoder library
 ]
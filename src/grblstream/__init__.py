@@ -24,7 +24,26 @@ __copyright__ = "Copyright (c) 2017 {0}".format(__author__)
 __all__ = [
     # modules
     'arduino_tools',
+    'benchmark',
     'config',
+    'discovery',
+    'encode',
+    'engine',
+    'estimate',
+    'farm',
+    'flowcontrol',
+    'headless',
+    'instrument',
+    'jobcache',
+    'journal',
+    'merge',
+    'pipeline',
+    'polling',
+    'replay',
+    'seriallog',
+    'simulator',
+    'source',
+    'status',
     'streamer',
     'widget',
     'window',
@@ -33,7 +52,26 @@ __all__ = [
 
 # modules
 import arduino_tools
+import benchmark
 import config
+import discovery
+import encode
+import engine
+import estimate
+import farm
+import flowcontrol
+import headless
+import instrument
+import jobcache
+import journal
+import merge
+import pipeline
+import polling
+import replay
+import seriallog
+import simulator
+import source
+import status
 import streamer
 import widget
 import window
@@ -1,6 +1,8 @@
 import argparse
 import re
 
+from .discovery import discover, DEFAULT_CACHE_FILE, PROBE_TIMEOUT
+
 # ---------------- Arduino Util ---------------------
 def arduino_comports():
     """
@@ -20,30 +22,34 @@ def arduino_comports():
                 yield comport
 
 
-def device_type(value):
+def device_type(value, cache_file=DEFAULT_CACHE_FILE, timeout=PROBE_TIMEOUT):
     """
     Use as a 'type' for argparse parameter
+    :param value: serial device, Arduino's serial number, or None (the one
+                  GRBL device connected)
+    :param cache_file: discovery cache (see discovery.discover)
+    :param timeout: time to wait for each device's response (unit: sec)
     """
 
-    def _safe_comport_wrapper(key):
-        # define comports list
+    def _safe_discover(serial_number=None):
         try:
-            comports = [cp for cp in arduino_comports() if key(cp)]
+            devices = discover(serial_number=serial_number, cache_file=cache_file, timeout=timeout)
         except Exception:
-            print("ERROR: could not utilise serial library to find connected Arduino "
+            print("ERROR: could not utilise serial library to find connected GRBL device "
                   "(for given device: %s) just try the serial device (eg: /dev/ttyACM0)" % value)
             raise
-        if len(comports) == 1:
-            # exchange serial number for serial device Arduino is connected to
-            return comports[0]
+        if len(devices) == 1:
+            # exchange serial number for serial device GRBL is connected to
+            return devices[0]
+        elif len(devices) > 1:
+            raise argparse.ArgumentTypeError("found %i GRBL devices (%s), specify one with --device" % (
+                len(devices), ', '.join(d.device for d in devices)))
         else:
-            raise argparse.ArgumentTypeError("could not find Arduino from '%s', just try the serial device (eg: /dev/ttyACM0)" % value)
+            raise argparse.ArgumentTypeError("could not find GRBL device from '%s', just try the serial device (eg: /dev/ttyACM0)" % value)
 
     if value is None:
-        comport = _safe_comport_wrapper(lambda cp: True) # all
-        value = comport.device
+        value = _safe_discover().device
     elif re.search(r'^[0-9a-f]{15,25}$', value, re.IGNORECASE):
-        comport = _safe_comport_wrapper(lambda cp: cp.serial_number.upper() == value.upper())
-        value = comport.device
+        value = _safe_discover(serial_number=value).device
 
     return value
@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+import subprocess
+
+from .simulator import GRBLSimulator
+from .streamer import SerialPort, GCodeStreamer
+from .engine import StreamEngine
+
+
+# Streaming throughput benchmarks.
+#
+# Description:
+#   Streams generated (but realistic) workloads through SerialPort &
+#   GCodeStreamer into a simulated GRBL device, and reports:
+#       - lines/sec & bytes/sec
+#       - time from 'ok' to the next transmission (mean & p99)
+#       - GRBL RX buffer fill (as tracked by the streamer) over time
+#       - time GRBL's planner was starved of blocks
+#   Results are written as json, so they can be compared between commits.
+#
+# Usage:
+#   $ python -m grblstream.benchmark --output bench.json
+#   $ python -m grblstream.benchmark --compare bench.json  # exits 1 on regression
+
+
+# ================== Workloads ==================
+# Each workload is a function returning a list of gcode lines.
+
+def surfacing_workload(lines=5000, step=0.05, seed=0):
+    """
+    Dense 3D surfacing: raster passes of tiny G1 segments following a
+    bumpy surface.
+    """
+    rand = random.Random(seed)
+    phases = [rand.uniform(0, math.pi) for i in range(3)]
+    gcodes = ['G21 G90 G17', 'G0 Z5', 'G0 X0 Y0', 'M3 S10000', 'G1 Z0 F500', 'G1 F2000']
+    (x, y, direction) = (0.0, 0.0, 1)
+    while len(gcodes) < lines:
+        x += step * direction
+        if not (0 <= x <= 50):
+            direction = -direction
+            x += step * direction
+            y += 0.5
+        z = -1 + (0.5 * math.sin((x / 3.0) + phases[0]) * math.cos((y / 5.0) + phases[1]))
+        gcodes.append('G1 X%.4f Y%.4f Z%.4f' % (x, y, z))
+    gcodes += ['G0 Z5', 'M5']
+    return gcodes
+
+
+def arcs_workload(lines=2000, seed=0):
+    """
+    Long arc-heavy path: chains of G2/G3 arcs (IJ format) of varying radius.
+    """
+    rand = random.Random(seed)
+    gcodes = ['G21 G90 G17', 'G0 Z5', 'G0 X0 Y0', 'M3 S10000', 'G1 Z-1 F500', 'G1 F1500']
+    (x, y) = (0.0, 0.0)
+    while len(gcodes) < lines:
+        radius = rand.uniform(0.5, 20)
+        angle = rand.uniform(0, 2 * math.pi)
+        sweep = rand.uniform(0.2, math.pi)
+        (cx, cy) = (x + radius * math.cos(angle), y + radius * math.sin(angle))
+        end_angle = (angle + math.pi) + (sweep if rand.random() < 0.5 else -sweep)
+        (ex, ey) = (cx + radius * math.cos(end_angle), cy + radius * math.sin(end_angle))
+        gcodes.append('G%i X%.4f Y%.4f I%.4f J%.4f' % (
+            rand.choice([2, 3]), ex, ey, cx - x, cy - y,
+        ))
+        (x, y) = (ex, ey)
+    gcodes += ['G0 Z5', 'M5']
+    return gcodes
+
+
+def comments_workload(lines=3000, seed=0):
+    """
+    Heavily commented file: whole-line comments, inline comments, and blank
+    lines between short moves.
+    """
+    rand = random.Random(seed)
+    gcodes = ['(header: generated by some CAM post)', 'G21 G90', 'G0 Z5', 'M3 S10000']
+    i = 0
+    while len(gcodes) < lines:
+        i += 1
+        choice = rand.random()
+        if choice < 0.3:
+            gcodes.append('(operation %i: pocket %i, tool #%i, stock to leave 0.1mm)' % (i, i % 17, i % 3))
+        elif choice < 0.4:
+            gcodes.append('')
+        elif choice < 0.5:
+            gcodes.append('; segment %i' % i)
+        else:
+            gcodes.append('G1 X%.3f Y%.3f F1200 (seg %i)' % (
+                rand.uniform(0, 100), rand.uniform(0, 100), i,
+            ))
+    gcodes += ['G0 Z5', 'M5']
+    return gcodes
+
+
+WORKLOADS = {
+    'surfacing': surfacing_workload,
+    'arcs': arcs_workload,
+    'comments': comments_workload,
+}
+
+
+# ================== Benchmark Runner ==================
+
+class BenchmarkStreamer(GCodeStreamer):
+    """GCodeStreamer recording transmission timing"""
+    def __init__(self, *largs, **kwargs):
+        super(BenchmarkStreamer, self).__init__(*largs, **kwargs)
+        self.response_time = None  # time last response was received
+        self.latencies = []  # response -> next transmission (sec)
+        self.fill_samples = []  # (time, used_buffer)
+        self.bytes_sent = 0
+
+    def process_response(self, response):
+        self.response_time = response_time = time.time()
+        super(BenchmarkStreamer, self).process_response(response)
+        self.fill_samples.append((response_time, self.used_buffer))
+
+    def _transmit(self, lines):
+        super(BenchmarkStreamer, self)._transmit(lines)
+        now = time.time()
+        if self.response_time is not None:
+            self.latencies.append(now - self.response_time)
+            self.response_time = None
+        size = sum(l.size for l in lines)
+        self.bytes_sent += size
+        self.fill_samples.append((now, self.used_buffer + size))
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round((p / 100.0) * (len(values) - 1)))]
+
+
+def _downsample(samples, start_time, count=100):
+    """:return: list of [time_offset, used_buffer] of (about) count samples"""
+    step = max(1, len(samples) // count)
+    return [[round(t - start_time, 4), v] for (t, v) in samples[::step]]
+
+
+def run_benchmark(gcodes, baudrate=115200, block_time=0.002,
+                  max_buffer=None, pending_count=2, poll_timeout=0.05,
+                  status_interval=0.25, engine='poll', fill_buffer=False):
+    """
+    Stream gcodes to a simulated GRBL device.
+    :param gcodes: list of gcode lines
+    :param baudrate: simulated serial link speed
+    :param block_time: simulated block execution time (see GRBLSimulator)
+    :param max_buffer: GCodeStreamer's max_buffer
+    :param pending_count: lines queued in the streamer ahead of transmission
+    :param poll_timeout: timeout for each SerialPort.readlines call
+    :param status_interval: status ('?') polling interval (None to disable)
+    :param engine: 'poll' (a readlines loop, as grbl-stream does) or 'event'
+                   (engine.StreamEngine)
+    :param fill_buffer: GCodeStreamer's fill_buffer
+    :return: dict of results
+    """
+    simulator = GRBLSimulator(block_time=block_time, baudrate=baudrate)
+    with simulator:
+        serialport = SerialPort(simulator.device, baudrate)
+        serialport.write('\r\n\r\n')  # wake up
+        for line in serialport.readlines(timeout=1):
+            if line.startswith('Grbl'):
+                break
+
+        streamer = BenchmarkStreamer(serialport, max_buffer, fill_buffer=fill_buffer)
+
+        lines = [GCodeStreamer.Line(g) for g in gcodes]
+        lines = [l for l in lines if l]  # blank lines aren't sent
+        errors = [0]
+
+        if engine == 'event':
+            stream_engine = StreamEngine(
+                serialport, streamer,
+                pending_count=pending_count,
+                status_interval=status_interval,
+            )
+            def _error_callback(exception):
+                errors[0] += 1
+            stream_engine.error_callback = _error_callback
+
+            start_time = time.time()
+            stream_engine.start()
+            stream_engine.stream(lines)
+            stream_engine.run()
+            stream_engine.stop()
+
+        else:  # 'poll': as the grbl-stream script does
+            # Status polling
+            poll_keepalive = [True]
+            def _poll_runtime():
+                while poll_keepalive[0]:
+                    serialport.realtime('status')
+                    time.sleep(status_interval)
+            poll_thread = None
+            if status_interval:
+                poll_thread = threading.Thread(target=_poll_runtime)
+                poll_thread.daemon = True
+
+            # Stream
+            lines_iter = iter(lines)
+            start_time = time.time()
+            if poll_thread:
+                poll_thread.start()
+            more_lines = True
+            while more_lines or not streamer.finished:
+                while more_lines and (streamer.pending_count < pending_count):
+                    line = next(lines_iter, None)
+                    if line is None:
+                        more_lines = False
+                        break
+                    streamer.send(line, poll=False)
+                streamer.poll_transmission()
+                for received in serialport.readlines(timeout=poll_timeout):
+                    if received.startswith('<') or received.startswith('['):
+                        continue  # status report / message
+                    if received.startswith('error'):
+                        errors[0] += 1
+                        received = 'ok'  # keep streaming
+                    streamer.process_response(received)
+
+            poll_keepalive[0] = False
+            if poll_thread:
+                poll_thread.join()
+
+        end_time = time.time()
+        starved_time = simulator.stats['starved_time']
+        serialport.serial.close()
+
+    elapsed = end_time - start_time
+    fill = [v for (t, v) in streamer.fill_samples]
+    latencies = streamer.latencies
+    return {
+        'lines': len(lines),
+        'bytes': streamer.bytes_sent,
+        'errors': errors[0],
+        'elapsed': elapsed,
+        'lines_per_sec': len(lines) / elapsed,
+        'bytes_per_sec': streamer.bytes_sent / elapsed,
+        'latency_mean': (sum(latencies) / len(latencies)) if latencies else None,
+        'latency_p99': _percentile(latencies, 99),
+        'buffer_fill_mean': (float(sum(fill)) / len(fill)) if fill else None,
+        'buffer_fill_max': max(fill) if fill else None,
+        'buffer_fill': _downsample(streamer.fill_samples, start_time),
+        'planner_starved_time': starved_time,
+        'planner_starved_ratio': starved_time / elapsed,
+        'rx_overflow': simulator.stats['rx_overflow'],
+        'writes': streamer.write_count,
+        'lines_per_write': streamer.mean_lines_per_write,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=open(os.devnull, 'w'),
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance=0.1):
+    """
+    Compare throughput of results against a baseline
+    :return: list of regression description strs (empty if none)
+    """
+    baseline_runs = dict((r['name'], r) for r in baseline['runs'])
+    regressions = []
+    for run in results['runs']:
+        base = baseline_runs.get(run['name'])
+        if base and (run['lines_per_sec'] < base['lines_per_sec'] * (1 - tolerance)):
+            regressions.append("{name}: {new:.1f} lines/sec (was {old:.1f})".format(
+                name=run['name'], new=run['lines_per_sec'], old=base['lines_per_sec'],
+            ))
+    return regressions
+
+
+def format_result(result):
+    """
+    :param result: benchmark run (see run_benchmark, with its 'name')
+    :return: one line summary (str)
+    """
+    latency = '/'.join(
+        ('%.5fs' % result[key]) if result[key] is not None else 'n/a'
+        for key in ('latency_mean', 'latency_p99')
+    )
+    return (
+        "{name:<20s} {lines_per_sec:9.1f} lines/s {bytes_per_sec:10.1f} B/s "
+        "latency(mean/p99): {latency} "
+        "starved: {planner_starved_ratio:.1%} lines/write: {lines_per_write:.2f}"
+    ).format(latency=latency, **result)
+
+
+# ================== Command Line ==================
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Streaming throughput benchmark, using a simulated GRBL device",
+    )
+    parser.add_argument(
+        '--workloads', dest='workloads', default=','.join(sorted(WORKLOADS)),
+        help="comma separated workloads to run (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--baudrates', dest='baudrates', default='115200,250000',
+        help="comma separated simulated baud rates (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--lines', dest='lines', type=int, default=None,
+        help="lines per workload (default: workload's own default)",
+    )
+    parser.add_argument(
+        '--block-time', dest='block_time', type=float, default=0.002,
+        help="simulated execution time of each motion block (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--engine', dest='engine', choices=['poll', 'event'], default='poll',
+        help="streaming loop: 'poll' (as grbl-stream does), or 'event' driven "
+             "(default: %(default)s)",
+    )
+    parser.add_argument(
+        '--fill-buffer', dest='fill_buffer',
+        action='store_const', const=True, default=False,
+        help="send as many lines as will fit in GRBL's buffer in each write",
+    )
+    parser.add_argument(
+        '--pending-count', dest='pending_count', type=int, default=2,
+        help="lines queued in the streamer (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--output', '-o', dest='output', default=None,
+        help="json file to write results to (default: stdout)",
+    )
+    parser.add_argument(
+        '--compare', dest='compare', default=None, metavar='BASELINE',
+        help="json results to compare throughput against, exit 1 on regression",
+    )
+    parser.add_argument(
+        '--tolerance', dest='tolerance', type=float, default=0.1,
+        help="fractional throughput drop considered a regression (default: %(default)s)",
+    )
+    args = parser.parse_args(args)
+
+    results = {
+        'revision': _git_revision(),
+        'python': sys.version.split()[0],
+        'time': time.time(),
+        'runs': [],
+    }
+    for workload in args.workloads.split(','):
+        kwargs = {'lines': args.lines} if args.lines else {}
+        gcodes = WORKLOADS[workload](**kwargs)
+        for baudrate in [int(b) for b in args.baudrates.split(',')]:
+            result = run_benchmark(
+                gcodes, baudrate=baudrate,
+                block_time=args.block_time,
+                pending_count=args.pending_count,
+                engine=args.engine,
+                fill_buffer=args.fill_buffer,
+            )
+            result.update({
+                'name': '%s@%i' % (workload, baudrate),
+                'engine': args.engine,
+                'fill_buffer': args.fill_buffer,
+                'workload': workload,
+                'baudrate': baudrate,
+            })
+            results['runs'].append(result)
+            sys.stderr.write(format_result(result) + '\n')
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare, 'r') as fh:
+            regressions = compare(results, json.load(fh), tolerance=args.tolerance)
+        for regression in regressions:
+            sys.stderr.write("REGRESSION: %s\n" % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ import collections
 
 # local libs
 import arduino_tools
+import discovery
 
 # Default content for settings file (encoded to json)
 #   ~/.grbl-stream.json
@@ -18,10 +19,15 @@ DEFAULT_SETTINGS = {
     'keep_open': True,  # keep window open until user presses [enter] or 'q'
                         # if False, script returns as soon as gcode is complete.
     'delay_before_exit': 0,  # time to delay before ending script
+    'max_frame_rate': 20,  # max screen updates per second (unit: Hz)
+    'scrollback_lines': 1000,  # lines kept by each window (oldest are discarded)
 
     # --- Serial Logging
     'serial_logging': False,
-    'serial_log_file': 'grbl-stream.log',  # stored in working path
+    'serial_log_file': 'grbl-stream.log',  # stored in working path (binary, see seriallog.py)
+    'serial_log_max_size': 10,  # log is rotated beyond this (unit: MB), 0: never rotated
+    'serial_log_backups': 5,  # rotated logs kept (grbl-stream.log.1, .2, ...)
+    'serial_log_compress': False,  # rotated logs are gzip compressed
 
     # --- Serial Connection
     # serial_device: the serial device GRBL is connected to:
@@ -30,10 +36,26 @@ DEFAULT_SETTINGS = {
     #   - None: script will attempt to find it automagically (witchcraft)
     'serial_device': None,
     'serial_baudrate': 115200,
+    # device_cache: serial ports probed for GRBL are remembered, so they
+    #   needn't be probed again to find the device (see discovery.py)
+    'device_cache': True,
+    'device_cache_file': None,  # None: ~/.cache/grbl-stream/devices.json
+    'device_probe_timeout': 2.5,  # time to wait for each port's response (unit: sec)
 
     # --- Status (sending '?')
     'status_polling': True,  # disable for minimal serial comms
-    'status_poll_interval': 0.25,  # 4Hz (unit: sec)
+    # poll rate adapts to machine's state (unit: sec):
+    #   - status_poll_interval: while running (streaming)
+    #   - status_poll_min_interval: while jogging / holding, and just after
+    #                               a jog, hold, or the end of a job
+    #   - status_poll_max_interval: while idle
+    'status_poll_interval': 0.25,  # 4Hz
+    'status_poll_min_interval': 0.05,  # 20Hz
+    'status_poll_max_interval': 1.0,  # 1Hz
+
+    # --- Headless (--headless)
+    'event_file': '-',  # JSON-lines events written here ('-' for stdout)
+    'event_status_interval': 0.25,  # min time between status events (unit: sec)
 
     # --- Jogging
     'interactive_jogging': True,  # if set, user input will be required to position machine before streaming starts
@@ -50,11 +72,60 @@ DEFAULT_SETTINGS = {
     # --- Streaming
     'stream_pending_count': 2,  # number of lines to show that haven't yet been sent over serial
     'grbl_buffer_size': 128,  # only change if GRBL has been compiled with a different buffer size
+    # grbl_buffer_calibration: buffer limit is corrected from GRBL's reported
+    #   RX buffer state (Bf:, if $10 includes 2); mismatches are shown as warnings
+    'grbl_buffer_calibration': True,
+    # grbl_fill_buffer:
+    #   - False: transmit one line at a time
+    #   - True: transmit as many lines as will fit in GRBL's buffer in one write
+    'grbl_fill_buffer': True,
     # split_gcodes:
     #   - False: simply stream each gcode line
     #   - True: split gcode lines into their individual gcodes. Transmit them
     #           in processing order outlined by the LinuxCNC guideline.
     'split_gcodes': False,
+    # pipeline_processes: lines are read ahead, split & normalized in the background
+    #   - 0: on a background thread
+    #   - N: by N worker processes (opt-in; worth it when parsing is cpu
+    #        intensive, ie: split_gcodes on large files)
+    'pipeline_processes': 0,
+    # job_cache: prepared lines of each file streamed are stored in a cache,
+    #            so the next time it's streamed there's nothing to parse
+    'job_cache': True,
+    'job_cache_dir': None,  # None: ~/.cache/grbl-stream
+    'job_cache_max_size': 500,  # oldest jobs are removed beyond this (unit: MB)
+    'job_cache_max_age': 30,  # jobs unused for this long are removed (unit: days)
+    # merge_segments: runs of nearly collinear G1 moves are merged into one
+    #   (fewer lines to send, and for GRBL to plan; see merge.py)
+    'merge_segments': False,
+    'merge_tolerance': None,  # max deviation from merged move (unit: mm), None: GRBL's $12
+    # compact_encoding: lines are sent without words already in effect (motion
+    #   mode, feed rate), or line numbers; so more fit in GRBL's buffer (see encode.py)
+    'compact_encoding': False,
+    'compact_precision': 4,  # decimal places numbers are rounded to
+    # stream_instrumentation: buffer occupancy (host & GRBL) is sampled, and
+    #   periods GRBL's planner ran dry are reported at the end of the job;
+    #   GRBL must report its buffer state, set $10 to include 2 (eg: $10=3)
+    'stream_instrumentation': False,
+
+    # --- Journal (--resume)
+    # journal: acknowledged lines are recorded, so an interrupted job can be resumed
+    'journal': True,
+    'journal_dir': None,  # None: ~/.local/share/grbl-stream/journal
+    'journal_sync_interval': 1.0,  # time between writes to disk (unit: sec)
+    # resume_backoff_lines: lines acknowledged, but possibly not executed
+    #   (GRBL acknowledges lines as they're planned; its planner holds 15)
+    'resume_backoff_lines': 15,
+    'resume_safe_z': -1.0,  # retracted to before resuming (machine coordinates, unit: mm)
+    'resume_spindle_delay': 3,  # time for spindle to start before resuming (unit: sec)
+
+    # --- Runtime Estimate (--estimate)
+    # runtime_estimate: job's runtime is estimated (in the background) from
+    #   GRBL's motion settings, then corrected by actual progress (needs numpy)
+    'runtime_estimate': True,
+    # grbl_settings: GRBL settings used by --estimate, eg: {"110": 2000} ($110)
+    #   (while streaming, settings are read from GRBL)
+    'grbl_settings': {},
 
     # --- Error Handling (TODO)
     # Configure how to handle GRBL errors... namely:
@@ -120,9 +191,14 @@ class Config(object):
 
         # --- Special Cases
         # 'serial_device'
-        if self.serial_device is None:
+        if (self.serial_device is None) and not any(
+                getattr(self.args, key, False) for key in ('simulate', 'replay_log', 'estimate', 'farm_jobs')):
             # FIXME: there has to be a way to do this native to argparse
-            self.args.serial_device = arduino_tools.device_type(self.args.serial_device)
+            self.args.serial_device = arduino_tools.device_type(
+                self.args.serial_device,
+                cache_file=(self.device_cache_file or discovery.DEFAULT_CACHE_FILE) if self.device_cache else None,
+                timeout=self.device_probe_timeout,
+            )
 
         # 'serial_log_file' & 'serial_logging'
         if self.args.serial_log_file:
@@ -142,6 +218,11 @@ class Config(object):
         if key in self.settings:
             return self.settings[key]
 
+        # 3rd preference: default settings (not in settings files created
+        # by an older version)
+        elif key in DEFAULT_SETTINGS:
+            return DEFAULT_SETTINGS[key]
+
         else:
             raise AttributeError("'{cls}' object has no attribute '{key}'".format(
                 cls=self.__class__.__name__,
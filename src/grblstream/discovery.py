@@ -0,0 +1,277 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+import collections
+from six.moves import queue
+
+
+# GRBL device discovery
+#
+# Description:
+#   Finds the serial devices GRBL is connected to (when a serial device isn't
+#   given, or an Arduino's serial number is given instead).
+#
+#   A board can't be recognized by its USB descriptors; clones (eg: CH340,
+#   CP2102 USB-serial chips) and grblHAL boards don't say "arduino". So each
+#   candidate port (every USB serial port) is probed with a GRBL handshake:
+#       - wake GRBL: '\r\n\r\n'
+#       - GRBL's banner (eg: "Grbl 1.1f ['$' for help]") is printed when it
+#         starts (an Arduino resets when its port is opened), otherwise its
+#         build info is requested with '$I' (eg: "[VER:1.1f.20170801:]")
+#   Ports are probed in parallel (a probe can take seconds, most of it
+#   waiting for an Arduino's bootloader), each opened exclusively, so a port
+#   another grbl-stream is streaming to is skipped.
+#
+#   The result of each probe is cached on disk (device_cache_file), keyed by
+#   the port's identity: its USB serial number, or (for boards without one)
+#   its USB id & location (the physical port it's plugged into):
+#       port identity -> device (eg: /dev/ttyACM0), firmware (banner)
+#   Listing the system's serial ports is fast (no port is opened), so when
+#   every port listed is in the cache at the same device, nothing is probed;
+#   only ports that are new (or have moved) are. If that finds no GRBL
+#   device, the ports that were cached are probed again (the cache may be
+#   stale; eg: a board that was busy when it was last probed).
+#
+#   To list the GRBL devices found:
+#       $ python -m grblstream.discovery
+#       /dev/ttyACM0    55639303235351C071B0    Grbl 1.1f ['$' for help]
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'grbl-stream', 'devices.json')
+CACHE_VERSION = 1
+
+PROBE_TIMEOUT = 2.5  # time to wait for GRBL's response (an Arduino's bootloader takes ~2s)
+PROBE_QUERY_DELAY = 0.1  # time to wait for a banner before '$I' is sent
+PROBE_WORKERS = 16  # ports probed at once
+
+# responses identifying GRBL (incl. grblHAL)
+BANNER_REGEX = re.compile(r'^Grbl(HAL)?\s+\S+', re.IGNORECASE)
+BUILD_INFO_REGEX = re.compile(r'^\[VER:[^\]]*\]')
+
+GRBLDevice = collections.namedtuple('GRBLDevice', ['device', 'serial_number', 'firmware'])
+
+
+class DiscoveryError(Exception):
+    pass
+
+
+# ----------------- Ports -----------------
+def port_identity(port):
+    """
+    :param port: serial.tools.list_ports_common.ListPortInfo instance
+    :return: identity of the board connected to port (str), None if it
+             can't be identified
+    """
+    if port.serial_number:
+        return port.serial_number.upper()
+    if port.vid is not None:
+        return 'usb:%04x:%04x@%s' % (port.vid, port.pid or 0, port.location or port.device)
+    return None
+
+
+def candidate_ports(ports=None):
+    """
+    :param ports: list of ListPortInfo instances (default: all listed)
+    :return: list of ports GRBL may be connected to (USB serial ports)
+    """
+    if ports is None:
+        from serial.tools.list_ports import comports
+        ports = comports()
+    return [p for p in ports if port_identity(p) is not None]
+
+
+def probe(device, baudrate=115200, timeout=PROBE_TIMEOUT):
+    """
+    Check if GRBL is connected to device (see module description)
+    :param device: serial device (eg: /dev/ttyACM0)
+    :param baudrate: serial baud rate
+    :param timeout: time to wait for GRBL's response (unit: sec)
+    :return: GRBL's banner (or build info), None if it isn't GRBL
+    """
+    import serial
+    try:
+        port = serial.Serial(device, baudrate, timeout=0.05, exclusive=True)
+    except (serial.SerialException, OSError, ValueError):
+        return None  # (in use, or not a serial port)
+
+    try:
+        port.write(b'\r\n\r\n')
+        start_time = time.time()
+        queried = False
+        received = b''
+        while time.time() - start_time < timeout:
+            received += port.read(port.in_waiting or 1)
+            while b'\n' in received:
+                (line, received) = received.split(b'\n', 1)
+                line = line.decode('latin-1').strip()
+                if BANNER_REGEX.search(line) or BUILD_INFO_REGEX.search(line):
+                    return line
+            if not queried and (time.time() - start_time >= PROBE_QUERY_DELAY):
+                port.write(b'$I\n')
+                queried = True
+    except (serial.SerialException, OSError):
+        pass
+    finally:
+        port.close()
+    return None
+
+
+def probe_all(devices, baudrate=115200, timeout=PROBE_TIMEOUT, workers=PROBE_WORKERS):
+    """
+    Probe several devices in parallel
+    :param devices: list of serial devices
+    :return: dict of {device: firmware (None if it isn't GRBL)}
+    """
+    pending = queue.Queue()
+    for device in devices:
+        pending.put(device)
+    results = {}
+
+    def _worker():
+        while True:
+            try:
+                device = pending.get_nowait()
+            except queue.Empty:
+                return
+            results[device] = probe(device, baudrate=baudrate, timeout=timeout)
+
+    threads = [threading.Thread(target=_worker) for i in range(min(workers, len(devices)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# ----------------- Cache -----------------
+class DeviceCache(object):
+    """
+    Probe results, kept on disk (see module description)
+    """
+
+    def __init__(self, filename=None):
+        """
+        :param filename: cache file, None: not kept on disk
+        """
+        self.filename = filename
+        self.entries = {}  # {port identity: {'device': ..., 'firmware': ..., 'time': ...}}
+        self.changed = False
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename, 'r') as fh:
+                    content = json.load(fh)
+                if content.get('version') == CACHE_VERSION:
+                    self.entries = content.get('ports', {})
+            except (IOError, OSError, ValueError, AttributeError):
+                pass  # an unreadable cache is rebuilt
+
+    def get(self, port):
+        """
+        :return: cached entry for port (dict), None if it's not cached, or
+                 was probed at a different device
+        """
+        entry = self.entries.get(port_identity(port))
+        if entry and (entry.get('device') == port.device):
+            return entry
+        return None
+
+    def set(self, port, firmware):
+        self.entries[port_identity(port)] = {
+            'device': port.device,
+            'firmware': firmware,
+            'time': time.time(),
+        }
+        self.changed = True
+
+    def save(self):
+        if not (self.filename and self.changed):
+            return
+        directory = os.path.dirname(self.filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        # written to a temporary file, then renamed (another process may be
+        # reading it)
+        tmp_filename = '%s.%i.tmp' % (self.filename, os.getpid())
+        with open(tmp_filename, 'w') as fh:
+            json.dump({'version': CACHE_VERSION, 'ports': self.entries}, fh, indent=4, sort_keys=True)
+        os.rename(tmp_filename, self.filename)
+        self.changed = False
+
+
+# ----------------- Discovery -----------------
+def discover(serial_number=None, cache_file=DEFAULT_CACHE_FILE, baudrate=115200,
+             timeout=PROBE_TIMEOUT, ports=None):
+    """
+    Find the devices GRBL is connected to (see module description)
+    :param serial_number: if given, only the board with this USB serial number
+    :param cache_file: probe results are kept here, None: not cached
+    :param baudrate: serial baud rate
+    :param timeout: time to wait for each device's response (unit: sec)
+    :param ports: list of ListPortInfo instances (default: all listed)
+    :return: list of GRBLDevice instances
+    """
+    candidates = candidate_ports(ports)
+    if serial_number is not None:
+        candidates = [p for p in candidates if (p.serial_number or '').upper() == serial_number.upper()]
+    cache = DeviceCache(cache_file)
+
+    def _found():
+        found = []
+        for port in candidates:
+            entry = cache.get(port)
+            if entry and entry['firmware']:
+                found.append(GRBLDevice(port.device, port.serial_number, entry['firmware']))
+        return found
+
+    def _probe(ports):
+        results = probe_all([p.device for p in ports], baudrate=baudrate, timeout=timeout)
+        for port in ports:
+            cache.set(port, results[port.device])
+
+    cached = [p for p in candidates if cache.get(p) is not None]
+    try:
+        # ports not yet probed (new, or moved)
+        _probe([p for p in candidates if cache.get(p) is None])
+        found = _found()
+        if not found and cached:
+            # cached ports again (the cache may be stale)
+            _probe(cached)
+            found = _found()
+    finally:
+        cache.save()
+    return found
+
+
+# ----------------- Command Line -----------------
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="List the serial devices GRBL is connected to",
+    )
+    parser.add_argument(
+        '--serial-number', dest='serial_number', default=None,
+        help="only the board with this USB serial number",
+    )
+    parser.add_argument(
+        '--nocache', dest='cache', action='store_false', default=True,
+        help="probe every port (ignoring, and not updating, cached results)",
+    )
+    parser.add_argument(
+        '--timeout', dest='timeout', type=float, default=PROBE_TIMEOUT,
+        help="time to wait for each device's response (default: %(default)s sec)",
+    )
+    args = parser.parse_args(args)
+
+    devices = discover(
+        serial_number=args.serial_number,
+        cache_file=DEFAULT_CACHE_FILE if args.cache else None,
+        timeout=args.timeout,
+    )
+    for device in devices:
+        print("%-15s %-23s %s" % (device.device, device.serial_number or '-', device.firmware))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import re
+
+
+# Compact wire encoding
+#
+# Description:
+#   GRBL's serial receive buffer is 128 bytes, and lines are streamed by
+#   counting the characters in it (see streamer.GCodeStreamer); so the
+#   shorter each line, the more lines GRBL has queued (and the less likely
+#   its planner is to run dry).
+#
+#   Normalized lines (see GCodeStreamer.Line.normalize) have no whitespace,
+#   or comments, but still carry words that change nothing:
+#       G1X10.0000Y5.5000F300
+#       G1X10.0000Y6.0000F300
+#   A WireEncoder tracks modal state (motion mode, units & feed rate) through the
+#   lines it encodes, and writes the shortest equivalent of each:
+#       G1X10Y5.5F300
+#       Y6
+#   by:
+#       - dropping motion words (G0, G1, etc) that are already in effect
+#       - dropping feed rates that are already in effect (not in inverse
+#         time mode, G93; where every move needs one). GRBL converts feed
+#         rates to mm/min as they're parsed, so one's only in effect in the
+#         units (G20/G21) it was given in
+#       - dropping line numbers (N words)
+#       - trimming numbers to a fixed precision, without trailing zeros
+#         (or a leading zero: 0.5 -> .5)
+#
+#   Lines are encoded in the order they're sent. Lines that can't be parsed
+#   are sent as they are, and modal state is forgotten (so nothing's dropped
+#   until it's set again).
+#
+#   Caveat: if GRBL rejects a line (error:N) its modes may not be what the
+#   encoder assumes.
+
+WORD_REGEX = re.compile(br'([A-Z])([-+]?(?:\d+\.?\d*|\.\d+))')
+
+# gcodes (G number * 10)
+MOTION_GCODES = frozenset([0, 10, 20, 30, 382, 383, 384, 385, 800])
+FEED_MODE_GCODES = frozenset([930, 940])
+UNITS_GCODES = frozenset([200, 210])
+# non-modal gcodes using axis words (motion words aren't dropped with these)
+AXIS_GCODES = frozenset([100, 280, 281, 300, 301, 530, 920, 921])
+
+
+def trim_number(value, precision):
+    """
+    Shortest text of value, rounded to the given decimal places
+    :return: bytes (eg: trim_number(-0.50, 3) -> b'-.5')
+    """
+    text = ('%.*f' % (precision, value))
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    if text in ('-0', ''):
+        text = '0'
+    return text.encode('ascii')
+
+
+class WireEncoder(object):
+    """
+    Writes the shortest equivalent of each line, given the modal state
+    left by those before it (see module description)
+    """
+    DEFAULT_PRECISION = 4
+
+    def __init__(self, precision=None):
+        """
+        :param precision: decimal places numbers are rounded to
+        """
+        self.precision = precision if precision is not None else self.DEFAULT_PRECISION
+        self.line_count = 0  # lines encoded
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.reset()
+
+    def reset(self):
+        """Forget modal state"""
+        self.motion = None  # G number * 10
+        self.feed_rate = None  # bytes (as encoded)
+        self.feed_mode = None  # G number * 10
+        self.units = None  # G number * 10
+
+    @property
+    def bytes_saved_per_line(self):
+        """Average bytes removed from each line encoded"""
+        if not self.line_count:
+            return 0.0
+        return float(self.bytes_in - self.bytes_out) / self.line_count
+
+    def encode(self, data):
+        """
+        :param data: normalized line (see GCodeStreamer.Line.normalize)
+        :return: encoded line (bytes, including newline)
+        """
+        encoded = self._encode(data.rstrip(b'\n')) + b'\n'
+        self.line_count += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(encoded)
+        return encoded
+
+    def _encode(self, block):
+        if not block or block.startswith(b'$'):
+            return block  # system commands don't change modes
+
+        words = WORD_REGEX.findall(block)
+        letters = [l for (l, _) in words if l not in (b'G', b'M')]
+        if (sum(len(l) + len(v) for (l, v) in words) != len(block)) or \
+                (len(letters) != len(set(letters))):
+            self.reset()  # not understood (or will be rejected by GRBL)
+            return block
+
+        gcodes = [int(round(float(v) * 10)) for (l, v) in words if l == b'G']
+        motion = [g for g in gcodes if g in MOTION_GCODES]
+        feed_mode = [g for g in gcodes if g in FEED_MODE_GCODES]
+        units = [g for g in gcodes if g in UNITS_GCODES]
+        if (len(motion) > 1) or (len(feed_mode) > 1) or (len(units) > 1):
+            self.reset()
+            return block
+        feed_mode = feed_mode[0] if feed_mode else self.feed_mode
+        if feed_mode != self.feed_mode:
+            self.feed_rate = None  # GRBL needs a new feed rate when the mode changes
+        units = units[0] if units else self.units
+        if units != self.units:
+            self.feed_rate = None  # same F, different feed rate (converted when parsed)
+        keep_motion = any(g in AXIS_GCODES for g in gcodes)
+
+        encoded = []
+        for (letter, value) in words:
+            if letter == b'N':
+                continue  # line numbers mean nothing to GRBL
+            if letter in (b'G', b'M'):
+                code = float(value)
+                if (letter == b'G') and (int(round(code * 10)) == self.motion) and not keep_motion:
+                    continue  # already in effect
+                encoded.append(letter + trim_number(code, 1))
+                continue
+            number = trim_number(float(value), self.precision)
+            if letter == b'F':
+                if (number == self.feed_rate) and (feed_mode != 930):
+                    continue  # already in effect
+                self.feed_rate = number
+            encoded.append(letter + number)
+
+        if motion:
+            self.motion = motion[0]
+        self.feed_mode = feed_mode
+        self.units = units
+        return b''.join(encoded)
+
+
+def encode_precision(config):
+    """
+    :param config: config.Config instance
+    :return: decimal places numbers are rounded to, None if lines aren't
+             compactly encoded
+    """
+    if not config.compact_encoding:
+        return None
+    return config.compact_precision
@@ -0,0 +1,277 @@
+import time
+import heapq
+import select
+import itertools
+import collections
+
+from .streamer import SerialPort, GCodeStreamer, GCodeStreamException
+
+
+# Event driven streaming engine.
+#
+# Description:
+#   An alternative to polling SerialPort.readlines(timeout=...) in a loop;
+#   the engine waits on the serial port's file descriptor (with select()) so
+#   it wakes the moment data arrives, and responds to it straight away:
+#
+#       - RX:     received lines are dispatched (responses, status, messages)
+#       - TX:     each response frees GRBL's buffer; pending lines are topped
+#                 up from the source and transmitted in the same wake-up
+#       - status: '?' is sent periodically (a timer on the same loop, at a
+#                 fixed interval, or adapted by a polling.StatusPoller)
+#       - input:  other file descriptors (eg: keyboard) can be added as readers
+#
+#   Each of these runs as a callback on a single thread, so nothing needs
+#   locking, and nothing blocks for longer than a select() call.
+#
+#   select() is used (rather than asyncio) so this works on python 2.x & 3.x
+#
+#   The source of lines mustn't block either (eg: waiting for a background
+#   pipeline to prepare the next line); it yields NOT_READY instead, and is
+#   tried again shortly.
+
+# yielded by a source of lines when its next line isn't ready yet
+NOT_READY = object()
+
+
+class EventLoop(object):
+    """
+    Minimal select() based event loop.
+    Callbacks are run on the thread calling run_once() (or run_until())
+    """
+
+    class Timer(object):
+        __slots__ = ('time', 'callback', 'cancelled')
+
+        def __init__(self, time, callback):
+            self.time = time
+            self.callback = callback
+            self.cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    def __init__(self):
+        self._readers = {}  # {fd: callback, ...}
+        self._timers = []  # heap of (time, seq, Timer)
+        self._seq = itertools.count()  # timer tie-breaker (keeps heap sortable)
+        self._ready = collections.deque()  # callbacks to run on next iteration
+
+    def add_reader(self, fileobj, callback):
+        """callback() is called when fileobj (or fd) has data to read"""
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        self._readers[fd] = callback
+
+    def remove_reader(self, fileobj):
+        fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+        self._readers.pop(fd, None)
+
+    def call_soon(self, callback):
+        self._ready.append(callback)
+
+    def call_later(self, delay, callback):
+        """
+        :return: EventLoop.Timer instance (can be cancelled)
+        """
+        timer = self.Timer(time.time() + delay, callback)
+        heapq.heappush(self._timers, (timer.time, next(self._seq), timer))
+        return timer
+
+    def run_once(self, timeout=None):
+        """
+        Wait for (at most) timeout, then run all callbacks that are due
+        :param timeout: max time to wait (seconds), None to wait indefinitely
+        """
+        # Time until next timer
+        while self._timers and self._timers[0][2].cancelled:
+            heapq.heappop(self._timers)
+        if self._ready:
+            timeout = 0
+        elif self._timers:
+            timer_timeout = max(0.0, self._timers[0][0] - time.time())
+            timeout = timer_timeout if timeout is None else min(timeout, timer_timeout)
+
+        # Wait for input
+        if self._readers:
+            try:
+                (readable, _, _) = select.select(list(self._readers), [], [], timeout)
+            except select.error:
+                readable = []  # interrupted by a signal (eg: terminal resize)
+            for fd in readable:
+                callback = self._readers.get(fd)
+                if callback:
+                    callback()
+        elif timeout:
+            time.sleep(timeout)
+
+        # Timers
+        now = time.time()
+        while self._timers and (self._timers[0][0] <= now):
+            (_, _, timer) = heapq.heappop(self._timers)
+            if not timer.cancelled:
+                timer.callback()
+
+        # Ready callbacks (only those queued before now)
+        for i in range(len(self._ready)):
+            self._ready.popleft()()
+
+    def run_until(self, predicate, timeout=None):
+        """
+        Run until predicate() returns True
+        :param timeout: give up after this long (seconds)
+        :return: True if predicate was met, False if timed out
+        """
+        end_time = None if timeout is None else (time.time() + timeout)
+        while not predicate():
+            remaining = None
+            if end_time is not None:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return False
+            self.run_once(remaining)
+        return True
+
+
+class StreamEngine(object):
+    """
+    Streams lines to GRBL, driven by an EventLoop
+    """
+    DEFAULT_PENDING_COUNT = 2
+    FEED_RETRY_INTERVAL = 0.01  # time before a source that's NOT_READY is tried again (unit: sec)
+
+    def __init__(self, serial, streamer, loop=None, pending_count=None,
+                 status_interval=None, status_poller=None):
+        """
+        :param serial: SerialPort instance
+        :param streamer: GCodeStreamer instance (using serial)
+        :param loop: EventLoop instance (default: a new one)
+        :param pending_count: lines to keep queued in the streamer
+        :param status_interval: time between status requests ('?'), None to disable
+        :param status_poller: polling.StatusPoller instance; adapts the time
+                              between status requests (overrides status_interval)
+        """
+        assert isinstance(serial, SerialPort), "bad serial type: %r" % serial
+        assert isinstance(streamer, GCodeStreamer), "bad streamer type: %r" % streamer
+        self.serial = serial
+        self.streamer = streamer
+        self.loop = loop if loop is not None else EventLoop()
+        self.pending_count = pending_count if pending_count is not None else self.DEFAULT_PENDING_COUNT
+        self.status_interval = status_interval
+        self.status_poller = status_poller
+
+        self.source = None  # iterator of GCodeStreamer.Line instances (or NOT_READY)
+        self._status_timer = None
+        self._feed_timer = None  # set while waiting for the source
+
+        # Callbacks (all optional)
+        #   called with the received line (str)
+        self.status_callback = None  # status report: <...>
+        self.message_callback = None  # message: [...] (or any other text)
+        self.alarm_callback = None  # ALARM:N
+        self.response_callback = None  # ok / error:N (after streamer has processed it)
+        #   called with the GCodeStreamException raised (if not set, it's raised)
+        self.error_callback = None
+
+    # ----------------- Tasks -----------------
+    def start(self):
+        """Register tasks with the loop"""
+        self.loop.add_reader(self.serial, self._on_readable)
+        self.loop.call_soon(self._on_readable)  # lines may already be buffered
+        if self.status_interval or self.status_poller:
+            self._poll_status()
+
+    def stop(self):
+        self.loop.remove_reader(self.serial)
+        if self._status_timer:
+            self._status_timer.cancel()
+            self._status_timer = None
+        if self._feed_timer:
+            self._feed_timer.cancel()
+            self._feed_timer = None
+
+    def _on_readable(self):
+        # RX: parse & dispatch received lines
+        for line in self.serial.read_available():
+            self.dispatch(line)
+        # TX: top-up pending lines (responses have made room)
+        self.feed()
+
+    def _poll_status(self):
+        if self.status_poller:
+            delay = self.status_poller.poll()
+        else:
+            self.serial.realtime('status')
+            delay = self.status_interval
+        self._status_timer = self.loop.call_later(delay, self._poll_status)
+
+    def boost_status(self):
+        """Poll status more often for a while (if using a StatusPoller)"""
+        if self.status_poller and self._status_timer:
+            self.status_poller.boost()
+            self._status_timer.cancel()
+            self._status_timer = self.loop.call_later(0, self._poll_status)
+
+    def dispatch(self, line):
+        """Handle a single line received from GRBL"""
+        if line.startswith('ok') or line.startswith('error'):
+            try:
+                self.streamer.process_response(line)
+            except GCodeStreamException as e:
+                if self.error_callback is None:
+                    raise
+                self.error_callback(e)
+            if self.response_callback:
+                self.response_callback(line)
+        elif line.startswith('<'):
+            if self.status_poller:
+                self.status_poller.report_received(line)
+            if self.status_callback:
+                self.status_callback(line)
+        elif line.startswith('ALARM:'):
+            if self.alarm_callback:
+                self.alarm_callback(line)
+        elif line.strip():
+            # [...] messages, startup banner, anything else
+            if self.message_callback:
+                self.message_callback(line)
+
+    def feed(self):
+        """Top-up streamer's pending lines from the source, then transmit"""
+        while self.source is not None and (self.streamer.pending_count < self.pending_count):
+            line = next(self.source, None)
+            if line is None:
+                self.source = None  # source exhausted
+                self.boost_status()  # job's ending; idle state is imminent
+                break
+            if line is NOT_READY:
+                if self._feed_timer is None:
+                    self._feed_timer = self.loop.call_later(self.FEED_RETRY_INTERVAL, self._retry_feed)
+                break
+            if line:  # blank lines aren't sent
+                self.streamer.send(line, poll=False)
+        self.streamer.poll_transmission()
+
+    def _retry_feed(self):
+        self._feed_timer = None
+        self.feed()
+
+    # ----------------- Streaming -----------------
+    def stream(self, lines):
+        """
+        Set source of lines to stream, and start sending them.
+        :param lines: iterable of GCodeStreamer.Line instances
+        """
+        self.source = iter(lines)
+        self.feed()
+
+    @property
+    def finished(self):
+        """True when source is exhausted, and all lines are acknowledged"""
+        return (self.source is None) and self.streamer.finished
+
+    def run(self, timeout=None):
+        """
+        Stream until finished
+        :return: True if finished, False if timed out
+        """
+        return self.loop.run_until(lambda: self.finished, timeout=timeout)
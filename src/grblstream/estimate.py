@@ -0,0 +1,548 @@
+import re
+import warnings
+import threading
+
+from .grbl import SETTING_DEFAULTS
+
+try:
+    import numpy  # required to estimate (but not to stream)
+except ImportError:
+    numpy = None
+
+
+# Runtime estimation
+#
+# Description:
+#   Estimates how long a job will take to run, by planning its motion the
+#   way GRBL does (ref: grbl/planner.c):
+#       - each move's nominal speed is its feed rate (or the rapid rate),
+#         limited by the max rate of each axis it moves ($110-$112)
+#       - each move's acceleration is limited by that of each axis ($120-$122)
+#       - the speed through the junction between 2 moves is limited by the
+#         angle between them, and the junction deviation ($11)
+#       - arcs are traced as chords (within the arc tolerance: $12), so their
+#         speed is limited by the junction between chords
+#       - the machine stops for dwells, spindle/coolant changes, etc
+#   then the time taken by each move's trapezoidal velocity profile
+#   (accelerate, cruise, decelerate).
+#
+#   Everything is done with numpy, over arrays of every line (or move) in
+#   the job; no python code is run per line:
+#       - words are found with a vectorized scan of the file's bytes
+#       - modal state (motion mode, units, feed rate, etc) is forward-filled
+#         from the lines that set it
+#       - positions are running sums of incremental moves, restarted by
+#         each absolute move
+#       - the forward & backward passes of the planner (max entry speed of
+#         each move, given those before & after it) are running minimums:
+#           v[j]^2 = min(cap[k]^2 + sum(2 * a[i] * L[i], k <= i < j) for k <= j)
+#   so a file with a million moves is estimated in a few seconds.
+#
+#   Assumptions:
+#       - GRBL's planner only looks ahead 15 moves; the estimate assumes
+#         it sees the whole job (short moves may run slower than estimated)
+#       - work offsets (G54-G59, G92) don't change where the machine moves
+#       - G28, G30 & G38.x (probing) don't move the machine
+#       - feed & rapid overrides are 100%
+
+
+# Words, in lines with comments removed (eg: b'G1 X-1.5' -> (b'G', b'1'), (b'X', b'-1.5'))
+WORD_REGEX = re.compile(br'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+# Removed before lines are interpreted: comments, and '$' (or '%') lines
+IGNORE_REGEX = re.compile(br'\([^\n)]*\)|;[^\n]*|^[ \t]*[$%][^\n]*', re.MULTILINE)
+
+# gcodes (G number * 10) by modal group (ref: grbl/gcode.c)
+MOTION_GCODES = (0, 10, 20, 30, 382, 383, 384, 385, 800)
+PLANE_GCODES = (170, 180, 190)
+UNITS_GCODES = (200, 210)
+DISTANCE_GCODES = (900, 910)
+ARC_DISTANCE_GCODES = (901, 911)
+FEED_MODE_GCODES = (930, 940)
+# gcodes that sync GRBL's planner (machine stops first)
+SYNC_GCODES = (40, 100, 280, 281, 300, 301, 382, 383, 384, 385, 920, 921)
+# non-modal gcodes that take axis words (so they aren't moves)
+AXIS_GCODES = (100, 280, 300, 920)
+
+# planes: axis indexes (axis 0, axis 1, linear axis) (ref: grbl/gcode.c)
+PLANE_AXES = {
+    170: (0, 1, 2),  # G17: XY
+    180: (2, 0, 1),  # G18: ZX
+    190: (1, 2, 0),  # G19: YZ
+}
+
+# columns of Toolpath.segments
+(
+    COL_LINENO, COL_LENGTH,
+    COL_UNIT_X, COL_UNIT_Y, COL_UNIT_Z,  # direction (start to end)
+    COL_ENTRY_X, COL_ENTRY_Y, COL_ENTRY_Z,  # direction at start (tangent, for arcs)
+    COL_EXIT_X, COL_EXIT_Y, COL_EXIT_Z,  # direction at end
+    COL_SPEED,  # nominal speed (mm/sec), 0 for rapid
+    COL_RADIUS,  # arc radius (mm), 0 for lines
+    COL_STOP,  # 1 if machine stops before this segment
+) = range(14)
+COLUMNS = 14
+
+
+class MachineLimits(object):
+    """
+    Motion limits of a GRBL machine, from its settings
+    """
+
+    def __init__(self, settings=None):
+        """
+        :param settings: dict of GRBL settings {<N>: <value>, ...} (eg: from '$$')
+                         overriding grbl.SETTING_DEFAULTS
+        """
+        values = dict(SETTING_DEFAULTS)
+        values.update((int(k), float(v)) for (k, v) in (settings or {}).items())
+        self.max_rate = tuple(values[k] / 60. for k in (110, 111, 112))  # mm/sec
+        self.acceleration = tuple(values[k] for k in (120, 121, 122))  # mm/sec^2
+        self.junction_deviation = values[11]  # mm
+        self.arc_tolerance = values[12]  # mm
+
+
+def _char_table(chars):
+    table = numpy.zeros(256, dtype=bool)
+    table[list(bytearray(chars))] = True
+    return table
+
+
+def tokenize(data):
+    """
+    Find the words of every line in gcode
+    :param data: gcode (bytes)
+    :return: (line_count, lineno, letter, value); numpy arrays with an
+             element per word (letter as ascii code)
+    """
+    data = IGNORE_REGEX.sub(b'', data.upper())
+    chars = numpy.frombuffer(data, dtype=numpy.uint8)
+    newlines = numpy.flatnonzero(chars == ord('\n'))
+    line_count = len(newlines) + (1 if (data and not data.endswith(b'\n')) else 0)
+
+    is_letter = (chars >= ord('A')) & (chars <= ord('Z'))
+    positions = numpy.flatnonzero(is_letter)
+    lineno = numpy.searchsorted(newlines, positions) + 1
+    letter = chars[positions]
+
+    # Fast path: every letter is immediately followed by a number, so the
+    # numbers are all that's left when letters are removed
+    valid = (
+        _char_table(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-+ \t\r\n')[chars].all() and
+        not (len(positions) and positions[-1] == len(chars) - 1) and
+        _char_table(b'0123456789.-+')[chars[positions + 1]].all()
+    )
+    if valid:
+        numbers = chars.copy()
+        numbers[is_letter] = ord(' ')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # malformed numbers are detected below
+            value = numpy.fromstring(numbers.tobytes(), dtype=numpy.float64, sep=' ')
+        if len(value) == len(letter):
+            return (line_count, lineno, letter, value)
+
+    # Slow path: find words in each line (skips anything not understood)
+    words = [
+        (i, ord(l), float(v))
+        for (i, line) in enumerate(data.split(b'\n'), 1)
+        for (l, v) in WORD_REGEX.findall(line)
+    ]
+    (lineno, letter, value) = (
+        numpy.array([w[i] for w in words], dtype=t)
+        for (i, t) in enumerate((numpy.int64, numpy.uint8, numpy.float64))
+    )
+    return (line_count, lineno, letter, value)
+
+
+def _forward_fill(values, initial):
+    """
+    :param values: numpy array, nan where not set
+    :return: copy of values, with each nan replaced by the value set before it
+    """
+    values = values.copy()
+    values[0] = initial
+    index = numpy.where(numpy.isnan(values), 0, numpy.arange(len(values)))
+    return values[numpy.maximum.accumulate(index)]
+
+
+class Toolpath(object):
+    """
+    Motion segments (& dwells) of gcode, with modal state applied
+    """
+
+    def __init__(self, segments, dwells, line_count):
+        """
+        :param segments: numpy array, shape: (N, COLUMNS)
+        :param dwells: numpy array, shape: (M, 2): (lineno, time) of each dwell
+        :param line_count: number of lines interpreted
+        """
+        self.segments = segments
+        self.dwells = dwells
+        self.line_count = line_count
+
+    def __len__(self):
+        return len(self.segments)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Interpret lines of gcode
+        :param lines: iterable of str (first is line 1)
+        :return: Toolpath instance
+        """
+        return cls.from_data(b''.join(
+            (l if isinstance(l, bytes) else l.encode('ascii', 'replace')).rstrip(b'\n') + b'\n'
+            for l in lines
+        ))
+
+    @classmethod
+    def read(cls, filename):
+        """
+        :return: Toolpath instance, of the given gcode file
+        """
+        with open(filename, 'rb') as fh:
+            return cls.from_data(fh.read())
+
+    @classmethod
+    def from_data(cls, data):
+        """
+        Interpret gcode (see module description)
+        :param data: gcode (bytes)
+        :return: Toolpath instance
+        """
+        (line_count, word_lineno, word_letter, word_value) = tokenize(data)
+        size = line_count + 1  # arrays are indexed by line number ([0]: initial state)
+        line_index = numpy.arange(size)
+
+        def words(letter):
+            # value of the letter's word on each line, nan if there isn't one
+            values = numpy.full(size, numpy.nan)
+            mask = word_letter == ord(letter)
+            values[word_lineno[mask]] = word_value[mask]
+            return values
+
+        # gcodes
+        is_g = word_letter == ord('G')
+        (g_lineno, g_code) = (word_lineno[is_g], numpy.round(word_value[is_g] * 10).astype(numpy.int64))
+
+        def modal(gcodes, initial):
+            # modal group's gcode in effect on each line
+            values = numpy.full(size, numpy.nan)
+            mask = numpy.in1d(g_code, gcodes)
+            values[g_lineno[mask]] = g_code[mask]
+            return _forward_fill(values, initial)
+
+        def flag(gcodes):
+            # True for lines with any of the given gcodes
+            flags = numpy.zeros(size, dtype=bool)
+            flags[g_lineno[numpy.in1d(g_code, gcodes)]] = True
+            return flags
+
+        motion = modal(MOTION_GCODES, 0)
+        plane = modal(PLANE_GCODES, 170)
+        scale = numpy.where(modal(UNITS_GCODES, 210) == 200, 25.4, 1.0)  # mm per unit
+        absolute = modal(DISTANCE_GCODES, 900) == 900
+        arc_absolute = modal(ARC_DISTANCE_GCODES, 911) == 901
+        inverse_time = modal(FEED_MODE_GCODES, 940) == 930
+        feed = words('F')
+        feed_modal = _forward_fill(feed, 0.0)
+
+        machine_coords = flag([530])
+        dwell = flag([40])
+        define_position = flag([920]) | (flag([100]) & (words('L') == 20))
+        stop = flag(SYNC_GCODES)
+        stop[word_lineno[word_letter == ord('M')]] = True  # spindle, coolant, program flow
+
+        # Position (mm) after each line
+        axes = [words(a) * scale for a in 'XYZ']
+        has_axis = ~numpy.isnan(axes[0]) | ~numpy.isnan(axes[1]) | ~numpy.isnan(axes[2])
+        moves = has_axis & ~flag(AXIS_GCODES) & numpy.in1d(motion, (0, 10, 20, 30))
+        position = numpy.empty((size, 3))
+        for (i, values) in enumerate(axes):
+            is_set = ~numpy.isnan(values)
+            reset = is_set & (define_position | (moves & (absolute | machine_coords)))
+            increment = numpy.where(is_set & moves & ~reset, values, 0.0)
+            total = numpy.cumsum(increment)
+            last_reset = numpy.maximum.accumulate(numpy.where(reset, line_index, 0))
+            start = numpy.where(reset, values, 0.0)  # initial position: 0
+            position[:, i] = start[last_reset] + total - total[last_reset]
+        delta = position[1:] - position[:-1]  # [N - 1]: move made by line N
+
+        # Lines
+        lineno = numpy.flatnonzero(moves[1:]) + 1
+        d = delta[lineno - 1]
+        length = numpy.sqrt(numpy.sum(d ** 2, axis=1))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            unit = d / length[:, None]
+        (entry, exit_) = (unit, unit)
+        radius = numpy.zeros(len(lineno))
+
+        # Arcs (ref: grbl/gcode.c, grbl/motion_control.c: mc_arc)
+        is_arc = (motion[lineno] == 20) | (motion[lineno] == 30)
+        if is_arc.any():
+            arc_lineno = lineno[is_arc]
+            ccw = motion[arc_lineno] == 30
+            axis_index = numpy.array([PLANE_AXES[p] for p in (170, 180, 190)])
+            (a0, a1, a2) = axis_index[(plane[arc_lineno].astype(numpy.int64) - 170) // 10].T
+            rows = numpy.arange(len(arc_lineno))
+            arc_delta = d[is_arc]
+            (x, y) = (arc_delta[rows, a0], arc_delta[rows, a1])
+            arc_scale = scale[arc_lineno]
+
+            # center, relative to start: from I, J, K
+            offset = numpy.column_stack([
+                numpy.nan_to_num(words(letter)[arc_lineno]) * arc_scale for letter in 'IJK'
+            ])
+            (o0, o1) = (offset[rows, a0], offset[rows, a1])
+            start = position[arc_lineno - 1]
+            o0 = numpy.where(arc_absolute[arc_lineno], o0 - start[rows, a0], o0)
+            o1 = numpy.where(arc_absolute[arc_lineno], o1 - start[rows, a1], o1)
+
+            # center, relative to start: from R
+            r = words('R')[arc_lineno] * arc_scale
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                h_x2_div_d = -numpy.sqrt(numpy.maximum(4 * r * r - x * x - y * y, 0.0)) / numpy.hypot(x, y)
+                h_x2_div_d = numpy.where(ccw != (r < 0), -h_x2_div_d, h_x2_div_d)
+            has_r = ~numpy.isnan(r)
+            o0 = numpy.where(has_r, 0.5 * (x - (y * h_x2_div_d)), o0)
+            o1 = numpy.where(has_r, 0.5 * (y + (x * h_x2_div_d)), o1)
+
+            # radius vectors (center to start, center to end), and angle between
+            arc_radius = numpy.hypot(o0, o1)
+            (r0x, r0y, r1x, r1y) = (-o0, -o1, x - o0, y - o1)
+            angle = numpy.arctan2(r0x * r1y - r0y * r1x, r0x * r1x + r0y * r1y)
+            angle = numpy.where(~ccw & (angle >= -1e-7), angle - 2 * numpy.pi, angle)
+            angle = numpy.where(ccw & (angle <= 1e-7), angle + 2 * numpy.pi, angle)
+            arc_length = numpy.abs(angle) * arc_radius
+            linear = arc_delta[rows, a2]
+            helix_length = numpy.hypot(arc_length, linear)
+
+            # tangents at start & end (perpendicular to radius vectors)
+            sign = numpy.where(ccw, 1.0, -1.0)
+            (arc_entry, arc_exit) = (numpy.zeros((len(rows), 3)), numpy.zeros((len(rows), 3)))
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                planar = arc_length / (arc_radius * helix_length)
+                for (tangent, rx, ry) in ((arc_entry, r0x, r0y), (arc_exit, r1x, r1y)):
+                    tangent[rows, a0] = -sign * ry * planar
+                    tangent[rows, a1] = sign * rx * planar
+                    tangent[rows, a2] = linear / helix_length
+            # full circle: chord's direction is undefined, use the linear axis
+            arc_unit = unit[is_arc]
+            full_circle = length[is_arc] == 0
+            arc_unit[full_circle] = 0.0
+            arc_unit[rows[full_circle], a2[full_circle]] = 1.0
+
+            (entry, exit_) = (unit.copy(), unit.copy())
+            unit[is_arc] = arc_unit
+            entry[is_arc] = arc_entry
+            exit_[is_arc] = arc_exit
+            length[is_arc] = numpy.where(arc_radius > 0, helix_length, 0.0)  # (no radius: skipped)
+            radius[is_arc] = arc_radius
+
+        with numpy.errstate(invalid='ignore'):
+            keep = length > 0  # (zero length, or undefined arcs: skipped)
+        (lineno, length, unit, entry, exit_, radius) = (
+            a[keep] for a in (lineno, length, unit, entry, exit_, radius)
+        )
+
+        # Nominal speed (mm/sec)
+        speed = numpy.where(
+            inverse_time[lineno],
+            length * numpy.nan_to_num(feed[lineno]) / 60.,  # F: 1 / minutes to complete move
+            feed_modal[lineno] * scale[lineno] / 60.,
+        )
+        speed = numpy.where(motion[lineno] == 0, 0.0, speed)  # rapid: limited by axes' max rates
+
+        # Stops: any stop from the line after the last segment's, to this segment's
+        stop_count = numpy.cumsum(stop)
+        previous = numpy.concatenate(([0], lineno[:-1]))
+        stops = (stop_count[lineno] - stop_count[previous]) > 0
+        if len(stops):
+            stops[0] = True  # machine's stopped when the job starts
+
+        segments = numpy.column_stack([
+            lineno, length, unit, entry, exit_, speed, radius, stops,
+        ]).astype(numpy.float64) if len(lineno) else numpy.zeros((0, COLUMNS))
+
+        dwell_lineno = numpy.flatnonzero(dwell)
+        dwells = numpy.column_stack([dwell_lineno, numpy.nan_to_num(words('P')[dwell_lineno])])
+
+        return cls(segments, dwells.astype(numpy.float64), line_count)
+
+
+def _axis_limit(limits, unit):
+    """
+    Limit of a vector quantity, given each axis' limit (ref: grbl/planner.c:
+    limit_value_by_axis_maximum)
+    :param limits: (x, y, z) limit of each axis
+    :param unit: numpy array of unit vectors, shape: (N, 3)
+    :return: numpy array, shape: (N,)
+    """
+    with numpy.errstate(divide='ignore'):
+        return numpy.min(numpy.array(limits) / numpy.abs(unit), axis=1)
+
+
+def segment_times(toolpath, limits):
+    """
+    Time taken to execute each segment
+    :param toolpath: Toolpath instance
+    :param limits: MachineLimits instance
+    :return: numpy array of times (unit: sec)
+    """
+    seg = toolpath.segments
+    count = len(seg)
+    if not count:
+        return numpy.zeros(0)
+
+    length = seg[:, COL_LENGTH]
+    unit = seg[:, COL_UNIT_X:COL_UNIT_Z + 1]
+    entry = seg[:, COL_ENTRY_X:COL_ENTRY_Z + 1]
+    exit_ = seg[:, COL_EXIT_X:COL_EXIT_Z + 1]
+
+    # Nominal speed & acceleration (limited by each axis)
+    max_rate = _axis_limit(limits.max_rate, unit)
+    speed = seg[:, COL_SPEED]
+    speed = numpy.where(speed > 0, numpy.minimum(speed, max_rate), max_rate)
+    accel = _axis_limit(limits.acceleration, unit)
+
+    # Arcs: speed limited by the junctions between chords
+    radius = seg[:, COL_RADIUS]
+    is_arc = radius > 0
+    if is_arc.any():
+        # chords deviate from the arc by (at most) the arc tolerance; the
+        # junction formula below reduces to: v^2 = a * deviation * (r - tol) / tol
+        r = radius[is_arc]
+        tolerance = numpy.minimum(limits.arc_tolerance, r)
+        with numpy.errstate(divide='ignore'):
+            chord_speed = numpy.sqrt(
+                accel[is_arc] * limits.junction_deviation * (r - tolerance) / tolerance
+            )
+        speed[is_arc] = numpy.minimum(speed[is_arc], chord_speed)
+
+    # Max speed through junctions (ref: grbl/planner.c: plan_buffer_line)
+    #   cap[j]: max speed entering segment j (cap[count]: end of last segment)
+    cap = numpy.zeros(count + 1)
+    if count > 1:
+        (prev_exit, next_entry) = (exit_[:-1], entry[1:])
+        cos_theta = -numpy.sum(prev_exit * next_entry, axis=1)
+        junction = next_entry - prev_exit
+        junction_norm = numpy.sqrt(numpy.sum(junction ** 2, axis=1))
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            junction_accel = _axis_limit(limits.acceleration, junction / junction_norm[:, None])
+            sin_half = numpy.sqrt(numpy.clip(0.5 * (1.0 - cos_theta), 0.0, 1.0))
+            v_junction = numpy.sqrt(
+                junction_accel * limits.junction_deviation * sin_half / (1.0 - sin_half)
+            )
+        v_junction = numpy.where(cos_theta > 0.999999, 0.0, v_junction)  # reversal
+        v_junction = numpy.where(cos_theta < -0.999999, numpy.inf, v_junction)  # straight
+        v_junction = numpy.where(numpy.isnan(v_junction), 0.0, v_junction)
+        cap[1:-1] = numpy.minimum(v_junction, numpy.minimum(speed[:-1], speed[1:]))
+    cap[:-1] = numpy.where(seg[:, COL_STOP] > 0, 0.0, cap[:-1])
+    cap_sq = cap ** 2
+
+    # Planner passes, as running minimums (see module description)
+    delta_sq = 2 * accel * length  # max change in v^2 over each segment
+    forward = numpy.concatenate(([0.0], numpy.cumsum(delta_sq)))
+    backward = forward[-1] - forward
+    v_sq = numpy.minimum(
+        forward + numpy.minimum.accumulate(cap_sq - forward),
+        backward + numpy.minimum.accumulate((cap_sq - backward)[::-1])[::-1],
+    )
+    v_sq = numpy.maximum(v_sq, 0.0)  # rounding errors
+    (v0_sq, v1_sq) = (v_sq[:-1], v_sq[1:])
+    (v0, v1) = (numpy.sqrt(v0_sq), numpy.sqrt(v1_sq))
+
+    # Trapezoidal velocity profile of each segment
+    speed_sq = speed ** 2
+    accel_dist = (speed_sq - v0_sq) / (2 * accel)
+    decel_dist = (speed_sq - v1_sq) / (2 * accel)
+    cruise_dist = length - accel_dist - decel_dist
+    peak = numpy.where(
+        cruise_dist > 0, speed,
+        numpy.sqrt(numpy.maximum(v0_sq, (2 * accel * length + v0_sq + v1_sq) / 2)),
+    )
+    return ((peak - v0) + (peak - v1)) / accel + numpy.maximum(cruise_dist, 0.0) / speed
+
+
+class Estimate(object):
+    """
+    Estimated time to run a job, line by line
+    """
+
+    def __init__(self, toolpath, limits):
+        """
+        :param toolpath: Toolpath instance
+        :param limits: MachineLimits instance
+        """
+        times = segment_times(toolpath, limits)
+        line_count = toolpath.line_count
+        line_times = numpy.bincount(
+            toolpath.segments[:, COL_LINENO].astype(numpy.int64),
+            weights=times, minlength=line_count + 1,
+        )
+        if len(toolpath.dwells):
+            line_times += numpy.bincount(
+                toolpath.dwells[:, 0].astype(numpy.int64),
+                weights=toolpath.dwells[:, 1], minlength=line_count + 1,
+            )
+        self.segment_count = len(toolpath)
+        self.line_count = line_count
+        self.cumulative = numpy.cumsum(line_times)  # [N]: time when line N is complete
+        self.total = float(self.cumulative[-1])
+
+    def time_at(self, lineno):
+        """
+        :return: estimated time from the start of the job, until the given
+                 line is complete (unit: sec)
+        """
+        return float(self.cumulative[min(max(lineno, 0), self.line_count)])
+
+    def remaining(self, lineno):
+        """
+        :return: estimated time from the given line being complete, until
+                 the job is (unit: sec)
+        """
+        return self.total - self.time_at(lineno)
+
+
+def estimate_file(filename, settings=None):
+    """
+    :param filename: gcode file
+    :param settings: GRBL settings (see MachineLimits)
+    :return: Estimate instance
+    """
+    if numpy is None:
+        raise ImportError("numpy is required to estimate runtime")
+    return Estimate(Toolpath.read(filename), MachineLimits(settings))
+
+
+class EstimateThread(object):
+    """
+    Estimates a file's runtime on a background (daemon) thread; the work is
+    done by numpy, which releases the GIL, so streaming isn't slowed down.
+    (a thread, not a process: nothing's forked once serial ports are open,
+    and other threads are running)
+    """
+
+    def __init__(self, filename, settings=None):
+        self.estimate = None  # Estimate instance, once done
+        self.failed = None  # exception raised, if it failed
+        self._thread = threading.Thread(target=self._run, args=(filename, settings), name='estimate')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, filename, settings):
+        try:
+            self.estimate = estimate_file(filename, settings)
+        except Exception as e:
+            self.failed = e  # not estimated (eg: unreadable file)
+
+    @property
+    def done(self):
+        """True once estimated (or failed)"""
+        return (self.estimate is not None) or (self.failed is not None)
+
+    def result(self):
+        """
+        :return: Estimate instance, or None if not yet done (or if it failed)
+        """
+        return self.estimate
@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import argparse
+import collections
+
+from .engine import EventLoop
+from .headless import EventWriter, HeadlessJob
+from .arduino_tools import device_type
+
+
+# Machine farm
+#
+# Description:
+#   Streams a separate job to each of several GRBL devices from a single
+#   process (rather than a process per device, each polling its own port).
+#
+#   All devices share one engine.EventLoop (a single select() across every
+#   serial port); each has its own serial port, prepared lines, streamer &
+#   status poller (see headless.HeadlessJob), and goes through the headless
+#   stages on its own:
+#       - initialize: wake GRBL, read its version, mode & state
+#       - stream:     stream all lines
+#       - complete:   wait for the machine to be Idle
+#   A device is serviced the moment its port is readable, so each streams
+#   as it would on its own.
+#
+#   Events of all devices are written to one stream (headless event format),
+#   each with the device's name, eg:
+#       {"device": "ttyACM0", "event": "ok", "latency": 0.0041, "line": 12, "t": 1.208}
+#   and a final "farm" event summarizing them all.
+
+# name: device's name, as given (used in events & log names)
+FarmJobSpec = collections.namedtuple('FarmJobSpec', ['device', 'infile', 'name'])
+
+
+def parse_job(value):
+    """
+    Use as a 'type' for argparse parameter
+    :param value: 'DEVICE=FILE' (device: serial device, or Arduino's serial number)
+    :return: FarmJobSpec instance
+    """
+    if '=' not in value:
+        raise argparse.ArgumentTypeError("expected DEVICE=FILE, got '%s'" % value)
+    (device, infile) = value.split('=', 1)
+    return FarmJobSpec(device_type(device), infile, os.path.basename(device))
+
+
+class JobConfig(object):
+    """
+    config.Config with some settings overridden (eg: each device's serial
+    device, and file)
+    """
+
+    def __init__(self, config, **overrides):
+        self._config = config
+        self._overrides = overrides
+
+    def __getattr__(self, key):
+        if key in self._overrides:
+            return self._overrides[key]
+        return getattr(self._config, key)
+
+
+class FarmDevice(object):
+    """
+    A job streamed to one device, driven by the farm's (shared) loop
+    """
+    INIT_TIMEOUT = 5.0  # time to wait for GRBL to respond on initialization
+
+    def __init__(self, name, config, loop, event_stream):
+        """
+        :param name: device's name (added to its events)
+        :param config: JobConfig instance (for this device)
+        :param loop: engine.EventLoop instance (shared by all devices)
+        :param event_stream: writable file object (shared by all devices)
+        """
+        self.name = name
+        self.loop = loop
+        self.events = EventWriter(
+            event_stream,
+            status_interval=config.event_status_interval,
+            fields={'device': name},
+        )
+        self.job = HeadlessJob(config, self.events, loop=loop)
+        self.headless = self.job.headless
+        self.serial = self.job.serialport
+
+        self.stage = None  # 'init', 'stream', 'complete', or 'done'
+        self.exit_code = None
+        self._start_time = None
+        self._init_timer = None
+
+    # ----------------- Initialize -----------------
+    def start(self):
+        """Wake GRBL (initialized as its responses are received)"""
+        self.stage = 'init'
+        self._start_time = time.time()
+        self.loop.add_reader(self.serial, self._on_init_readable)
+        self._init_timer = self.loop.call_later(self.INIT_TIMEOUT, self._on_init_timeout)
+        self.serial.write('\r\n\r\n')
+
+    def _on_init_readable(self):
+        for line in self.serial.read_available():
+            if self.headless.on_init_line(line):
+                self.loop.remove_reader(self.serial)
+                self._init_timer.cancel()
+                self.stage = 'stream'
+                self.headless.start_stream(self.job.lines())
+                break
+
+    def _on_init_timeout(self):
+        if self.stage == 'init':
+            self.loop.remove_reader(self.serial)
+            self.headless.failed = "could not initialize GRBL serial interface"
+            self._finish()
+
+    # ----------------- Stages -----------------
+    def advance(self):
+        """
+        Move on to the next stage (if the current one is done)
+        :return: True when the job is done
+        """
+        if (self.stage == 'stream') and self.headless.streamed:
+            self.stage = 'complete'
+            self.headless.start_complete()
+        if (self.stage == 'complete') and self.headless.completed:
+            self.headless.stop()
+            self._finish()
+        return self.stage == 'done'
+
+    def _finish(self):
+        self.stage = 'done'
+        self.exit_code = self.headless.finish(time.time() - self._start_time)
+        self.job.close(self.exit_code)
+
+
+class Farm(object):
+    """
+    Streams to several devices on one loop (see module description)
+    """
+
+    def __init__(self, devices, loop):
+        """
+        :param devices: list of FarmDevice instances
+        :param loop: engine.EventLoop instance they share
+        """
+        self.devices = devices
+        self.loop = loop
+
+    def _advance(self):
+        return all([d.advance() for d in self.devices])  # (every device is advanced)
+
+    def run(self):
+        """
+        Stream all jobs, and wait for every device to finish
+        :return: exit code (0 if every job succeeded)
+        """
+        for device in self.devices:
+            device.start()
+        self.loop.run_until(self._advance)
+        return 1 if any(d.exit_code for d in self.devices) else 0
+
+
+def run(config, jobs):
+    """
+    Stream a file to each device, without a user interface
+    :param config: config.Config instance (shared settings)
+    :param jobs: list of FarmJobSpec instances
+    :return: exit code (0 if every job succeeded)
+    """
+    event_stream = sys.stdout
+    if config.event_file != '-':
+        event_stream = open(config.event_file, 'w')
+    file_counts = collections.Counter(os.path.abspath(j.infile) for j in jobs)
+
+    loop = EventLoop()
+    devices = []
+    exit_code = 1
+    try:
+        for job in jobs:
+            name = job.name
+            overrides = {'serial_device': job.device, 'infile': job.infile, 'start_line': 1}
+            if config.serial_logging:
+                # a log for each device: grbl-stream.log -> grbl-stream.ttyACM0.log
+                (root, ext) = os.path.splitext(config.serial_log_file)
+                overrides['serial_log_file'] = '%s.%s%s' % (root, name, ext)
+            if file_counts[os.path.abspath(job.infile)] > 1:
+                overrides['journal'] = False  # journals are kept per file
+            devices.append(FarmDevice(name, JobConfig(config, **overrides), loop, event_stream))
+
+        start_time = time.time()
+        exit_code = Farm(devices, loop).run()
+        events = EventWriter(event_stream)
+        events.emit(
+            'farm',
+            success=(exit_code == 0),
+            devices=len(devices),
+            failed=[d.name for d in devices if d.exit_code],
+            elapsed=round(time.time() - start_time, 3),
+        )
+        events.flush()
+        return exit_code
+    finally:
+        for device in devices:
+            if device.stage != 'done':
+                device.job.close(exit_code)
+        if event_stream is not sys.stdout:
+            event_stream.close()
@@ -0,0 +1,113 @@
+import re
+
+
+# Self-calibrating flow control
+#
+# Description:
+#   Lines are streamed by counting the characters in GRBL's serial RX buffer
+#   (see streamer.GCodeStreamer); the host never sends more than max_buffer
+#   bytes that haven't yet been acknowledged. max_buffer must match GRBL's
+#   actual buffer (grbl_buffer_size, normally 128 bytes):
+#       - too high: GRBL's buffer overflows, characters are dropped
+#       - too low: lines wait to be sent that would have fit
+#
+#   GRBL reports the bytes free in its RX buffer (rx_free) in status reports
+#   (Bf: field, if $10 includes 2). Bytes the host has sent, but hasn't had
+#   acknowledged (used), are either in GRBL's RX buffer, or in transit; so
+#   at any time, for GRBL's actual buffer size:
+#       rx_free <= size - unaccounted <= rx_free + used
+#   where "unaccounted" are bytes in GRBL's buffer the host isn't counting
+#   (ie: accounting drift; eg: a line written around the streamer). The
+#   limit can't be trusted outside those bounds, so a BufferCalibrator
+#   corrects it with each report:
+#       - limit > rx_free + used: lowered (GRBL's buffer is smaller, or
+#         drift); more would overflow it
+#       - limit < rx_free: raised (GRBL has more room than the limit allows)
+#   With nothing in flight (used = 0), the two bounds meet; the limit is
+#   exactly what's free.
+#
+#   Drift the other way (bytes counted as sent, that GRBL will never
+#   acknowledge; eg: a response lost in transit) shows as lines still
+#   unacknowledged while GRBL is Idle with its buffer empty. Once that's
+#   reported for a while, those lines are no longer counted (see
+#   GCodeStreamer.discard_sent), so streaming isn't held back by them. The
+#   limit itself is never raised beyond the largest rx_free reported.
+#   GRBL holds back a dwell's (G4) 'ok' until it's done, while reporting
+#   Idle; so lines are never discarded while a dwell is the oldest.
+#
+#   Each correction is reported as a warning.
+
+DWELL_REGEX = re.compile(br'^G0*4(?![\d.])', re.IGNORECASE)  # (line's data)
+
+
+class BufferCalibrator(object):
+    """
+    Corrects a GCodeStreamer's max_buffer from the RX buffer state reported
+    by GRBL (see module description)
+    """
+    # Idle reports (with GRBL's buffer empty) before unacknowledged lines are
+    # assumed lost
+    STALE_REPORTS = 10
+
+    def __init__(self, streamer, warning_callback=None):
+        """
+        :param streamer: streamer.GCodeStreamer instance (max_buffer is set)
+        :param warning_callback: called with a description (str) of each
+                                 correction made
+        """
+        self.streamer = streamer
+        self.warning_callback = warning_callback
+        self.configured = streamer.max_buffer  # limit before calibration
+        self.size = None  # GRBL's buffer size, at least (largest rx_free reported)
+        # drift (latest report):
+        #   > 0: bytes in GRBL's buffer unaccounted for (at least)
+        #   < 0: bytes sent that GRBL will never acknowledge
+        self.drift = 0
+        self.corrections = 0
+        self._stale = None  # (reports, oldest line) while GRBL's idle, with responses due
+
+    def _warn(self, text):
+        self.corrections += 1
+        if self.warning_callback:
+            self.warning_callback(text)
+
+    def update(self, report):
+        """
+        :param report: status.StatusReport instance (just updated)
+        """
+        rx_free = report.rx_free
+        if rx_free is None:
+            return  # buffer state isn't reported
+        self.size = max(self.size or 0, rx_free)
+
+        used = self.streamer.used_buffer
+        available = rx_free + used
+        limit = self.streamer.max_buffer
+        self.drift = max(0, self.size - available)
+        if limit > available:
+            self.streamer.max_buffer = available
+            if self.drift:
+                self._warn("%i bytes in GRBL's RX buffer are unaccounted for; buffer limit lowered to %i" % (
+                    self.drift, available))
+            else:
+                self._warn("GRBL has %i bytes free, %i in flight; buffer limit lowered to %i" % (
+                    rx_free, used, available))
+        elif limit < rx_free:
+            self.streamer.max_buffer = rx_free
+            self._warn("GRBL has %i bytes free; buffer limit raised to %i" % (rx_free, rx_free))
+
+        # Responses that will never come
+        oldest = self.streamer.sent_lines[0] if used else None
+        if (report.state == 'Idle') and (rx_free == self.size) and used \
+                and not DWELL_REGEX.search(oldest.data):
+            count = (self._stale[0] + 1) if (self._stale and (self._stale[1] is oldest)) else 1
+            self._stale = (count, oldest)
+            if count == self.STALE_REPORTS:
+                # GRBL's idle, and its buffer's empty; every line sent has been processed
+                self.drift = -used
+                lines = self.streamer.discard_sent(len(self.streamer.sent_lines))
+                self._warn("%i bytes sent (%i lines) were never acknowledged; no longer counted" % (
+                    used, len(lines)))
+                self._stale = None
+        else:
+            self._stale = None
@@ -108,3 +108,47 @@ SETTING_MAP = {
     131: "Y-axis maximum travel, millimeters",
     132: "Z-axis maximum travel, millimeters",
 }
+
+# Setting Defaults
+#   GRBL 1.1f defaults (ref: grbl/defaults.h: DEFAULTS_GENERIC)
+SETTING_DEFAULTS = {
+    0: 10, 1: 25, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0,
+    10: 1, 11: 0.010, 12: 0.002, 13: 0,
+    20: 0, 21: 0, 22: 0, 23: 0, 24: 25.0, 25: 500.0, 26: 250, 27: 1.0,
+    30: 1000, 31: 0, 32: 0,
+    100: 250.0, 101: 250.0, 102: 250.0,
+    110: 500.0, 111: 500.0, 112: 500.0,
+    120: 10.0, 121: 10.0, 122: 10.0,
+    130: 200.0, 131: 200.0, 132: 200.0,
+}
+assert set(SETTING_DEFAULTS) == set(SETTING_MAP), "setting defaults out of sync with SETTING_MAP"
+
+# ====================== Real-time Commands ======================
+# Single characters, acted on by GRBL as soon as they're received; they're
+# picked out of the serial stream (they don't occupy GRBL's RX buffer), so
+# they may be sent at any time (even mid-line).
+# ref: https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands#grbl-v11-realtime-commands
+REALTIME_COMMAND_MAP = {
+    'status': '?',
+    'hold': '!',
+    'resume': '~',
+    'reset': '\x18',
+    'safety_door': '\x84',
+    'jog_cancel': '\x85',
+    'feed_override_reset': '\x90',
+    'feed_override_plus_10': '\x91',
+    'feed_override_minus_10': '\x92',
+    'feed_override_plus_1': '\x93',
+    'feed_override_minus_1': '\x94',
+    'rapid_override_reset': '\x95',
+    'rapid_override_50': '\x96',
+    'rapid_override_25': '\x97',
+    'spindle_override_reset': '\x99',
+    'spindle_override_plus_10': '\x9A',
+    'spindle_override_minus_10': '\x9B',
+    'spindle_override_plus_1': '\x9C',
+    'spindle_override_minus_1': '\x9D',
+    'spindle_stop': '\x9E',
+    'flood_coolant': '\xA0',
+    'mist_coolant': '\xA1',
+}
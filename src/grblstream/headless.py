@@ -0,0 +1,520 @@
+import re
+import sys
+import json
+import time
+
+from .streamer import SerialPort, GCodeStreamer
+from .engine import StreamEngine, NOT_READY
+from .polling import StatusPoller
+from .status import StatusReport
+from .jobcache import open_source
+from .journal import open_journal
+from .instrument import StreamMonitor
+from .flowcontrol import BufferCalibrator
+from .seriallog import open_serial_log
+
+
+# Headless streaming
+#
+# Description:
+#   Streams a gcode file without a user interface (no curses), going
+#   through the same stages as the grbl-stream script:
+#       - initialize: wake GRBL, read its version, mode, settings & state
+#       - stream:     stream all lines, driven by an engine.StreamEngine
+#       - complete:   wait for all responses, and for the machine to be Idle
+#
+#   Progress is written as newline-delimited JSON events, eg:
+#       {"event": "sent", "gcode": "G1 X10 F100", "line": 12, "t": 1.204}
+#       {"event": "ok", "latency": 0.0041, "line": 12, "t": 1.208}
+#       {"event": "status", "mpos": [10.0, 0.0, 0.0], "state": "Run", "t": 1.25}
+#
+#   Events:
+#       job     file being streamed; total lines, and first line streamed
+#       init    GRBL's banner, version & mode
+#       sent    line transmitted
+#       ok      line acknowledged (latency: time since it was sent)
+#       error   line rejected by GRBL (code: error number)
+#       status  status report (only when changed, and rate limited)
+#       alarm   ALARM:N received
+#       message any other text received (eg: [MSG:...])
+#       warning buffer limit corrected (see flowcontrol.BufferCalibrator)
+#       hold    feed hold sent, streaming stopped (after an error or alarm)
+#       merge   lines & bytes removed by merging (see merge.LineMerger)
+#       encode  bytes saved by compact encoding (see encode.WireEncoder)
+#       instrument  buffer & starvation summary (see instrument.StreamMonitor)
+#       done    summary; last event written
+
+# GRBL setting (response to '$$'), eg: "$12=0.002"
+SETTING_REGEX = re.compile(r'^\$(?P<key>\d+)=(?P<value>\S+)')
+
+
+class EventWriter(object):
+    """
+    Writes events to a file as newline-delimited JSON.
+
+    Events are buffered, and only written on flush(); call it periodically
+    (eg: from an EventLoop timer) so writing never delays transmission.
+    Status events are rate limited (they're only informative, and can be
+    received very often); the latest is kept, the rest are discarded.
+    """
+    DEFAULT_STATUS_INTERVAL = 0.25
+
+    def __init__(self, stream, status_interval=None, fields=None):
+        """
+        :param stream: writable file object
+        :param status_interval: min time between status events (unit: sec)
+        :param fields: dict of fields added to every event (eg: device)
+        """
+        self.stream = stream
+        self.fields = fields or {}
+        self.status_interval = status_interval if status_interval is not None else self.DEFAULT_STATUS_INTERVAL
+        self.start_time = time.time()
+
+        self.event_count = 0
+        self.status_dropped = 0  # status events replaced by a newer one
+
+        self._buffer = []  # events not yet written
+        self._status = None  # latest status event (if not yet buffered)
+        self._status_time = None  # time status event was last buffered
+
+    def emit(self, event, **fields):
+        fields.update(self.fields)
+        fields['event'] = event
+        fields['t'] = round(time.time() - self.start_time, 6)
+        self._buffer.append(fields)
+
+    def emit_status(self, **fields):
+        """Status event; buffered if none has been for status_interval"""
+        fields.update(self.fields)
+        fields['event'] = 'status'
+        fields['t'] = round(time.time() - self.start_time, 6)
+        if self._status is not None:
+            self.status_dropped += 1
+        self._status = fields
+        self._buffer_status()
+
+    def _buffer_status(self, force=False):
+        if self._status is None:
+            return
+        now = time.time()
+        if force or (self._status_time is None) or (now - self._status_time >= self.status_interval):
+            # still the latest report; stamped now so events remain in order
+            self._status['t'] = round(now - self.start_time, 6)
+            self._buffer.append(self._status)
+            self._status = None
+            self._status_time = now
+
+    def flush(self, force=False):
+        """
+        Write buffered events
+        :param force: if True, the latest status event is written (if rate limited)
+        """
+        self._buffer_status(force=force)
+        if self._buffer:
+            self.stream.write(''.join(
+                json.dumps(e, sort_keys=True) + '\n'
+                for e in self._buffer
+            ))
+            self.event_count += len(self._buffer)
+            self._buffer = []
+        self.stream.flush()
+
+
+class HeadlessStreamer(object):
+    """
+    Streams lines to GRBL, writing events as it goes.
+    """
+    DEFAULT_FLUSH_INTERVAL = 0.2
+    INIT_TIMEOUT = 5.0  # time to wait for GRBL to respond on initialization
+    FAILED_TIMEOUT = 5.0  # time to wait for remaining responses after a failure
+
+    class Line(GCodeStreamer.Line):
+        """
+        Line of gcode that emits an event when it's sent, and when it's
+        responded to
+        """
+        __slots__ = ('sent_time', 'events')
+
+        def __init__(self, gcode, lineno, events, data=None):
+            super(HeadlessStreamer.Line, self).__init__(gcode, data=data, lineno=lineno)
+            self.sent_time = None
+            self.events = events
+
+        def set_sent(self, value=True):
+            self.sent_time = time.time()
+            self.events.emit('sent', line=self.lineno, gcode=self.gcode)
+
+        def set_status(self, msg):
+            latency = round(time.time() - self.sent_time, 6)
+            if msg.startswith('error'):
+                self.events.emit('error', line=self.lineno, latency=latency, code=msg)
+            else:
+                self.events.emit('ok', line=self.lineno, latency=latency)
+
+    def __init__(self, serial, events, max_buffer=None, fill_buffer=False,
+                 pending_count=None, status_poller=None, flush_interval=None,
+                 journal=None, monitor=None, calibrate=False, loop=None):
+        """
+        :param serial: SerialPort instance
+        :param events: EventWriter instance
+        :param max_buffer: GRBL's RX buffer size
+        :param fill_buffer: see GCodeStreamer
+        :param pending_count: see engine.StreamEngine
+        :param status_poller: polling.StatusPoller instance (None for no status)
+        :param flush_interval: time between writing buffered events (unit: sec)
+        :param journal: journal.Journal instance (None for no journal)
+        :param monitor: instrument.StreamMonitor instance (None for no instrumentation)
+        :param calibrate: if True, the buffer limit is corrected from GRBL's
+                          reported RX buffer state (see flowcontrol)
+        :param loop: engine.EventLoop instance (default: a new one)
+        """
+        self.serial = serial
+        self.events = events
+        self.journal = journal
+        self.monitor = monitor
+        self.flush_interval = flush_interval if flush_interval is not None else self.DEFAULT_FLUSH_INTERVAL
+
+        self.streamer = GCodeStreamer(serial, max_buffer, fill_buffer=fill_buffer,
+                                      journal=journal, monitor=monitor)
+        self.engine = StreamEngine(
+            serial, self.streamer,
+            loop=loop,
+            pending_count=pending_count,
+            status_poller=status_poller,
+        )
+        self.engine.status_callback = self._on_status
+        self.engine.message_callback = self._on_message
+        self.engine.alarm_callback = self._on_alarm
+        self.engine.error_callback = self._on_error
+        self.engine.response_callback = self._on_response
+        self.calibrator = None
+        if calibrate:
+            self.calibrator = BufferCalibrator(self.streamer, warning_callback=self._on_warning)
+
+        self.status = StatusReport()
+        self.grbl_settings = {}  # GRBL's settings, read on initialization ($$), eg: {'12': '0.002'}
+        self.failed = None  # reason streaming was stopped (str)
+        self.response_count = 0
+        self.error_count = 0
+        self.status_count = 0  # status reports received
+        self._flush_timer = None
+        self._complete_status_count = None
+        self._complete_timeout = None
+
+    # ----------------- Callbacks -----------------
+    def _on_status(self, line):
+        self.status_count += 1
+        changed = self.status.update(line)
+        if self.journal and ('mpos' in changed):
+            self.journal.position(self.status)
+        if self.calibrator:
+            self.calibrator.update(self.status)
+        if self.monitor:
+            self.monitor.status(self.status)
+        if changed:
+            self.events.emit_status(**dict(
+                (name, getattr(self.status, name))
+                for name in StatusReport.FIELDS
+                if getattr(self.status, name) not in (None, '')
+            ))
+
+    def _on_message(self, line):
+        self.events.emit('message', text=line)
+
+    def _on_warning(self, text):
+        self.events.emit('warning', text=text)
+
+    def _on_alarm(self, line):
+        self.events.emit('alarm', code=line)
+        self.fail(line)
+
+    def _on_response(self, line):
+        self.response_count += 1
+
+    def _on_error(self, exception):
+        self.error_count += 1
+        self.fail(str(exception))
+
+    def _flush(self):
+        self.events.flush()
+        self._flush_timer = self.engine.loop.call_later(self.flush_interval, self._flush)
+
+    def fail(self, reason):
+        """Hold machine, and stop streaming"""
+        if self.failed is None:
+            self.failed = reason
+            self.serial.realtime('hold')
+            self.engine.source = None  # nothing more is sent
+            self.events.emit('hold', reason=reason)
+
+    # ----------------- Stages -----------------
+    def on_init_line(self, line):
+        """
+        Handle a line received while initializing
+        :return: True once initialized (GRBL's state has been received)
+        """
+        line = line.strip()
+        setting_match = SETTING_REGEX.search(line)
+        if line.startswith('Grbl'):
+            self.events.emit('init', banner=line)
+            self.serial.write('$I\n')
+        elif line.startswith('[VER:'):
+            self.events.emit('init', version=line)
+            self.serial.write('$G\n')
+        elif line.startswith('[GC:'):
+            self.events.emit('init', mode=line)
+            self.serial.write('$$\n')
+        elif setting_match:
+            self.grbl_settings[setting_match.group('key')] = setting_match.group('value')
+        elif line.startswith('ok') and self.grbl_settings:
+            self.serial.realtime('status')  # ($$ is done)
+        elif line.startswith('<'):
+            self._on_status(line)
+            self.serial.serial.flushInput()
+            return True
+        return False
+
+    def initialize(self):
+        """
+        Wake GRBL, and wait for its version, mode, settings & state
+        :return: True if initialized
+        """
+        self.serial.write('\r\n\r\n')
+        end_time = time.time() + self.INIT_TIMEOUT
+        while time.time() < end_time:
+            for line in self.serial.readlines(timeout=0.05):
+                if self.on_init_line(line):
+                    return True
+        return False
+
+    def start_stream(self, lines):
+        """
+        Start streaming lines (without waiting; see streamed)
+        :param lines: iterable of HeadlessStreamer.Line instances
+        """
+        self.engine.start()
+        self._flush()
+        if self.monitor:
+            lines = self._monitored(lines)
+        self.engine.stream(lines)
+
+    @property
+    def streamed(self):
+        """True when all lines are acknowledged (or streaming failed)"""
+        return bool(self.engine.finished or self.failed)
+
+    def stream(self, lines):
+        """
+        Stream lines, and wait for them all to be acknowledged
+        :param lines: iterable of HeadlessStreamer.Line instances
+        """
+        self.start_stream(lines)
+        self.engine.loop.run_until(lambda: self.streamed)
+
+    def _monitored(self, lines):
+        """
+        :return: generator of lines; monitor is stopped once they've all
+                 been read (GRBL's planner empties from there on)
+        """
+        self.monitor.start()
+        for line in lines:
+            yield line
+        self.monitor.stop()
+
+    def start_complete(self):
+        """Start waiting for the machine to finish (without waiting; see completed)"""
+        self._complete_status_count = self.status_count
+        self._complete_timeout = time.time() + self.FAILED_TIMEOUT
+        if not self.failed:
+            self.engine.boost_status()
+
+    @property
+    def completed(self):
+        """True when the machine has finished (is Idle)"""
+        if self.failed:
+            # remaining lines may never be acknowledged (machine is held)
+            return self.streamer.finished or (time.time() >= self._complete_timeout)
+        elif self.engine.status_poller:
+            # wait for a report (received after the last response) to be Idle
+            return (self.status_count > self._complete_status_count) and (self.status.state == 'Idle')
+        return True
+
+    def stop(self):
+        """Unregister from the loop (once completed)"""
+        self.engine.stop()
+        if self._flush_timer:
+            self._flush_timer.cancel()
+
+    def complete(self):
+        """Wait for the machine to finish (be Idle)"""
+        self.start_complete()
+        self.engine.loop.run_until(lambda: self.completed)
+        self.stop()
+
+    def finish(self, elapsed):
+        """
+        Write the final events
+        :param elapsed: time taken (unit: sec)
+        :return: exit code (0 on success)
+        """
+        self.events.flush(force=True)  # so 'done' is last
+        if self.monitor and self.monitor.start_time:
+            self.monitor.stop()  # (if streaming failed)
+            self.events.emit('instrument', **self.monitor.summary())
+        self.events.emit(
+            'done',
+            success=not self.failed,
+            reason=self.failed,
+            lines=self.response_count,
+            errors=self.error_count,
+            elapsed=round(elapsed, 3),
+        )
+        self.events.flush(force=True)
+        return 1 if self.failed else 0
+
+    def run(self, lines):
+        """
+        Initialize GRBL, stream lines, and wait for completion
+        :return: exit code (0 on success)
+        """
+        start_time = time.time()
+        if not self.initialize():
+            self.failed = "could not initialize GRBL serial interface"
+        else:
+            self.stream(lines)
+            self.complete()
+        return self.finish(time.time() - start_time)
+
+
+def read_lines(pipeline, events, preamble=()):
+    """
+    :param pipeline: pipeline.Pipeline instance (or equivalent, see jobcache)
+    :param events: EventWriter instance (for HeadlessStreamer.Line instances)
+    :param preamble: gcode lines sent first (eg: to resume a job, see journal)
+    :return: generator of HeadlessStreamer.Line instances (in file order), or
+             engine.NOT_READY while the pipeline's next line isn't ready
+    """
+    for gcode in preamble:
+        yield HeadlessStreamer.Line(gcode, None, events)
+    while True:
+        item = pipeline.get(timeout=0)  # don't wait; GRBL needs servicing
+        if item is None:
+            if pipeline.finished:
+                break
+            yield NOT_READY
+            continue
+        if item.send:
+            line = HeadlessStreamer.Line(item.gcode, item.lineno, events, data=item.data)
+            if line:  # blank lines aren't sent
+                yield line
+    merger = getattr(pipeline, 'merger', None)  # see merge.LineMerger
+    if merger:
+        events.emit('merge', lines=merger.lines_removed, bytes=merger.bytes_removed)
+    encoder = getattr(pipeline, 'encoder', None)  # see encode.WireEncoder
+    if encoder:
+        events.emit(
+            'encode',
+            lines=encoder.line_count,
+            bytes_in=encoder.bytes_in,
+            bytes_out=encoder.bytes_out,
+            saved_per_line=round(encoder.bytes_saved_per_line, 2),
+        )
+
+
+class HeadlessJob(object):
+    """
+    Serial port, prepared lines, journal & HeadlessStreamer to stream
+    config.infile to config.serial_device (see run).
+    The file is opened when its lines are first read (see lines), once GRBL
+    is initialized; lines may be prepared using GRBL's settings (eg: merged
+    within its arc tolerance)
+    """
+
+    def __init__(self, config, events, loop=None):
+        """
+        :param config: config.Config instance
+        :param events: EventWriter instance
+        :param loop: engine.EventLoop instance (default: a new one)
+        """
+        self.events = events
+        self.serialport = SerialPort(
+            config.serial_device,
+            config.serial_baudrate,
+            log=open_serial_log(config),
+        )
+
+        status_poller = None
+        if config.status_polling and config.status_poll_interval:
+            status_poller = StatusPoller(
+                self.serialport,
+                interval=config.status_poll_interval,
+                min_interval=min(config.status_poll_min_interval, config.status_poll_interval),
+                max_interval=max(config.status_poll_max_interval, config.status_poll_interval),
+            )
+
+        self.config = config
+        self.pipeline = None  # opened by lines()
+        self.journal = None
+
+        self.headless = HeadlessStreamer(
+            self.serialport, events,
+            max_buffer=config.grbl_buffer_size,
+            fill_buffer=config.grbl_fill_buffer,
+            pending_count=config.stream_pending_count,
+            status_poller=status_poller,
+            monitor=StreamMonitor() if config.stream_instrumentation else None,
+            calibrate=config.grbl_buffer_calibration,
+            loop=loop,
+        )
+
+    def _open(self):
+        config = self.config
+        self.pipeline = open_source(config, grbl_settings=self.headless.grbl_settings)
+        self.events.emit(
+            'job',
+            file=config.infile,
+            lines=self.pipeline.line_count,  # None if unknown (stdin)
+            start_line=config.start_line,
+        )
+        self.journal = open_journal(config, self.pipeline.line_count)
+        self.headless.journal = self.headless.streamer.journal = self.journal
+
+    def lines(self, preamble=()):
+        """
+        :return: generator of lines to stream (see read_lines); the file's
+                 opened when the first is read (GRBL's settings are known)
+        """
+        self._open()
+        for line in read_lines(self.pipeline, self.events, preamble):
+            yield line
+
+    def close(self, exit_code):
+        if self.journal:
+            self.journal.close(complete=(exit_code == 0))
+        if self.pipeline:
+            self.pipeline.close()
+        self.serialport.serial.close()
+        if self.serialport.log:
+            self.serialport.log.close()
+
+
+def run(config, preamble=()):
+    """
+    Stream config.infile without a user interface
+    :param config: config.Config instance
+    :param preamble: gcode lines sent before the file (see read_lines)
+    :return: exit code (0 on success)
+    """
+    event_stream = sys.stdout
+    if config.event_file != '-':
+        event_stream = open(config.event_file, 'w')
+    events = EventWriter(event_stream, status_interval=config.event_status_interval)
+    job = HeadlessJob(config, events)
+    exit_code = 1
+    try:
+        exit_code = job.headless.run(job.lines(preamble))
+        return exit_code
+    finally:
+        job.close(exit_code)
+        if event_stream is not sys.stdout:
+            event_stream.close()
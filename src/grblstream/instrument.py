@@ -0,0 +1,246 @@
+import time
+import array
+import collections
+
+
+# Streaming instrumentation
+#
+# Description:
+#   When the machine stutters, the cause is one of:
+#       - host:  lines weren't ready to send (eg: reading / preparing the
+#                file took too long), nothing was in flight
+#       - link:  lines were sent, but hadn't reached GRBL yet (or its
+#                responses hadn't reached us); serial latency
+#       - grbl:  lines were waiting in GRBL's RX buffer, but not yet parsed
+#                & planned (eg: arcs, or very short moves)
+#   A StreamMonitor samples, while a job is streamed:
+#       - host:  bytes sent, but not yet acknowledged (see GCodeStreamer)
+#       - GRBL:  free planner blocks, and free RX buffer bytes (Bf: field of
+#                status reports; enabled by including 2 in the $10 mask)
+#       - time between responses (ok / error)
+#   A status report with GRBL's planner (nearly) empty, while the machine's
+#   running (or idle) mid-job, is starvation; consecutive starved reports
+#   make a starvation period, attributed to a cause (above) from where the
+#   data was at the time, and to the lines GRBL was executing.
+#
+#   A summary (and report) is made at the end of the job.
+
+# Period the planner ran (nearly) dry
+#   start:      time starvation was first reported (sec from start of job)
+#   duration:   time until it was reported to have recovered (unit: sec)
+#   first_line: last line acknowledged when starvation started
+#   last_line:  last line acknowledged when it recovered
+#   cause:      'host', 'link', or 'grbl' (most frequent cause reported)
+StarvationPeriod = collections.namedtuple('StarvationPeriod', [
+    'start', 'duration', 'first_line', 'last_line', 'cause',
+])
+
+
+class _Stat(object):
+    """Running mean, min & max of a sampled value"""
+    __slots__ = ('count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = value if (self.min is None) else min(self.min, value)
+        self.max = value if (self.max is None) else max(self.max, value)
+
+    @property
+    def mean(self):
+        return (self.total / self.count) if self.count else None
+
+    def summary(self):
+        if not self.count:
+            return None
+        return {'mean': round(self.mean, 3), 'min': self.min, 'max': self.max}
+
+
+class StreamMonitor(object):
+    """
+    Samples buffer occupancy (host & GRBL) while a job's streamed, and finds
+    periods the planner was starved (see module description)
+    """
+    # planner is starved with this many blocks (or fewer) queued
+    DEFAULT_STARVED_BLOCKS = 1
+
+    def __init__(self, starved_blocks=None):
+        """
+        :param starved_blocks: blocks queued in GRBL's planner at (or below)
+                               which it's considered starved
+        """
+        self.starved_blocks = starved_blocks if starved_blocks is not None else self.DEFAULT_STARVED_BLOCKS
+        self.start_time = None
+        self.end_time = None
+        self.streaming = False
+
+        # GRBL's buffer sizes (largest free counts reported; ie: when empty)
+        self.planner_size = 0
+        self.rx_size = 0
+
+        # host
+        self.used_buffer = 0  # bytes sent, not yet acknowledged
+        self.last_acknowledged = None  # line number of last line acknowledged
+
+        # samples
+        self.host_buffer = _Stat()  # bytes in flight (at each status report)
+        self.planner_blocks = _Stat()  # blocks queued in planner
+        self.rx_used = _Stat()  # bytes in GRBL's RX buffer
+        self.response_intervals = array.array('d')
+        self.status_count = 0
+        self.buffer_reports = 0  # status reports with a Bf: field
+        self._last_response = None
+
+        # starvation
+        self.periods = []  # StarvationPeriod instances
+        self._starved = None  # (start time, first line, Counter of causes) of current period
+
+    # ----------------- Job -----------------
+    def start(self):
+        """Job started streaming"""
+        self.start_time = self._last_response = time.time()
+        self.streaming = True
+
+    def stop(self):
+        """All lines of the job have been sent (planner empties from here on)"""
+        if self.streaming:
+            self.end_time = time.time()
+            self._end_starvation(self.end_time)
+            self.streaming = False
+
+    # ----------------- Samples (see GCodeStreamer) -----------------
+    def transmitted(self, lines):
+        """
+        :param lines: GCodeStreamer.Line instances written to serial
+        """
+        self.used_buffer += sum(l.size for l in lines)
+
+    def acknowledged(self, line):
+        """
+        :param line: GCodeStreamer.Line instance GRBL responded to
+        """
+        now = time.time()
+        self.used_buffer -= line.size
+        if line.lineno is not None:
+            self.last_acknowledged = line.lineno
+        if self.start_time is not None:  # (including those after stop())
+            self.response_intervals.append(now - self._last_response)
+        self._last_response = now
+
+    def status(self, report):
+        """
+        :param report: status.StatusReport instance (just updated)
+        """
+        if report.planner_free is None:
+            return  # buffer state isn't reported
+        self.planner_size = max(self.planner_size, report.planner_free)
+        self.rx_size = max(self.rx_size, report.rx_free)
+        if not self.streaming:
+            return
+        now = time.time()
+        self.status_count += 1
+        self.buffer_reports += 1
+
+        queued = self.planner_size - report.planner_free
+        rx_used = self.rx_size - report.rx_free
+        self.host_buffer.add(self.used_buffer)
+        self.planner_blocks.add(queued)
+        self.rx_used.add(rx_used)
+
+        if (queued <= self.starved_blocks) and (report.state in ('Run', 'Idle')):
+            if self.used_buffer <= 0:
+                cause = 'host'  # nothing was sent to GRBL
+            elif rx_used > 0:
+                cause = 'grbl'  # sent, but waiting to be planned
+            else:
+                cause = 'link'  # sent, but not yet received
+            if self._starved is None:
+                self._starved = (now, self.last_acknowledged, collections.Counter())
+            self._starved[2][cause] += 1
+        else:
+            self._end_starvation(now)
+
+    def _end_starvation(self, now):
+        if self._starved is None:
+            return
+        (start, first_line, causes) = self._starved
+        self._starved = None
+        self.periods.append(StarvationPeriod(
+            start=start - self.start_time,
+            duration=now - start,
+            first_line=first_line,
+            last_line=self.last_acknowledged,
+            cause=causes.most_common(1)[0][0],
+        ))
+
+    # ----------------- Report -----------------
+    @property
+    def starved_time(self):
+        return sum(p.duration for p in self.periods)
+
+    def summary(self):
+        """
+        :return: dict summarizing the job (json serializable)
+        """
+        intervals = sorted(self.response_intervals)
+        response = None
+        if intervals:
+            response = {
+                'mean': round(sum(intervals) / len(intervals), 6),
+                'p99': round(intervals[min(len(intervals) - 1, int(len(intervals) * 0.99))], 6),
+                'max': round(intervals[-1], 6),
+            }
+        causes = collections.Counter()
+        for period in self.periods:
+            causes[period.cause] += period.duration
+        end_time = self.end_time or time.time()
+        return {
+            'elapsed': round(end_time - self.start_time, 3) if self.start_time else None,
+            'responses': len(intervals),
+            'response_interval': response,
+            'status_reports': self.status_count,
+            'buffer_reports': self.buffer_reports,
+            'host_buffer': self.host_buffer.summary(),
+            'planner_blocks': self.planner_blocks.summary(),
+            'rx_used': self.rx_used.summary(),
+            'starved_time': round(self.starved_time, 3),
+            'starved_by': dict((c, round(t, 3)) for (c, t) in causes.items()),
+            'starvation': [p._asdict() for p in self.periods],
+        }
+
+    def report(self, max_periods=5):
+        """
+        :param max_periods: longest starvation periods listed
+        :return: list of lines (str) summarizing the job
+        """
+        summary = self.summary()
+        lines = []
+        response = summary['response_interval']
+        if response:
+            lines.append("responses: %i, interval mean %.1fms, p99 %.1fms, max %.1fms" % (
+                summary['responses'], response['mean'] * 1e3, response['p99'] * 1e3, response['max'] * 1e3,
+            ))
+        if not summary['buffer_reports']:
+            lines.append("no buffer state reported (Bf:); set $10 to include 2")
+            return lines
+        lines.append("host buffer: mean %.0f, max %i bytes" % (
+            summary['host_buffer']['mean'], summary['host_buffer']['max']))
+        lines.append("planner: mean %.1f, min %i blocks queued; RX: mean %.0f, max %i bytes used" % (
+            summary['planner_blocks']['mean'], summary['planner_blocks']['min'],
+            summary['rx_used']['mean'], summary['rx_used']['max'],
+        ))
+        lines.append("starved: %.2fs in %i periods%s" % (
+            summary['starved_time'], len(self.periods),
+            ''.join(' %s:%.2fs' % (c, t) for (c, t) in sorted(summary['starved_by'].items())),
+        ))
+        for period in sorted(self.periods, key=lambda p: -p.duration)[:max_periods]:
+            lines.append("  %.2fs at %.1fs, lines %s-%s: %s" % (
+                period.duration, period.start, period.first_line, period.last_line, period.cause,
+            ))
+        return lines
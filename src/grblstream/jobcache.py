@@ -0,0 +1,475 @@
+import os
+import sys
+import six
+import time
+import mmap
+import struct
+import shutil
+import hashlib
+import tempfile
+import threading
+from six.moves import queue
+
+from .pipeline import Pipeline, PreparedLine
+from .source import FileSource
+from .merge import merge_tolerance
+from .encode import encode_precision
+
+
+# Compiled job cache
+#
+# Description:
+#   The same gcode files are often streamed many times. Rather than reading,
+#   splitting & normalizing a file every time it's streamed, the prepared
+#   lines (see pipeline.PreparedLine) are stored in a compiled job file, so
+#   the next time it's streamed there's nothing to parse.
+#
+#   Compiled jobs are stored in a cache directory, named by a hash of the
+#   gcode file's content, and the settings that change how it's prepared.
+#   Old entries are evicted when the cache exceeds a maximum size, or age.
+#
+# Compiled Job Format:
+#   header:   magic, version, line count, offsets of the blobs below
+#   records:  one fixed-size record per line:
+#               lineno, display text (offset, length), wire data (offset,
+#               length), send flag, tree position
+#   wire:     bytes sent over serial (concatenated)
+#   display:  text displayed (utf-8, concatenated)
+#   Files are read with mmap, so a job of any size is opened instantly, and
+#   only the parts being streamed are read from disk.
+
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sHHIQQ')  # magic, version, (reserved), count, wire start, display start
+RECORD = struct.Struct('<IIIIHBB')  # lineno, display offset, display length, wire offset, wire length, send, tree
+MAGIC = b'GSJC'
+
+TREE_CODES = {None: 0, 'branch': 1, 'last': 2}
+TREE_VALUES = dict((v, k) for (k, v) in TREE_CODES.items())
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'grbl-stream')
+
+
+def _display_bytes(text):
+    return text.encode('utf-8') if six.PY3 else text
+
+
+def _display_str(data):
+    return data.decode('utf-8') if six.PY3 else data
+
+
+class CompiledJobError(Exception):
+    """Compiled job file is invalid (or from an incompatible version)"""
+    pass
+
+
+class CompiledJob(object):
+    """
+    Prepared lines of a compiled job file (read with mmap).
+    Consumed with get() or by iteration, like a pipeline.Pipeline
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, _, self.count, self._wire_start, self._display_start) = \
+                HEADER.unpack_from(self._mmap, 0)
+        except struct.error:
+            self.close()
+            raise CompiledJobError("truncated compiled job: %s" % filename)
+        if (magic != MAGIC) or (version != FORMAT_VERSION):
+            self.close()
+            raise CompiledJobError("not a compiled job (version %i): %s" % (FORMAT_VERSION, filename))
+        self._index = 0  # next line returned by get()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not (0 <= index < self.count):
+            raise IndexError("line index out of range: %r" % index)
+        (lineno, d_offset, d_len, w_offset, w_len, send, tree) = \
+            RECORD.unpack_from(self._mmap, HEADER.size + (index * RECORD.size))
+        d_start = self._display_start + d_offset
+        w_start = self._wire_start + w_offset
+        return PreparedLine(
+            lineno,
+            _display_str(self._mmap[d_start:d_start + d_len]),
+            bool(send),
+            TREE_VALUES[tree],
+            self._mmap[w_start:w_start + w_len] if send else None,
+        )
+
+    def _lineno(self, index):
+        return RECORD.unpack_from(self._mmap, HEADER.size + (index * RECORD.size))[0]
+
+    @property
+    def line_count(self):
+        """Total lines in the original file"""
+        return self._lineno(self.count - 1) if self.count else 0
+
+    def seek(self, lineno):
+        """
+        Set the next line returned by get(); the first prepared from the
+        given line (found by a binary search; records are in file order)
+        :param lineno: line number (in original file)
+        """
+        if not (1 <= lineno <= self.line_count + 1):
+            raise IndexError("line number out of range: %r" % lineno)
+        (low, high) = (0, self.count)
+        while low < high:
+            mid = (low + high) // 2
+            if self._lineno(mid) < lineno:
+                low = mid + 1
+            else:
+                high = mid
+        self._index = low
+
+    def get(self, timeout=None):
+        """
+        :return: next PreparedLine instance, or None when finished
+        """
+        if self._index >= self.count:
+            return None
+        item = self[self._index]
+        self._index += 1
+        return item
+
+    @property
+    def finished(self):
+        return self._index >= self.count
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                break
+            yield item
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class CompiledJobWriter(object):
+    """
+    Writes prepared lines to a compiled job file.
+    Lines are added one at a time (eg: as they're streamed); the file is
+    only created on commit()
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+        # content of each section, written to temporary files as lines are
+        # added (a job may be too large to hold in memory)
+        self._records = tempfile.TemporaryFile()
+        self._wire = tempfile.TemporaryFile()
+        self._display = tempfile.TemporaryFile()
+        self._wire_size = 0
+        self._display_size = 0
+
+    def add(self, item):
+        """
+        :param item: pipeline.PreparedLine instance
+        """
+        display = _display_bytes(item.gcode)
+        wire = item.data if item.send else b''
+        self._records.write(RECORD.pack(
+            item.lineno, self._display_size, len(display),
+            self._wire_size, len(wire), int(item.send), TREE_CODES[item.tree],
+        ))
+        self._display.write(display)
+        self._wire.write(wire)
+        self._display_size += len(display)
+        self._wire_size += len(wire)
+        self.count += 1
+
+    def commit(self):
+        """Write compiled job file"""
+        records_size = self.count * RECORD.size
+        wire_start = HEADER.size + records_size
+        display_start = wire_start + self._wire_size
+
+        # written to a temporary file, then renamed; so a partially written
+        # file is never read (eg: by another instance of this script)
+        tmp_filename = '%s.%i.tmp' % (self.filename, os.getpid())
+        with open(tmp_filename, 'wb') as fh:
+            fh.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.count, wire_start, display_start))
+            for section in (self._records, self._wire, self._display):
+                section.seek(0)
+                shutil.copyfileobj(section, fh)
+        os.rename(tmp_filename, self.filename)
+        self.abort()  # close temporary files
+
+    def abort(self):
+        """Discard content (no file is written)"""
+        for section in (self._records, self._wire, self._display):
+            section.close()
+
+
+class JobCache(object):
+    """
+    Directory of compiled jobs, keyed by gcode content (and settings)
+    """
+    DEFAULT_MAX_SIZE = 500 * (1024 ** 2)  # bytes
+    DEFAULT_MAX_AGE = 30 * (24 * 60 * 60)  # seconds
+    EXTENSION = '.gsjob'
+
+    def __init__(self, directory=None, max_size=None, max_age=None):
+        """
+        :param directory: cache directory (created if it doesn't exist)
+        :param max_size: total size of cached jobs before oldest are evicted (unit: bytes)
+        :param max_age: jobs unused for longer than this are evicted (unit: sec)
+        """
+        self.directory = directory or DEFAULT_DIRECTORY
+        self.max_size = max_size if max_size is not None else self.DEFAULT_MAX_SIZE
+        self.max_age = max_age if max_age is not None else self.DEFAULT_MAX_AGE
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @staticmethod
+    def key(filename, split_gcodes=False, merge_tolerance=None, encode_precision=None):
+        """
+        :return: cache key for the given gcode file, and preparation settings
+        """
+        sha1 = hashlib.sha1()
+        settings = 'v%i split=%r' % (FORMAT_VERSION, bool(split_gcodes))
+        if merge_tolerance is not None:
+            settings += ' merge=%r' % float(merge_tolerance)
+        if encode_precision is not None:
+            settings += ' encode=%i' % encode_precision
+        sha1.update((settings + '\n').encode('ascii'))
+        with open(filename, 'rb') as fh:
+            for block in iter(lambda: fh.read(1024 ** 2), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def get(self, key):
+        """
+        :return: CompiledJob instance, or None if not cached (or invalid)
+        """
+        filename = self.filename(key)
+        try:
+            job = CompiledJob(filename)
+        except (IOError, OSError, ValueError, CompiledJobError):
+            return None  # not cached (or empty, corrupt, etc)
+        os.utime(filename, None)  # mark as recently used (see evict())
+        return job
+
+    def writer(self, key):
+        """
+        :return: CompiledJobWriter for the given key (committed to the cache)
+        """
+        return CompiledJobWriter(self.filename(key))
+
+    def entries(self):
+        """
+        :return: list of (mtime, size, filename) of cached jobs (oldest first)
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(self.EXTENSION):
+                filename = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue  # removed since directory was listed
+                entries.append((stat.st_mtime, stat.st_size, filename))
+        return sorted(entries)
+
+    def evict(self):
+        """
+        Remove jobs not used for max_age, then oldest while over max_size
+        :return: number of jobs removed
+        """
+        entries = self.entries()
+        total_size = sum(size for (_, size, _) in entries)
+        min_mtime = time.time() - self.max_age
+        removed = 0
+        for (mtime, size, filename) in entries:
+            if (mtime >= min_mtime) and (total_size <= self.max_size):
+                break  # remaining entries are newer, and cache is small enough
+            try:
+                os.remove(filename)
+            except OSError:
+                pass  # removed by another process
+            total_size -= size
+            removed += 1
+        return removed
+
+    def source(self, filename, split_gcodes=False, processes=0, start_line=1,
+               merge_tolerance=None, encode_precision=None):
+        """
+        Prepared lines of a gcode file; from the cache if it's there,
+        otherwise from a pipeline.Pipeline (cached as they're consumed)
+        :param start_line: first line returned (see source.FileSource.seek)
+        :param merge_tolerance: see pipeline.Pipeline
+        :param encode_precision: see pipeline.Pipeline
+        :return: CompiledJob, CachingPipeline, or pipeline.Pipeline instance
+                 (only complete jobs are cached; not if start_line > 1)
+        """
+        key = self.key(filename, split_gcodes, merge_tolerance, encode_precision)
+        # merged & encoded lines depend on those before them (eg: a modal
+        # motion mode, or feed rate isn't repeated), so they're only read
+        # from the cache from the start of the job
+        seekable = (merge_tolerance is None) and (encode_precision is None)
+        job = self.get(key) if (seekable or (start_line <= 1)) else None
+        if job is not None:
+            job.seek(start_line)
+            return job
+        instream = FileSource(filename)
+        instream.seek(start_line)
+        pipeline = Pipeline(
+            instream,
+            split_gcodes=split_gcodes,
+            processes=processes,
+            close_stream=True,
+            start_line=start_line,
+            merge_tolerance=merge_tolerance,
+            encode_precision=encode_precision,
+        )
+        if start_line > 1:
+            return pipeline
+        return CachingPipeline(pipeline, self, key)
+
+
+class CachingPipeline(object):
+    """
+    Wraps a pipeline.Pipeline; lines consumed are written to a compiled job,
+    which is committed to the cache once all lines have been consumed.
+    Lines are written (and the job committed) by a background thread, so
+    consuming them never waits on the disk
+    """
+    _COMMIT = 'commit'
+    _ABORT = 'abort'
+
+    def __init__(self, pipeline, cache, key):
+        self.pipeline = pipeline
+        self.cache = cache
+        self._writer = cache.writer(key)
+        self._queue = queue.Queue()  # PreparedLine instances, then _COMMIT or _ABORT
+        self._done = False  # _COMMIT or _ABORT queued
+        self._thread = threading.Thread(target=self._run, name='job-cache')
+        self._thread.daemon = True  # (a job is committed with a rename; never left half written)
+        self._thread.start()
+
+    def _run(self):
+        writer = self._writer
+        while True:
+            item = self._queue.get()
+            if item is self._COMMIT:
+                writer.commit()
+                self.cache.evict()
+                break
+            elif item is self._ABORT:
+                writer.abort()
+                break
+            writer.add(item)
+
+    def get(self, timeout=None):
+        item = self.pipeline.get(timeout=timeout)
+        if item is not None:
+            self._queue.put(item)
+        elif (not self._done) and self.pipeline.finished:
+            self._queue.put(self._COMMIT)
+            self._done = True
+        return item
+
+    @property
+    def finished(self):
+        return self.pipeline.finished
+
+    @property
+    def line_count(self):
+        return self.pipeline.line_count
+
+    @property
+    def merger(self):
+        return self.pipeline.merger
+
+    @property
+    def encoder(self):
+        return self.pipeline.encoder
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                break
+            yield item
+
+    def close(self):
+        if not self._done:
+            self._queue.put(self._ABORT)  # not all lines were consumed
+            self._done = True
+        self._thread.join()  # (committed while the job finished streaming)
+        self.pipeline.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_source(config, grbl_settings=None):
+    """
+    Prepared lines of config.infile (from config.start_line); from the job
+    cache (if enabled, and the file has been streamed before), otherwise
+    from a pipeline.Pipeline
+    :param config: config.Config instance
+    :return: CompiledJob, CachingPipeline, or pipeline.Pipeline instance
+             (close() when done)
+    """
+    start_line = config.start_line
+    tolerance = merge_tolerance(config, grbl_settings)  # None if lines aren't merged
+    precision = encode_precision(config)  # None if lines aren't encoded
+    if config.job_cache and (config.infile != '-'):
+        cache = JobCache(
+            config.job_cache_dir,
+            max_size=config.job_cache_max_size * (1024 ** 2),
+            max_age=config.job_cache_max_age * (24 * 60 * 60),
+        )
+        return cache.source(
+            config.infile,
+            split_gcodes=config.split_gcodes,
+            processes=config.pipeline_processes,
+            start_line=start_line,
+            merge_tolerance=tolerance,
+            encode_precision=precision,
+        )
+
+    if config.infile == '-':
+        if start_line > 1:
+            raise ValueError("can't start from line %i of stdin" % start_line)
+        return Pipeline(
+            sys.stdin,
+            split_gcodes=config.split_gcodes,
+            processes=config.pipeline_processes,
+            merge_tolerance=tolerance,
+            encode_precision=precision,
+        )
+    instream = FileSource(config.infile)
+    instream.seek(start_line)
+    return Pipeline(
+        instream,
+        split_gcodes=config.split_gcodes,
+        processes=config.pipeline_processes,
+        close_stream=True,
+        start_line=start_line,
+        merge_tolerance=tolerance,
+        encode_precision=precision,
+    )
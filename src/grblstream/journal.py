@@ -0,0 +1,315 @@
+import os
+import array
+import hashlib
+import threading
+
+from .source import FileSource
+
+
+# Progress journal
+#
+# Description:
+#   If streaming is interrupted (the script is killed, the USB link drops,
+#   the operator quits), the journal records how far the job got, so it can
+#   be resumed (see --resume).
+#
+#   Journals are append-only text files, one per gcode file (named by a hash
+#   of its content), with one record per line:
+#       job <line count> <start line>   streaming started (or resumed)
+#       ok <line number>                line acknowledged by GRBL
+#       pos <state> <x>,<y>,<z>         last known machine position
+#       end                             job completed
+#
+#   Records are buffered, and written (then fsync'd) by a background thread
+#   every sync_interval, so the streaming thread never waits on the disk.
+#   At most sync_interval of progress is lost in a crash (or power failure);
+#   which only means a resumed job starts a little earlier than it could.
+#
+# Resuming:
+#   GRBL acknowledges a line once it's been planned, not executed; up to a
+#   planner's worth of acknowledged lines may not have been executed when
+#   streaming stopped. So a job is resumed from resume_backoff_lines before
+#   the last acknowledged line, after:
+#       - retracting to a safe Z (in machine coordinates)
+#       - restoring the modes set by the lines before it (units, spindle, etc)
+#       - moving to where those lines left the tool (above it, then down)
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.local', 'share', 'grbl-stream', 'journal')
+
+
+class JournalError(Exception):
+    """Journal can't be used to resume a job"""
+    pass
+
+
+def job_key(filename):
+    """
+    :return: key identifying a gcode file by its content
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 ** 2), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def journal_filename(filename, directory=None):
+    """
+    :return: filename of the given gcode file's journal
+    """
+    return os.path.join(directory or DEFAULT_DIRECTORY, job_key(filename) + '.journal')
+
+
+class Journal(object):
+    """
+    Records acknowledged lines (and machine position) of a streamed file.
+    """
+    DEFAULT_SYNC_INTERVAL = 1.0
+
+    def __init__(self, filename, sync_interval=None):
+        """
+        :param filename: journal file (appended to)
+        :param sync_interval: time between writes to disk (unit: sec)
+        """
+        self.filename = filename
+        self.sync_interval = sync_interval if sync_interval is not None else self.DEFAULT_SYNC_INTERVAL
+        self.sync_count = 0
+
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        self._records = []  # not yet written
+        self._position = None  # latest position record (written on sync)
+        self._lineno = None  # last acknowledged line number recorded
+        self._lock = threading.Lock()
+
+        self._keepalive = True
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while self._keepalive:
+            self._wakeup.wait(self.sync_interval)
+            self._wakeup.clear()
+            self.sync()
+
+    def _add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def start(self, line_count, start_line=1):
+        """
+        Record the start of streaming (written immediately)
+        :param line_count: total lines in file
+        :param start_line: first line streamed
+        """
+        self._add('job %i %i\n' % (line_count, start_line))
+        self.sync()
+
+    def acknowledged(self, lineno):
+        """
+        Record line acknowledged by GRBL (buffered)
+        :param lineno: line number, in file (lines split into several gcodes
+                       are acknowledged more than once, only recorded once)
+        """
+        if lineno != self._lineno:
+            self._lineno = lineno
+            self._add('ok %i\n' % lineno)
+
+    def position(self, status):
+        """
+        Record machine's position (only the latest is written)
+        :param status: status.StatusReport instance
+        """
+        if status.mpos is not None:
+            self._position = 'pos %s %s\n' % (status.state, ','.join('%.3f' % v for v in status.mpos))
+
+    def sync(self):
+        """Write buffered records, then fsync"""
+        with self._lock:
+            (records, self._records) = (self._records, [])
+            if self._position:
+                records.append(self._position)
+                self._position = None
+            if not records or (self._fd is None):
+                return
+            os.write(self._fd, ''.join(records).encode('ascii'))
+            os.fsync(self._fd)
+            self.sync_count += 1
+
+    def close(self, complete=False):
+        """
+        Write remaining records, and close file
+        :param complete: if True, the job is recorded as completed (so it
+                         can't be resumed)
+        """
+        if self._fd is None:
+            return  # already closed
+        self._keepalive = False
+        self._wakeup.set()
+        self._thread.join()
+        if complete:
+            self._add('end\n')
+        self.sync()
+        os.close(self._fd)
+        self._fd = None
+
+
+class JournalState(object):
+    """
+    Progress of a job, as recorded in its journal
+    """
+
+    def __init__(self):
+        self.line_count = None
+        self.start_line = 1  # first line streamed (of the first session)
+        self.acknowledged = array.array('l')  # line numbers, in order
+        self.position = None  # (state, (x, y, z)), last known
+        self.complete = False
+        self.sessions = 0  # times streaming was started
+
+    @classmethod
+    def read(cls, filename):
+        """
+        :return: JournalState instance, read from the given journal file
+        """
+        state = cls()
+        with open(filename, 'r') as fh:
+            for line in fh:
+                if not line.endswith('\n'):
+                    break  # partially written (eg: power failed during write)
+                fields = line.split()
+                if not fields:
+                    continue
+                elif fields[0] == 'job':
+                    (line_count, start_line) = (int(x) for x in fields[1:3])
+                    state.line_count = line_count
+                    if not state.sessions:
+                        state.start_line = start_line
+                    # lines from start_line are being streamed again
+                    acknowledged = state.acknowledged
+                    while acknowledged and (acknowledged[-1] >= start_line):
+                        acknowledged.pop()
+                    state.complete = False
+                    state.sessions += 1
+                elif fields[0] == 'ok':
+                    state.acknowledged.append(int(fields[1]))
+                elif fields[0] == 'pos':
+                    state.position = (fields[1], tuple(float(x) for x in fields[2].split(',')))
+                elif fields[0] == 'end':
+                    state.complete = True
+        return state
+
+    def resume_line(self, backoff=0):
+        """
+        Line to resume streaming from
+        :param backoff: lines acknowledged, but possibly not executed
+        :return: line number
+        """
+        # the last line acknowledged may only be partly acknowledged (if
+        # split into several gcodes), so it's never assumed to be complete
+        index = len(self.acknowledged) - (backoff + 2)
+        if index < 0:
+            return self.start_line
+        return self.acknowledged[index] + 1
+
+
+def resume_gcodes(filename, lineno, safe_z, spindle_delay=0):
+    """
+    gcode to send before resuming a job from the given line; restores the
+    modes, and position, left by the lines before it
+    :param filename: gcode file
+    :param lineno: line streaming will resume from
+    :param safe_z: Z retracted to before moving (machine coordinates, unit: mm)
+    :param spindle_delay: time given for the spindle to start (unit: sec)
+    :return: list of gcode lines (str)
+    """
+    from pygcode import Machine, Line
+    from pygcode.gcodes import MODAL_GROUP_MAP
+    from pygcode.gcodes import GCodeStartSpindle, GCodeRapidMove, GCodeLinearMove
+
+    # Run lines before lineno through a virtual machine
+    #   (slow, but only done once)
+    machine = Machine()
+    with FileSource(filename) as source:
+        for i in range(1, lineno):
+            try:
+                machine.process_block(Line(source.line(i)).block)
+            except Exception:
+                pass  # not understood (eg: '$' commands), assumed not to change modes
+
+    def modal(*groups):
+        gcodes = [machine.mode.modal_groups[MODAL_GROUP_MAP[g]] for g in groups]
+        return [str(g) for g in gcodes if g is not None]
+
+    mode = machine.mode.modal_groups
+    gcodes = [
+        'G21 G53 G0 Z%.3f' % safe_z,  # retract
+        ' '.join(modal('units', 'plane_selection', 'coordinate_system', 'feed_rate_mode') + ['G90']),
+    ]
+    if isinstance(mode[MODAL_GROUP_MAP['spindle']], GCodeStartSpindle):
+        gcodes.append(' '.join(modal('spindle_speed', 'spindle')))
+        if spindle_delay:
+            gcodes.append('G4 P%g' % spindle_delay)
+    gcodes += modal('coolant')
+
+    # Move to where the last line left the tool
+    pos = machine.pos
+    gcodes.append('G0 X%.4f Y%.4f' % (pos.X, pos.Y))
+    feed_rate = mode[MODAL_GROUP_MAP['feed_rate']]
+    if feed_rate and feed_rate.word.value:
+        gcodes.append('G1 Z%.4f %s' % (pos.Z, feed_rate))
+        plunge_class = GCodeLinearMove
+    else:
+        gcodes.append('G0 Z%.4f' % pos.Z)  # nothing's been cut yet
+        plunge_class = GCodeRapidMove
+
+    # Restore remaining modes
+    gcodes += modal('distance')
+    motion = mode[MODAL_GROUP_MAP['motion']]
+    if isinstance(motion, (GCodeRapidMove, GCodeLinearMove)) and not isinstance(motion, plunge_class):
+        gcodes.append(str(motion))  # arcs (etc) can't be set without a target
+    return gcodes
+
+
+def open_journal(config, line_count):
+    """
+    :param config: config.Config instance
+    :param line_count: total lines in config.infile
+    :return: Journal instance (started), or None if disabled (or reading stdin)
+    """
+    if not config.journal or (config.infile == '-'):
+        return None
+    journal = Journal(
+        journal_filename(config.infile, config.journal_dir),
+        sync_interval=config.journal_sync_interval,
+    )
+    journal.start(line_count, config.start_line)
+    return journal
+
+
+def prepare_resume(config):
+    """
+    Read config.infile's journal, and set config.start_line to resume from
+    :param config: config.Config instance
+    :return: list of gcode lines to send before resuming (see resume_gcodes)
+    """
+    if config.infile == '-':
+        raise JournalError("can't resume a job streamed from stdin")
+    filename = journal_filename(config.infile, config.journal_dir)
+    if not os.path.exists(filename):
+        raise JournalError("no journal for %s (has it been streamed?)" % config.infile)
+    state = JournalState.read(filename)
+    if state.complete:
+        raise JournalError("job completed, nothing to resume: %s" % config.infile)
+
+    config.args.start_line = state.resume_line(config.resume_backoff_lines)
+    return resume_gcodes(
+        config.infile, config.start_line,
+        safe_z=config.resume_safe_z,
+        spindle_delay=config.resume_spindle_delay,
+    )
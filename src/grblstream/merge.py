@@ -0,0 +1,206 @@
+import math
+
+from .grbl import SETTING_DEFAULTS
+
+
+# Collinear segment merging
+#
+# Description:
+#   CAM posts often emit long runs of tiny G1 moves (a few microns each)
+#   along what's very nearly a straight line. Each one costs a line over
+#   serial, and a block in GRBL's planner (which only holds 15), so the
+#   machine can't plan far enough ahead to keep up speed; it stutters.
+#
+#   A LineMerger reads lines in order (running them through a pygcode
+#   Machine, to know the modal state & position of each), and drops linear
+#   moves that lie within a tolerance of the straight line from the start
+#   of their run to its end; the last move of the run is kept, so the
+#   machine goes straight there.
+#
+#   Lines are only merged if they're plain absolute (G90) linear moves:
+#       G1 X.. Y.. Z..   (G1 may be modal, F only if unchanged, N allowed)
+#   anything else (modal changes, spindle/coolant, comments, dwells, etc)
+#   ends a run, and is passed through unchanged.
+#
+#   The tolerance defaults to GRBL's arc tolerance ($12); the deviation GRBL
+#   already allows when tracing arcs as chords.
+
+# words a mergeable line may have (G: only G1, F: only if unchanged)
+MERGE_LETTERS = frozenset('GNXYZF')
+AXES = 'XYZ'
+# gcodes after which the position isn't known (G10, G28, G30, G38.x, G53, G92)
+POSITION_GCODES = frozenset([10, 28, 30, 38, 53, 92])
+
+
+def _distance_to_segment(point, start, end):
+    """
+    :return: shortest distance from point to the segment: start to end
+    """
+    direction = [e - s for (s, e) in zip(start, end)]
+    offset = [p - s for (s, p) in zip(start, point)]
+    length_sq = sum(d * d for d in direction)
+    t = 0.0
+    if length_sq:
+        t = max(0.0, min(1.0, sum(o * d for (o, d) in zip(offset, direction)) / length_sq))
+    return math.sqrt(sum((o - t * d) ** 2 for (o, d) in zip(offset, direction)))
+
+
+def _number(value):
+    return ('%.6f' % value).rstrip('0').rstrip('.')
+
+
+class LineMerger(object):
+    """
+    Drops linear moves within a tolerance of the line from the start of
+    their run, to its end (see module description)
+    """
+    MAX_RUN = 256  # lines merged into one at most (deviation checks are O(n^2))
+
+    def __init__(self, tolerance):
+        """
+        :param tolerance: max distance of a dropped move's end from the
+                          merged move (unit: mm)
+        """
+        from pygcode import Machine
+        self.tolerance = tolerance
+        self.machine = Machine()
+        self.known = set()  # axes whose (absolute) position is known
+        self.lines_removed = 0
+        self.bytes_removed = 0
+
+        self._run = []  # [(lineno, line_data, point, axes), ...] not yet emitted
+        self._origin = None  # (point, known axes) where the run starts
+
+    def _position(self):
+        pos = self.machine.pos
+        return (pos.X, pos.Y, pos.Z)
+
+    def _mergeable(self, block, motion, feed_rate):
+        """
+        :param motion: motion mode before block
+        :param feed_rate: feed rate before block
+        :return: True if block is a plain absolute linear move (see module description)
+        """
+        from pygcode import GCodeLinearMove, GCodeAbsoluteDistanceMode
+        if not isinstance(motion, GCodeLinearMove):
+            return False  # a line setting G1 is kept (lines after it may rely on it)
+        if not isinstance(self.machine.mode.distance, GCodeAbsoluteDistanceMode):
+            return False
+        if not any(w.letter in AXES for w in block.words):
+            return False
+        for word in block.words:
+            if word.letter not in MERGE_LETTERS:
+                return False
+            elif (word.letter == 'G') and (word.value != 1):
+                return False
+            elif (word.letter == 'F') and ((feed_rate is None) or (word.value != feed_rate.word.value)):
+                return False  # feed rate changed
+        return True
+
+    def feed(self, lineno, line_data):
+        """
+        Read the next line
+        :param lineno: line number (in file)
+        :param line_data: line's text
+        :return: list of (lineno, line_data) ready to be prepared (lines are
+                 held back while they may still be merged)
+        """
+        from pygcode import Line
+        try:
+            line = Line(line_data.strip())
+        except Exception:
+            line = None  # not understood (eg: '$' commands)
+
+        before = (self._position(), frozenset(self.known))
+        (motion, feed_rate) = (self.machine.mode.motion, self.machine.mode.feed_rate)
+        if line is not None:
+            try:
+                self.machine.process_block(line.block)
+            except Exception:
+                line = None  # position (& modes) no longer certain
+                self.known.clear()
+
+        if (line is None) or (line.comment is not None) or not self._mergeable(line.block, motion, feed_rate):
+            emitted = self.flush()
+            emitted.append((lineno, line_data))
+            self._update_known(line)
+            return emitted
+
+        axes = frozenset(w.letter for w in line.block.words if w.letter in AXES)
+        self.known |= axes
+        point = self._position()
+        emitted = []
+        if self._run and not self._extends_run(point, axes):
+            emitted = self.flush()
+        if not self._run:
+            self._origin = before
+        self._run.append((lineno, line_data, point, axes))
+        return emitted
+
+    def _update_known(self, line):
+        from pygcode import GCodeAbsoluteDistanceMode
+        if line is None:
+            return
+        if any((g.word.letter == 'G') and (int(g.word.value) in POSITION_GCODES) for g in line.block.gcodes):
+            self.known.clear()  # moved to (or set) a position that's not in the file
+        elif isinstance(self.machine.mode.distance, GCodeAbsoluteDistanceMode):
+            self.known |= set(w.letter for w in line.block.words if w.letter in AXES)
+
+    def _extends_run(self, point, axes):
+        """
+        :return: True if a move to point can be merged with the current run
+        """
+        if len(self._run) >= self.MAX_RUN:
+            return False
+        (origin, known) = self._origin
+        moved = axes.union(*(a for (_, _, _, a) in self._run))
+        if not moved.issubset(known):
+            return False  # run's start isn't known
+        from pygcode import GCodeUseInches
+        tolerance = self.tolerance
+        if isinstance(self.machine.mode.units, GCodeUseInches):
+            tolerance /= 25.4
+        return all(
+            _distance_to_segment(p, origin, point) <= tolerance
+            for (_, _, p, _) in self._run
+        )
+
+    def flush(self):
+        """
+        End the current run
+        :return: list of (lineno, line_data); the run's last line (with the
+                 position of any axis only given by dropped lines added)
+        """
+        if not self._run:
+            return []
+        run = self._run
+        self._run = []
+        (lineno, line_data, point, axes) = run[-1]
+        if len(run) > 1:
+            moved = frozenset().union(*(a for (_, _, _, a) in run))
+            if moved != axes:  # last line doesn't give every axis' position
+                kept = line_data.strip()
+                line_data = 'G1 ' + ' '.join(
+                    '%s%s' % (a, _number(v)) for (a, v) in zip(AXES, point) if a in moved
+                )
+                self.bytes_removed += len(kept) - len(line_data)
+            self.lines_removed += len(run) - 1
+            self.bytes_removed += sum(len(l.strip()) + 1 for (_, l, _, _) in run[:-1])
+        return [(lineno, line_data)]
+
+
+def merge_tolerance(config, grbl_settings=None):
+    """
+    :param config: config.Config instance
+    :param grbl_settings: GRBL's settings (read from GRBL), default:
+                          config.grbl_settings
+    :return: tolerance lines are merged within (unit: mm), None if lines
+             aren't merged
+    """
+    if not config.merge_segments:
+        return None
+    if config.merge_tolerance is not None:
+        return config.merge_tolerance
+    if grbl_settings is None:
+        grbl_settings = config.grbl_settings
+    return float(grbl_settings.get('12', SETTING_DEFAULTS[12]))  # arc tolerance
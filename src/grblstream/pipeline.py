@@ -0,0 +1,251 @@
+import threading
+import collections
+import multiprocessing
+from six.moves import queue
+
+from .streamer import GCodeStreamer
+
+
+# Pre-processing pipeline
+#
+# Description:
+#   Preparing a line of gcode to be sent can cost as much time as sending
+#   it; particularly with split_gcodes (each line is parsed by pygcode, its
+#   gcodes sorted in order of execution, then re-written).
+#   If done on the thread servicing the serial port, GRBL's planner may
+#   starve while it's being done.
+#
+#   A Pipeline reads ahead, and prepares lines in the background:
+#       - reader thread: reads chunks of lines from the file (and merges
+#                        runs of collinear moves, if enabled; see merge)
+#       - workers:       prepare each chunk (split & normalize), either
+#                        with a process pool (processes > 0), or on the
+#                        reader thread itself (processes=0)
+#       - queue:         chunks are queued in file order, and the queue is
+#                        bounded, so reading stops when it's full (reading
+#                        ahead is limited to max_chunks * chunk_size lines)
+#
+#   Lines are consumed with get() (non-blocking if timeout=0), or by
+#   iterating over the pipeline (blocking). If compact encoding is enabled
+#   (see encode), lines are encoded as they're consumed; each line's
+#   encoding depends on the modes left by those sent before it.
+
+
+# Line ready to be displayed, and sent
+#   lineno: line number in file (first is 1)
+#   gcode:  text to display
+#   send:   if False, only displayed (eg: original line, before it was split)
+#   tree:   position in split line; 'branch', 'last', or None if not split
+#   data:   bytes to send (see GCodeStreamer.Line.normalize)
+PreparedLine = collections.namedtuple('PreparedLine', ['lineno', 'gcode', 'send', 'tree', 'data'])
+
+
+def prepare_line(lineno, line_data, split_gcodes=False):
+    """
+    Prepare a single line of gcode to be sent
+    :param lineno: line number (in file)
+    :param line_data: line's text
+    :param split_gcodes: if True, lines with multiple gcodes are split into
+                         individual gcodes, sorted in order of execution
+    :return: list of PreparedLine instances
+    """
+    line_data = line_data.strip()
+    if split_gcodes:
+        from pygcode import Line
+        gcode_line = Line(line_data)
+        if len(gcode_line.block) > 1:
+            # full line (as comment; not sent over serial)
+            prepared = [PreparedLine(lineno, line_data, False, None, None)]
+            # individual gcodes
+            gcode_list = [str(g) for g in sorted(gcode_line.block.gcodes)]  # sorts by execution order
+            if gcode_line.block.modal_params:
+                gcode_list.append(' '.join(str(w) for w in gcode_line.block.modal_params))
+            for (i, gcode) in enumerate(gcode_list):
+                prepared.append(PreparedLine(
+                    lineno, gcode, True,
+                    'branch' if ((i + 1) < len(gcode_list)) else 'last',
+                    GCodeStreamer.Line.normalize(gcode),
+                ))
+            return prepared
+
+    # 0 or 1 gcodes found, just treat it like normal
+    return [PreparedLine(lineno, line_data, True, None, GCodeStreamer.Line.normalize(line_data))]
+
+
+def prepare_chunk(lines, split_gcodes=False):
+    """
+    Prepare lines of gcode (in a worker process)
+    :param lines: list of (lineno, line_data)
+    :return: list of PreparedLine instances
+    """
+    prepared = []
+    for (lineno, line_data) in lines:
+        prepared += prepare_line(lineno, line_data, split_gcodes)
+    return prepared
+
+
+class Pipeline(object):
+    """
+    Reads & prepares lines of gcode in the background
+    """
+    DEFAULT_CHUNK_SIZE = 64
+    DEFAULT_MAX_CHUNKS = 16
+
+    _END = object()  # queued after last chunk
+
+    def __init__(self, instream, split_gcodes=False, processes=0,
+                 chunk_size=None, max_chunks=None, close_stream=False, start_line=1,
+                 merge_tolerance=None, encode_precision=None):
+        """
+        :param instream: readable file object (or source.FileSource)
+        :param split_gcodes: see prepare_line()
+        :param processes: number of worker processes, 0 to prepare lines
+                          on a background thread
+        :param chunk_size: lines read (and prepared) at a time
+        :param max_chunks: chunks prepared (or being prepared) ahead of
+                           those consumed
+        :param close_stream: if True, instream is closed by close()
+        :param start_line: line number of instream's next line (eg: if
+                           source.FileSource.seek() was called)
+        :param merge_tolerance: if given, collinear moves are merged within
+                                this tolerance (unit: mm; see merge.LineMerger);
+                                not if start_line > 1 (modes set before it
+                                aren't known)
+        :param encode_precision: if given, lines sent are compactly encoded,
+                                 numbers rounded to this many decimal places
+                                 (see encode.WireEncoder)
+        """
+        self.instream = instream
+        self.start_line = start_line
+        self.close_stream = close_stream
+        self.split_gcodes = split_gcodes
+        self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        self.max_chunks = max_chunks or self.DEFAULT_MAX_CHUNKS
+        self.merger = None
+        if (merge_tolerance is not None) and (start_line == 1):
+            from .merge import LineMerger
+            self.merger = LineMerger(merge_tolerance)
+        self.encoder = None
+        if encode_precision is not None:
+            from .encode import WireEncoder
+            self.encoder = WireEncoder(encode_precision)
+
+        self._pool = multiprocessing.Pool(processes) if processes else None
+        self._queue = queue.Queue(maxsize=self.max_chunks)  # chunks (or their AsyncResult)
+        self._chunk = None  # AsyncResult of chunk being waited on
+        self._items = collections.deque()  # prepared lines of current chunk
+        self._finished = False
+        self._keepalive = True
+
+        self._thread = threading.Thread(target=self._read)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self):
+        lineno = self.start_line
+        try:
+            end_of_file = False
+            while self._keepalive and not end_of_file:
+                lines = []
+                while len(lines) < self.chunk_size:
+                    line_data = self.instream.readline()
+                    if not line_data:
+                        end_of_file = True
+                        if self.merger:
+                            lines += self.merger.flush()
+                        break
+                    if self.merger:
+                        lines += self.merger.feed(lineno, line_data)
+                    else:
+                        lines.append((lineno, line_data))
+                    lineno += 1
+                if not lines:
+                    break  # file's done
+                if self._pool:
+                    chunk = self._pool.apply_async(prepare_chunk, (lines, self.split_gcodes))
+                else:
+                    chunk = prepare_chunk(lines, self.split_gcodes)
+                self._put(chunk)  # blocks while queue is full
+        except Exception as e:
+            self._put(e)  # raised by get()
+        self._put(self._END)
+
+    def _put(self, item):
+        while self._keepalive:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass  # check keepalive, then try again
+
+    def get(self, timeout=None):
+        """
+        Get next prepared line
+        :param timeout: time to wait for a line to be ready, None to wait indefinitely
+        :return: PreparedLine instance, or None if none are ready (or finished)
+        """
+        while not self._items:
+            if self._finished:
+                return None
+            if self._chunk is None:
+                try:
+                    self._chunk = self._queue.get(block=(timeout != 0), timeout=timeout)
+                except queue.Empty:
+                    return None  # nothing ready
+            chunk = self._chunk
+            if chunk is self._END:
+                self._finished = True
+                continue
+            if isinstance(chunk, Exception):
+                self._chunk = None
+                raise chunk
+            if not isinstance(chunk, list):  # AsyncResult
+                chunk.wait(timeout)
+                if not chunk.ready():
+                    return None  # still being prepared
+                self._chunk = None
+                chunk = chunk.get()  # raises exception (if one was raised)
+            self._chunk = None
+            if self.encoder:
+                chunk = [self._encode(item) for item in chunk]
+            self._items.extend(chunk)
+        return self._items.popleft()
+
+    def _encode(self, item):
+        if not item.send:
+            return item
+        return item._replace(data=self.encoder.encode(item.data))
+
+    @property
+    def finished(self):
+        """True when all lines have been consumed"""
+        return self._finished and not self._items
+
+    @property
+    def line_count(self):
+        """Total lines in file, None if unknown (eg: reading from stdin)"""
+        return getattr(self.instream, 'line_count', None)
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                break
+            yield item
+
+    def close(self):
+        """Stop reading, and stop worker processes (if any)"""
+        self._keepalive = False
+        if self._pool:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._thread.join(timeout=1)  # may be blocked reading (eg: stdin)
+        if self.close_stream:
+            self.instream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
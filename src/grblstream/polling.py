@@ -0,0 +1,127 @@
+import time
+import threading
+
+
+# Adaptive status polling
+#
+# Description:
+#   GRBL only sends a status report (<...>) when asked for one ('?'), so the
+#   rate at which '?' is sent is a trade-off between:
+#       - serial traffic & report parsing (mostly wasted while Idle)
+#       - responsiveness (a short jog may start and finish between polls)
+#
+#   StatusPoller picks the interval from the last reported machine state:
+#       - min_interval: while jogging, holding, homing, etc; and for a short
+#                       time after boost() (eg: a jog was sent, a hold was
+#                       requested, the job's last line was acknowledged)
+#       - interval:     while running (streaming a job)
+#       - max_interval: while Idle, Sleep or Alarm
+#
+#   A poll is skipped while the previous report is still outstanding (unless
+#   it's been so long the request is assumed lost; eg: sent while GRBL was
+#   booting).
+
+
+class StatusPoller(object):
+    """
+    Decides when to send a status request ('?') to GRBL.
+    Not tied to any thread; either:
+        - call poll() periodically (eg: from an EventLoop timer), or
+        - call poll() then wait() in a loop (eg: from a daemon thread)
+    """
+    DEFAULT_INTERVAL = 0.25
+    DEFAULT_MIN_INTERVAL = 0.05
+    DEFAULT_MAX_INTERVAL = 1.0
+    DEFAULT_BOOST_TIME = 1.0
+    DEFAULT_RESPONSE_TIMEOUT = 0.5
+
+    # machine states (lower case) polled at each rate
+    FAST_STATES = frozenset(['jog', 'hold', 'home', 'door', 'check'])
+    SLOW_STATES = frozenset(['idle', 'sleep', 'alarm'])
+
+    def __init__(self, serial, interval=None, min_interval=None, max_interval=None,
+                 boost_time=None, response_timeout=None):
+        """
+        :param serial: SerialPort instance
+        :param interval: time between polls while running (unit: sec)
+        :param min_interval: time between polls while jogging (etc), or boosted
+        :param max_interval: time between polls while idle
+        :param boost_time: time to poll at min_interval after boost() is called
+        :param response_timeout: time after which an unanswered request is
+                                 assumed lost (and another may be sent)
+        """
+        self.serial = serial
+        self.interval = interval if interval is not None else self.DEFAULT_INTERVAL
+        self.min_interval = min_interval if min_interval is not None else self.DEFAULT_MIN_INTERVAL
+        self.max_interval = max_interval if max_interval is not None else self.DEFAULT_MAX_INTERVAL
+        self.boost_time = boost_time if boost_time is not None else self.DEFAULT_BOOST_TIME
+        self.response_timeout = response_timeout if response_timeout is not None else self.DEFAULT_RESPONSE_TIMEOUT
+        assert self.min_interval <= self.interval <= self.max_interval, \
+            "bad intervals: %r <= %r <= %r" % (self.min_interval, self.interval, self.max_interval)
+
+        self.state = None  # last reported state (lower case, eg: 'idle')
+        self.poll_count = 0
+        self.skip_count = 0  # polls skipped (report outstanding)
+
+        self._last_poll = None  # time '?' was last sent
+        self._outstanding = False  # '?' sent, report not yet received
+        self._boost_until = 0.0
+        self._wakeup = threading.Event()
+
+    @property
+    def current_interval(self):
+        """Time between polls, given the machine's last known state"""
+        if time.time() < self._boost_until:
+            return self.min_interval
+        if self.state in self.FAST_STATES:
+            return self.min_interval
+        if self.state in self.SLOW_STATES:
+            return self.max_interval
+        return self.interval  # running, or unknown
+
+    def boost(self, duration=None):
+        """
+        Poll at min_interval for a while, starting now.
+        Call when the machine's state is expected to change soon.
+        """
+        self._boost_until = time.time() + (duration if duration is not None else self.boost_time)
+        self._wakeup.set()
+
+    def report_received(self, report):
+        """
+        Call for each status report received
+        :param report: status report line (eg: '<Idle|MPos:...>') or state (eg: 'Idle')
+        """
+        state = report.strip().lstrip('<').split('|', 1)[0].split(':', 1)[0]
+        self.state = state.lower()
+        self._outstanding = False
+
+    def poll(self):
+        """
+        Send a status request, if one is due (and the last one was answered)
+        :return: time until poll() should next be called (unit: sec)
+        """
+        now = time.time()
+        interval = self.current_interval
+        if self._last_poll is not None:
+            due = self._last_poll + interval
+            if now < due:
+                return due - now
+            if self._outstanding and (now < self._last_poll + self.response_timeout):
+                # previous request not answered yet; don't pile up requests.
+                # (after response_timeout, the request is assumed lost)
+                self.skip_count += 1
+                return self.min_interval
+
+        self.serial.realtime('status')
+        self.poll_count += 1
+        self._last_poll = now
+        self._outstanding = True
+        return interval
+
+    def wait(self, timeout):
+        """
+        Sleep for timeout, or until boost() is called (whichever is first)
+        """
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
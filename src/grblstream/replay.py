@@ -0,0 +1,298 @@
+import os
+import re
+import pty
+import tty
+import time
+import select
+import argparse
+import threading
+import collections
+
+from .grbl import REALTIME_COMMAND_MAP
+from .seriallog import read_log, SerialLogError, SENT, RECEIVED
+
+
+# Serial session replay
+#
+# Description:
+#   Plays GRBL's side of a recorded serial session (a --logfile log) back to
+#   a host, with its original timing; so a problem seen on the floor (a
+#   stall, an error) can be reproduced, and the host profiled against the
+#   exact traffic that caused it, without the machine.
+#
+#   GRBL's responses can't simply be played on a clock; the host must be
+#   ready for them. Each received record is tied to the host's line data
+#   sent before it (the number of bytes, not including real-time commands,
+#   since the number of '?' sent varies with timing), and to the time since
+#   that data was sent. While replaying, a record is played once the host
+#   has sent as many bytes, that much later (divided by speed):
+#       recorded:   [0.000] >> G1 X1\n              (line bytes: 6)
+#                   [0.004] << ok\r\n               (6 bytes, 0.004s later)
+#       replayed:   ok\r\n is written 0.004s after the host's 6th byte
+#   A record is never played before the one before it.
+#
+#   The host's data is compared with that recorded; if it diverges (eg: a
+#   different file was streamed) the offset is noted, and replay continues
+#   (it may stall if the host sends less than was recorded).
+#
+#   Sessions are played on a pseudo-terminal (ReplayDevice), whose path
+#   can be opened like any serial device:
+#       $ python -m grblstream.replay grbl-stream.log
+#       /dev/pts/5
+#       $ grbl-stream --device /dev/pts/5 part.gcode
+#   or with: grbl-stream --replay grbl-stream.log part.gcode
+
+# serial logs written as text (before logs were binary), eg:
+#   [1514764800.12] >> G1 X10 F100\n
+TEXT_RECORD_REGEX = re.compile(r'^\[(?P<time>\d+(\.\d*)?)\] (?P<prefix>>>|<<) (?P<msg>.*)$')
+REALTIME_BYTES = frozenset(ord(c) for c in REALTIME_COMMAND_MAP.values())
+
+# response played once the host has sent trigger bytes (of line data), delay
+# (sec) after the last of them
+Response = collections.namedtuple('Response', ['trigger', 'delay', 'data'])
+
+
+def _line_data(data):
+    """:return: data without real-time commands (bytearray)"""
+    return bytearray(c for c in bytearray(data) if c not in REALTIME_BYTES)
+
+
+def _unescape(msg):
+    return re.sub(r'\\[nr]', lambda m: {'\\n': '\n', '\\r': '\r'}[m.group(0)], msg)
+
+
+def read_text_log(filename):
+    """
+    :param filename: serial log written as text
+    :return: generator of (time, direction, data) (see seriallog.read_log)
+    """
+    with open(filename, 'rb') as fh:
+        for line in fh:
+            match = TEXT_RECORD_REGEX.search(line.decode('latin-1').rstrip('\n'))
+            if match:
+                yield (
+                    float(match.group('time')),
+                    SENT if match.group('prefix') == '>>' else RECEIVED,
+                    _unescape(match.group('msg')).encode('latin-1'),
+                )
+
+
+def load_session(filename):
+    """
+    :param filename: serial log (binary, or text)
+    :return: (list of Response instances, line data sent by the host (bytes))
+    """
+    try:
+        records = list(read_log(filename))
+    except SerialLogError:
+        records = list(read_text_log(filename))
+
+    responses = []
+    sent = bytearray()
+    sent_time = None  # time line data was last sent
+    for (t, direction, data) in records:
+        if direction == SENT:
+            line_data = _line_data(data)
+            if line_data:
+                sent += line_data
+                sent_time = t
+        elif direction == RECEIVED:
+            delay = (t - sent_time) if sent_time is not None else 0.0
+            responses.append(Response(len(sent), max(0.0, delay), bytes(data)))
+    return (responses, bytes(sent))
+
+
+class SessionReplay(object):
+    """
+    Decides when each recorded response is played (see module description);
+    not tied to a device, or a thread
+    """
+
+    def __init__(self, responses, expected=None, speed=1.0):
+        """
+        :param responses: list of Response instances (see load_session)
+        :param expected: line data the host sent when it was recorded
+        :param speed: playback speed (eg: 10 for 10x), None or 0 for no delays
+        """
+        self.responses = collections.deque(responses)
+        self.expected = expected
+        self.speed = speed
+        self.start_time = None
+
+        self.received = bytearray()  # line data sent by the host
+        self.played = 0  # responses played
+        self.diverged_at = None  # offset at which the host's data differs from that recorded
+
+        self._arrivals = collections.deque()  # (line bytes received, time) not yet needed
+        self._trigger_time = None  # time the next response's trigger was reached
+        self._last_played = None
+        self.start()
+
+    def start(self, now=None):
+        """(Re)start the replay's clock (eg: when the host connects)"""
+        self.start_time = now if now is not None else time.time()
+        self._trigger_time = self._last_played = self.start_time
+
+    @property
+    def finished(self):
+        return not self.responses
+
+    def receive(self, data, now=None):
+        """
+        :param data: data received from the host
+        """
+        now = now if now is not None else time.time()
+        line_data = _line_data(data)
+        if not line_data:
+            return
+        offset = len(self.received)
+        self.received += line_data
+        self._arrivals.append((len(self.received), now))
+        if (self.diverged_at is None) and (self.expected is not None):
+            recorded = bytearray(self.expected[offset:offset + len(line_data)])
+            for (i, (a, b)) in enumerate(zip(line_data, recorded)):
+                if a != b:
+                    self.diverged_at = offset + i
+                    break
+            else:
+                if len(recorded) < len(line_data):
+                    self.diverged_at = offset + len(recorded)  # more sent than recorded
+
+    def next_time(self):
+        """
+        :return: time the next response is due, None if it's waiting for the
+                 host (or there are none)
+        """
+        if not self.responses:
+            return None
+        response = self.responses[0]
+        if len(self.received) < response.trigger:
+            return None
+        while self._arrivals and (self._arrivals[0][0] < response.trigger):
+            self._arrivals.popleft()
+        if response.trigger and self._arrivals:
+            self._trigger_time = max(self._trigger_time, self._arrivals[0][1])
+        delay = (response.delay / self.speed) if self.speed else 0.0
+        return max(self._trigger_time + delay, self._last_played)
+
+    def due(self, now=None):
+        """
+        :return: data of responses due to be played (bytes)
+        """
+        now = now if now is not None else time.time()
+        played = []
+        while True:
+            due_time = self.next_time()
+            if (due_time is None) or (due_time > now):
+                break
+            played.append(self.responses.popleft().data)
+            self._last_played = due_time
+            self.played += 1
+        return b''.join(played)
+
+
+class ReplayDevice(object):
+    """
+    Plays a recorded session on a pseudo-terminal (see module description)
+    """
+
+    def __init__(self, filename, speed=1.0):
+        """
+        :param filename: serial log of the session
+        :param speed: playback speed (eg: 10 for 10x), None or 0 for no delays
+        """
+        (responses, expected) = load_session(filename)
+        self.replay = SessionReplay(responses, expected, speed=speed)
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._keepalive = False
+
+    def start(self):
+        """Open pseudo-terminal, and start replay thread"""
+        (self._master, self._slave) = pty.openpty()
+        tty.setraw(self._slave)
+        self._keepalive = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._keepalive = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def device(self):
+        """:return: path of device to connect to (eg: '/dev/pts/5')"""
+        return os.ttyname(self._slave)
+
+    def _run(self):
+        replay = self.replay
+        started = False  # replay's clock starts when the host first sends data
+        while self._keepalive:
+            now = time.time()
+            data = replay.due(now) if started else b''
+            if data:
+                os.write(self._master, data)
+
+            timeout = 0.05
+            due_time = replay.next_time() if started else None
+            if due_time is not None:
+                timeout = max(0.0, min(timeout, due_time - time.time()))
+            (readable, _, _) = select.select([self._master], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self._master, 1024)
+                except OSError:
+                    continue  # no slave connected
+                if not started:
+                    started = True
+                    replay.start()
+                replay.receive(data)
+
+
+# ----------------- Command Line -----------------
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Replay GRBL's side of a recorded serial session (--logfile) "
+                    "on a pseudo-terminal; connect to the printed device "
+                    "(eg: grbl-stream --device /dev/pts/5 file.gcode)",
+    )
+    parser.add_argument(
+        'log', metavar='LOG_FILE',
+        help="serial log of the session (binary, or text)",
+    )
+    parser.add_argument(
+        '--speed', dest='speed', type=float, default=1.0,
+        help="playback speed, 0 for no delays (default: %(default)s)",
+    )
+    args = parser.parse_args(args)
+
+    with ReplayDevice(args.log, speed=args.speed) as device:
+        print(device.device)
+        replay = device.replay
+        try:
+            while not replay.finished:
+                time.sleep(0.1)
+        except KeyboardInterrupt:
+            pass
+        print("played: %i of %i responses" % (replay.played, replay.played + len(replay.responses)))
+        if replay.diverged_at is not None:
+            print("host's data diverged from the recording at byte %i" % replay.diverged_at)
+
+
+if __name__ == '__main__':
+    main()
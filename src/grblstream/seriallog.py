@@ -0,0 +1,246 @@
+import os
+import sys
+import time
+import gzip
+import struct
+import argparse
+import threading
+from six.moves import queue
+
+
+# Serial logging
+#
+# Description:
+#   Everything written to, and read from GRBL can be logged (serial_logging)
+#   for traceability. Logging must never slow streaming, so a SerialLogger
+#   only queues each record (a bounded, in-memory queue); records are packed
+#   and written by a background thread. If the queue's full (eg: the disk
+#   can't keep up) records are dropped, and the number dropped is logged.
+#
+#   Log file format (binary, little-endian):
+#       header:  b'GRBLLOG1' + start time (double, epoch seconds)
+#       records: time (double, seconds from start; monotonic clock)
+#                + direction (uint8: 0 '>>' sent, 1 '<<' received,
+#                                    2 '!!' records dropped)
+#                + length (uint16) + raw bytes
+#
+#   The log is rotated when it exceeds max_size; the previous logs are kept
+#   as <name>.1, <name>.2, ... (optionally gzip compressed: <name>.1.gz)
+#
+#   A log is decoded to text (the format logs were originally written in):
+#       [1514764800.12] >> G1 X10 F100\n
+#       [1514764800.13] << ok\r\n
+#   with:
+#       $ python -m grblstream.seriallog grbl-stream.log
+
+MAGIC = b'GRBLLOG1'
+HEADER = struct.Struct('<d')
+RECORD = struct.Struct('<dBH')
+MAX_RECORD_DATA = 0xffff
+
+SENT = 0
+RECEIVED = 1
+DROPPED = 2
+PREFIX_MAP = {SENT: '>>', RECEIVED: '<<', DROPPED: '!!'}
+
+# monotonic clock (python 2.x: wall clock)
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class SerialLogError(Exception):
+    pass
+
+
+class SerialLogger(object):
+    """
+    Logs serial traffic to a binary file, written by a background thread
+    (see module description)
+    """
+    DEFAULT_QUEUE_SIZE = 10000  # records
+    BATCH_SIZE = 500  # records written at once (at most)
+
+    def __init__(self, filename, max_size=None, backup_count=5, compress=False, queue_size=None):
+        """
+        :param filename: log file's name
+        :param max_size: size beyond which the log is rotated (unit: bytes),
+                         None: never rotated
+        :param backup_count: rotated logs kept
+        :param compress: if True, rotated logs are gzip compressed
+        :param queue_size: records held in memory (before they're dropped)
+        """
+        self.filename = filename
+        self.max_size = max_size
+        self.backup_count = backup_count
+        self.compress = compress
+        self.start_time = time.time()
+        self._start_clock = _clock()
+
+        self.record_count = 0  # records written
+        self.dropped = 0  # records dropped (queue was full)
+        self._dropped_logged = 0
+        self._queue = queue.Queue(maxsize=queue_size if queue_size is not None else self.DEFAULT_QUEUE_SIZE)
+
+        self._file = None
+        self._size = 0
+        self._open()
+        self._thread = threading.Thread(target=self._run, name='serial-log')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # ----------------- Producer -----------------
+    def log(self, direction, data):
+        """
+        Queue a record (never blocks)
+        :param direction: SENT or RECEIVED
+        :param data: raw bytes
+        """
+        try:
+            self._queue.put_nowait((_clock() - self._start_clock, direction, data))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write queued records, and close the log"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    # ----------------- Writer -----------------
+    def _open(self):
+        self._file = open(self.filename, 'wb')
+        self._file.write(MAGIC + HEADER.pack(self.start_time))
+        self._size = len(MAGIC) + HEADER.size
+
+    def _pack(self, record):
+        (t, direction, data) = record
+        packed = []
+        for i in range(0, max(len(data), 1), MAX_RECORD_DATA):
+            chunk = data[i:i + MAX_RECORD_DATA]
+            packed.append(RECORD.pack(t, direction, len(chunk)) + chunk)
+        return b''.join(packed)
+
+    def _run(self):
+        done = False
+        while not done:
+            records = [self._queue.get()]
+            while len(records) < self.BATCH_SIZE:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if records[-1] is None:
+                records.pop()
+                done = True
+            if self.dropped != self._dropped_logged:
+                dropped = self.dropped  # (may be incremented concurrently)
+                count = str(dropped - self._dropped_logged).encode('ascii')
+                records.append((_clock() - self._start_clock, DROPPED, count))
+                self._dropped_logged = dropped
+            data = b''.join(self._pack(r) for r in records)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self.record_count += len(records)
+            if self.max_size and (self._size >= self.max_size):
+                self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        ext = '.gz' if self.compress else ''
+        name = lambda i: '%s.%i%s' % (self.filename, i, ext)
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(name(i)):
+                os.rename(name(i), name(i + 1))
+        if self.backup_count:
+            if self.compress:
+                with open(self.filename, 'rb') as src:
+                    dst = gzip.open(name(1), 'wb')
+                    try:
+                        dst.write(src.read())
+                    finally:
+                        dst.close()
+            else:
+                os.rename(self.filename, name(1))
+        self._open()
+
+
+def open_serial_log(config):
+    """
+    :param config: config.Config instance
+    :return: SerialLogger instance, None if serial logging is disabled
+    """
+    if not config.serial_logging:
+        return None
+    return SerialLogger(
+        config.serial_log_file,
+        max_size=int(config.serial_log_max_size * 1024 * 1024) if config.serial_log_max_size else None,
+        backup_count=config.serial_log_backups,
+        compress=config.serial_log_compress,
+    )
+
+
+# ----------------- Decoding -----------------
+def read_log(filename):
+    """
+    :param filename: log file (may be gzip compressed)
+    :return: generator of (time, direction, data) (time: epoch seconds)
+    """
+    with open(filename, 'rb') as fh:
+        compressed = (fh.read(2) == b'\x1f\x8b')
+    fh = gzip.open(filename, 'rb') if compressed else open(filename, 'rb')
+    try:
+        header = fh.read(len(MAGIC) + HEADER.size)
+        if header[:len(MAGIC)] != MAGIC:
+            raise SerialLogError("not a serial log: %s" % filename)
+        (start_time,) = HEADER.unpack(header[len(MAGIC):])
+        while True:
+            head = fh.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break  # (a truncated record is the end of an interrupted log)
+            (t, direction, length) = RECORD.unpack(head)
+            data = fh.read(length)
+            if len(data) < length:
+                break
+            yield (start_time + t, direction, data)
+    finally:
+        fh.close()
+
+
+def format_record(record):
+    """
+    :param record: (time, direction, data) (see read_log)
+    :return: record as text, eg: "[1514764800.12] >> G1 X10\n"
+    """
+    (t, direction, data) = record
+    msg = data.decode('latin-1')
+    if direction == DROPPED:
+        msg = "%s records dropped" % msg
+    return "[{time:.2f}] {prefix} {msg}".format(
+        time=t,
+        prefix=PREFIX_MAP.get(direction, '??'),
+        msg=msg.replace('\n', r'\n').replace('\r', r'\r'),
+    )
+
+
+# ----------------- Command Line -----------------
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Decode binary serial logs (serial_logging) to text",
+    )
+    parser.add_argument(
+        'logs', nargs='+', metavar='LOG_FILE',
+        help="serial log files (rotated logs, eg: grbl-stream.log.2.gz, "
+             "are decoded as they are; list them oldest first)",
+    )
+    args = parser.parse_args(args)
+
+    for filename in args.logs:
+        for record in read_log(filename):
+            sys.stdout.write(format_record(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,663 @@
+import os
+import re
+import pty
+import tty
+import time
+import select
+import argparse
+import threading
+import collections
+
+from .grbl import ERROR_MAP
+from .grbl import SETTING_DEFAULTS as DEFAULT_SETTINGS
+from .grbl import __version__ as GRBL_VERSION
+
+
+# Simulated GRBL device, connected to a pseudo-terminal.
+#
+# Description:
+#   Behaves (close enough) to a GRBL 1.1f device connected via USB serial so
+#   SerialPort, GCodeStreamer & the grbl-stream script can be exercised without
+#   hardware.
+#   The device's path is given by GRBLSimulator.device (eg: /dev/pts/5), it
+#   can be opened like any other serial device.
+#
+# What's simulated:
+#   - startup banner (printed when the host first sends data, see below)
+#   - system commands: $$, $I, $G, $X, $N=value, $J=
+#   - real-time commands: ?, !, ~, ctrl-x (soft reset), jog cancel, overrides
+#   - RX buffer: characters received while it's full are dropped (and counted)
+#   - planner: blocks are queued (up to planner_size), each taking block_time
+#     seconds to execute
+#   - error:N responses for faulty input (codes from grbl.ERROR_MAP)
+#   - (optional) link speed: bytes take 10 bit-times to arrive
+#
+# Startup:
+#   A real Arduino resets when its serial port is opened (DTR), so the first
+#   thing a host reads is the banner. A pty has no DTR line, so the simulator
+#   treats the first data received as the host connecting; that data is
+#   discarded (as it would be while the Arduino's bootloader is running) and
+#   the banner is printed.
+
+# Supported gcodes (ref: https://github.com/gnea/grbl/wiki/Grbl-v1.1-Commands)
+SUPPORTED_GCODES = set([
+    '0', '1', '2', '3', '4', '10', '17', '18', '19', '20', '21', '28', '28.1',
+    '30', '30.1', '38.2', '38.3', '38.4', '38.5', '40', '43.1', '49', '53',
+    '54', '55', '56', '57', '58', '59', '61', '80', '90', '91', '91.1', '92',
+    '92.1', '93', '94',
+])
+SUPPORTED_MCODES = set(['0', '1', '2', '3', '4', '5', '7', '8', '9', '30', '56'])
+MOTION_GCODES = set(['0', '1', '2', '3', '38.2', '38.3', '38.4', '38.5', '80'])
+
+AXES = 'XYZ'
+LINE_BUFFER_SIZE = 80  # max characters per line (excluding comments & spaces)
+
+
+class GRBLSimulatorError(Exception):
+    """Raised with the code of an error:N response"""
+    def __init__(self, code):
+        assert code in ERROR_MAP, "unknown error code: %r" % code
+        super(GRBLSimulatorError, self).__init__(ERROR_MAP[code])
+        self.code = code
+
+
+class GRBLSimulator(object):
+    BANNER = "Grbl {version} ['$' for help]".format(version=GRBL_VERSION)
+    BUILD_INFO = "[VER:{version}.20170801:]".format(version=GRBL_VERSION)
+
+    DEFAULT_RX_BUFFER_SIZE = 128
+    DEFAULT_PLANNER_SIZE = 15
+
+    WORD_REGEX = re.compile(r'^(?P<letter>[A-Z])(?P<value>[^A-Z]*)')
+    NUMBER_REGEX = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)$')
+    COMMENT_REGEX = re.compile(r'\(.*?\)|;.*|\s')
+
+    class Block(object):
+        __slots__ = ('target', 'duration', 'jog')
+
+        def __init__(self, target, duration, jog=False):
+            self.target = target
+            self.duration = duration
+            self.jog = jog
+
+    def __init__(self, rx_buffer_size=None, planner_size=None, block_time=0.0,
+                 baudrate=None, settings=None):
+        """
+        :param rx_buffer_size: serial RX buffer size (bytes)
+        :param planner_size: number of motion blocks the planner can hold
+        :param block_time: execution time of each motion block (seconds), or a
+                           callable returning it: block_time(distance, feed_rate)
+        :param baudrate: if set, link speed is simulated (10 bits per byte)
+        :param settings: dict of $N settings overriding DEFAULT_SETTINGS
+        """
+        self.rx_buffer_size = rx_buffer_size if rx_buffer_size is not None else self.DEFAULT_RX_BUFFER_SIZE
+        self.planner_size = planner_size if planner_size is not None else self.DEFAULT_PLANNER_SIZE
+        self.block_time = block_time
+        self.byte_time = (10.0 / baudrate) if baudrate else 0.0
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+
+        self.stats = {
+            'lines': 0,  # lines processed (responded to with ok/error)
+            'errors': 0,  # error responses
+            'blocks': 0,  # motion blocks executed
+            'rx_overflow': 0,  # characters dropped; received while RX buffer full
+            'status_reports': 0,
+            'starved_time': 0.0,  # time planner was empty (after first block was planned)
+        }
+        self._starved_since = None  # time planner ran out of blocks
+
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._keepalive = False
+        self._booted = False
+
+        # link (used when simulating baudrate): deque of (arrival_time, data)
+        self._rx_transit = collections.deque()
+        self._tx_transit = collections.deque()
+        self._rx_link_free = 0.0  # time host -> device link is next idle
+        self._tx_link_free = 0.0  # time device -> host link is next idle
+
+        self._reset()
+
+    # ----------------- Device -----------------
+    def start(self):
+        """Open pseudo-terminal, and start simulation thread"""
+        (self._master, self._slave) = pty.openpty()
+        tty.setraw(self._slave)  # no echo, no line editing
+        self._keepalive = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._keepalive = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def device(self):
+        """:return: path of device to connect to (eg: '/dev/pts/5')"""
+        return os.ttyname(self._slave)
+
+    # ----------------- Machine State -----------------
+    def _reset(self):
+        self.state = 'Idle'
+        self.hold = False
+        self.alarm = False
+        self.check_mode = False
+        self.position = [0.0, 0.0, 0.0]  # machine position (of last executed block)
+        self.work_offset = [0.0, 0.0, 0.0]
+        self.modes = {
+            'motion': 'G0', 'coord': 'G54', 'plane': 'G17', 'units': 'G21',
+            'distance': 'G90', 'feed_mode': 'G94', 'program': None,
+            'spindle': 'M5', 'coolant': 'M9',
+        }
+        self.feed_rate = 0.0
+        self.spindle_speed = 0.0
+        self.overrides = [100, 100, 100]  # feed, rapids, spindle
+
+        self.rx_buffer = bytearray()
+        self.planner = collections.deque()  # Block instances
+        self._line_waiting = None  # line pulled from RX buffer, waiting for planner space
+        self._block_end = None  # time the executing block (planner[0]) completes
+        self._block_remaining = None  # time remaining on planner[0] (while in hold)
+        self._planned_position = list(self.position)
+        self._report_count = 0
+
+    @property
+    def planner_free(self):
+        return self.planner_size - len(self.planner)
+
+    @property
+    def rx_free(self):
+        return self.rx_buffer_size - len(self.rx_buffer)
+
+    # ----------------- Runtime -----------------
+    def _run(self):
+        while self._keepalive:
+            now = time.time()
+            self._deliver(now)
+            self._process_lines()
+            while self._execute(now):
+                self._process_lines()  # planner has room for more
+
+            # wait for received data (or the next event)
+            timeout = 0.05
+            for event_time in (self._block_end, self._next_transit()):
+                if event_time is not None:
+                    timeout = max(0.0, min(timeout, event_time - now))
+            (readable, _, _) = select.select([self._master], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self._master, 1024)
+                except OSError:
+                    continue  # no slave connected
+                if self.byte_time:
+                    start = max(time.time(), self._rx_link_free)
+                    self._rx_link_free = start + (len(data) * self.byte_time)
+                    self._rx_transit.append((self._rx_link_free, data))
+                else:
+                    self._receive(data)
+
+    def _next_transit(self):
+        times = [q[0][0] for q in (self._rx_transit, self._tx_transit) if q]
+        return min(times) if times else None
+
+    def _deliver(self, now):
+        """Deliver data (in transit) that has finished traversing the link"""
+        while self._rx_transit and (self._rx_transit[0][0] <= now):
+            self._receive(self._rx_transit.popleft()[1])
+        while self._tx_transit and (self._tx_transit[0][0] <= now):
+            os.write(self._master, self._tx_transit.popleft()[1])
+
+    def _write(self, text):
+        data = (text + '\r\n').encode('latin-1')
+        if self.byte_time:
+            start = max(time.time(), self._tx_link_free)
+            self._tx_link_free = start + (len(data) * self.byte_time)
+            self._tx_transit.append((self._tx_link_free, data))
+        else:
+            os.write(self._master, data)
+
+    def _receive(self, data):
+        if not self._booted:
+            self._booted = True
+            self._write('')
+            self._write(self.BANNER)
+            return  # data discarded while booting
+
+        for c in bytearray(data):
+            if c in self.REALTIME_HANDLERS:
+                self.REALTIME_HANDLERS[c](self)
+            elif c >= 0x80:
+                pass  # unsupported real-time command; ignored
+            else:
+                if len(self.rx_buffer) >= self.rx_buffer_size:
+                    # GRBL's main loop empties the buffer while it's filled
+                    self._process_lines()
+                if len(self.rx_buffer) >= self.rx_buffer_size:
+                    self.stats['rx_overflow'] += 1
+                else:
+                    self.rx_buffer.append(c)
+
+    def _execute(self, now):
+        """
+        Retire executed planner blocks
+        :return: number of blocks retired
+        """
+        retired = 0
+        while self.planner and not self.hold:
+            if self._block_end is None:
+                self._block_end = now + self.planner[0].duration
+            if self._block_end > now:
+                break
+            block = self.planner.popleft()
+            self.position = block.target
+            self.stats['blocks'] += 1
+            retired += 1
+            if self.planner:
+                self._block_end += self.planner[0].duration
+            else:
+                self._starved_since = self._block_end
+                self._block_end = None
+        self._update_state()
+        return retired
+
+    def _update_state(self):
+        if self.alarm:
+            self.state = 'Alarm'
+        elif self.hold:
+            self.state = 'Hold:0'
+        elif self.planner:
+            self.state = 'Jog' if self.planner[0].jog else 'Run'
+        elif self.check_mode:
+            self.state = 'Check'
+        else:
+            self.state = 'Idle'
+
+    def _process_lines(self):
+        while True:
+            if self._line_waiting is None:
+                end = self.rx_buffer.find(b'\n')
+                if end < 0:
+                    break
+                line = self.rx_buffer[:end].decode('latin-1')
+                del self.rx_buffer[:end + 1]
+                self._line_waiting = line.rstrip('\r')
+
+            if self.planner_free <= 0:
+                break  # wait for planner to make room
+            line = self._line_waiting
+            self._line_waiting = None
+            self.stats['lines'] += 1  # counted before host can see a response
+            try:
+                for response in self.process_line(line):
+                    self._write(response)
+            except GRBLSimulatorError as e:
+                self.stats['errors'] += 1
+                self._write('error:%i' % e.code)
+            else:
+                self._write('ok')
+
+    # ----------------- Real-time Commands -----------------
+    def _rt_status(self):
+        self._write(self.status_report())
+
+    def _rt_hold(self):
+        if self.planner and (not self.hold):
+            if self.planner[0].jog:
+                self._rt_jog_cancel()  # hold during jog cancels it
+                return
+            if self._block_end is not None:
+                self._block_remaining = max(0.0, self._block_end - time.time())
+                self._block_end = None
+        self.hold = bool(self.planner)
+        self._update_state()
+
+    def _rt_resume(self):
+        if self.hold:
+            self.hold = False
+            if self._block_remaining is not None:
+                self._block_end = time.time() + self._block_remaining
+                self._block_remaining = None
+        self._update_state()
+
+    def _rt_reset(self):
+        moving = bool(self.planner) and not self.hold
+        self._reset()
+        self.rx_buffer = bytearray()
+        if moving:
+            self.alarm = True
+            self._write('ALARM:3')
+        self._write('')
+        self._write(self.BANNER)
+        self._update_state()
+
+    def _rt_jog_cancel(self):
+        if self.planner and self.planner[0].jog:
+            self.planner.clear()
+            self._block_end = None
+            self._planned_position = list(self.position)
+            self.hold = False
+        self._update_state()
+
+    def _rt_override(index, value=None, delta=0, limits=(10, 200)):
+        def _handler(self):
+            v = value if value is not None else (self.overrides[index] + delta)
+            self.overrides[index] = max(limits[0], min(v, limits[1]))
+        return _handler
+
+    REALTIME_HANDLERS = {
+        ord('?'): _rt_status,
+        ord('!'): _rt_hold,
+        ord('~'): _rt_resume,
+        0x18: _rt_reset,
+        0x85: _rt_jog_cancel,
+        # Feed Override
+        0x90: _rt_override(0, value=100),
+        0x91: _rt_override(0, delta=10),
+        0x92: _rt_override(0, delta=-10),
+        0x93: _rt_override(0, delta=1),
+        0x94: _rt_override(0, delta=-1),
+        # Rapid Override
+        0x95: _rt_override(1, value=100),
+        0x96: _rt_override(1, value=50),
+        0x97: _rt_override(1, value=25),
+        # Spindle Override
+        0x99: _rt_override(2, value=100),
+        0x9A: _rt_override(2, delta=10),
+        0x9B: _rt_override(2, delta=-10),
+        0x9C: _rt_override(2, delta=1),
+        0x9D: _rt_override(2, delta=-1),
+    }
+    del _rt_override
+
+    def status_report(self):
+        """
+        :return: status report str, eg: <Idle|MPos:0.000,0.000,0.000|FS:0,0>
+        """
+        self.stats['status_reports'] += 1
+        mask = int(self.settings[10])
+        fmt_pos = lambda p: ','.join('%.3f' % v for v in p)
+
+        fields = [self.state]
+        if mask & 1:
+            fields.append('MPos:' + fmt_pos(self.position))
+        else:
+            fields.append('WPos:' + fmt_pos(a - b for (a, b) in zip(self.position, self.work_offset)))
+        if mask & 2:
+            fields.append('Bf:%i,%i' % (self.planner_free, self.rx_free))
+        fields.append('FS:%g,%g' % (self.feed_rate, self.spindle_speed))
+
+        # work offset & overrides are reported periodically
+        if (self._report_count % 10) == 0:
+            fields.append('WCO:' + fmt_pos(self.work_offset))
+        elif (self._report_count % 10) == 1:
+            fields.append('Ov:%i,%i,%i' % tuple(self.overrides))
+        self._report_count += 1
+
+        return '<%s>' % '|'.join(fields)
+
+    # ----------------- Line Processing -----------------
+    def process_line(self, line):
+        """
+        Process a single line received from the host
+        :param line: line text (without newline)
+        :return: list of response lines to send before 'ok'
+        :raises GRBLSimulatorError: to respond with 'error:N'
+        """
+        block = self.COMMENT_REGEX.sub('', line).upper()
+        if len(block) > LINE_BUFFER_SIZE:
+            raise GRBLSimulatorError(11)
+        if not block:
+            return []
+        if block.startswith('$'):
+            return self._process_system(block)
+        if self.alarm:
+            raise GRBLSimulatorError(9)
+        self._process_gcode(block)
+        return []
+
+    def _process_system(self, block):
+        if block == '$$':
+            return [
+                ('$%i=%.3f' if isinstance(v, float) else '$%i=%i') % (k, v)
+                for (k, v) in sorted(self.settings.items())
+            ]
+        elif block == '$I':
+            return [
+                self.BUILD_INFO,
+                '[OPT:V,%i,%i]' % (self.planner_size, self.rx_buffer_size),
+            ]
+        elif block == '$G':
+            modes = [m for m in (
+                self.modes['motion'], self.modes['coord'], self.modes['plane'],
+                self.modes['units'], self.modes['distance'], self.modes['feed_mode'],
+                self.modes['program'], self.modes['spindle'], self.modes['coolant'],
+            ) if m]
+            return ['[GC:%s T0 F%g S%g]' % (' '.join(modes), self.feed_rate, self.spindle_speed)]
+        elif block == '$X':
+            self.alarm = False
+            self._update_state()
+            return ['[MSG:Caution: Unlocked]']
+        elif block == '$C':
+            self.check_mode = not self.check_mode
+            self._update_state()
+            return ['[MSG:Enabled]' if self.check_mode else '[MSG:Disabled]']
+        elif block == '$H':
+            if not self.settings[22]:
+                raise GRBLSimulatorError(5)
+            self.position = [0.0, 0.0, 0.0]
+            self._planned_position = list(self.position)
+            return []
+        elif block.startswith('$J='):
+            if self.state not in ('Idle', 'Jog'):
+                raise GRBLSimulatorError(8)
+            self._process_gcode(block[3:], jog=True)
+            return []
+
+        match = re.search(r'^\$(?P<key>\d+)=(?P<value>.*)$', block)
+        if match:
+            key = int(match.group('key'))
+            if key not in self.settings:
+                raise GRBLSimulatorError(3)
+            if not self.NUMBER_REGEX.search(match.group('value')):
+                raise GRBLSimulatorError(2)
+            if self.state != 'Idle':
+                raise GRBLSimulatorError(8)
+            value = float(match.group('value'))
+            if value < 0:
+                raise GRBLSimulatorError(4)
+            self.settings[key] = value if isinstance(DEFAULT_SETTINGS[key], float) else int(value)
+            return []
+
+        raise GRBLSimulatorError(3)
+
+    def _parse_words(self, block):
+        """
+        :return: list of (letter, value_str) tuples
+        """
+        words = []
+        while block:
+            match = self.WORD_REGEX.search(block)
+            if not match:
+                raise GRBLSimulatorError(1)  # letter not found
+            value = match.group('value')
+            if not self.NUMBER_REGEX.search(value):
+                raise GRBLSimulatorError(2)
+            words.append((match.group('letter'), value))
+            block = block[match.end():]
+        return words
+
+    def _process_gcode(self, block, jog=False):
+        words = self._parse_words(block)
+        params = {}
+        motion = None
+        non_modal = None
+        for (letter, value) in words:
+            if letter == 'G':
+                code = '%g' % float(value)
+                if code not in SUPPORTED_GCODES:
+                    raise GRBLSimulatorError(20)
+                if jog and (code not in ('20', '21', '90', '91', '53')):
+                    raise GRBLSimulatorError(16)
+                if code in MOTION_GCODES:
+                    if motion is not None:
+                        raise GRBLSimulatorError(21)
+                    motion = 'G' + code
+                elif code in ('4', '10', '28', '30', '53', '92'):
+                    if non_modal is not None:
+                        raise GRBLSimulatorError(21)
+                    non_modal = 'G' + code
+                elif code in ('90', '91'):
+                    self.modes['distance'] = 'G' + code
+                elif code in ('20', '21'):
+                    self.modes['units'] = 'G' + code
+                elif code in ('17', '18', '19'):
+                    self.modes['plane'] = 'G' + code
+                elif code in ('54', '55', '56', '57', '58', '59'):
+                    self.modes['coord'] = 'G' + code
+                elif code in ('93', '94'):
+                    self.modes['feed_mode'] = 'G' + code
+            elif letter == 'M':
+                code = '%g' % float(value)
+                if (code not in SUPPORTED_MCODES) or jog:
+                    raise GRBLSimulatorError(20)
+                if code in ('3', '4', '5'):
+                    self.modes['spindle'] = 'M' + code
+                elif code in ('7', '8', '9'):
+                    self.modes['coolant'] = 'M' + code
+                elif code in ('0', '1', '2', '30'):
+                    self.modes['program'] = 'M' + code
+            else:
+                if letter in params:
+                    raise GRBLSimulatorError(25)  # word repeated
+                params[letter] = float(value)
+
+        if 'F' in params:
+            if params['F'] < 0:
+                raise GRBLSimulatorError(4)
+            self.feed_rate = params['F']
+        if 'S' in params:
+            self.spindle_speed = params['S']
+
+        axis_words = [a for a in AXES if a in params]
+        scale = 25.4 if self.modes['units'] == 'G20' else 1.0
+
+        # Coordinate system offsets (G10 L2/L20 & G92)
+        if non_modal in ('G10', 'G92'):
+            if not axis_words:
+                raise GRBLSimulatorError(26)
+            if (non_modal == 'G10') and (params.get('L') not in (2, 20)):
+                raise GRBLSimulatorError(28)
+            for (i, axis) in enumerate(AXES):
+                if axis in params:
+                    if (non_modal == 'G10') and (params['L'] == 2):
+                        self.work_offset[i] = params[axis] * scale
+                    else:
+                        self.work_offset[i] = self._planned_position[i] - (params[axis] * scale)
+            return
+
+        if jog:
+            if not axis_words:
+                raise GRBLSimulatorError(16)
+            if 'F' not in params:
+                raise GRBLSimulatorError(22)
+            motion = 'G1'
+        elif motion is not None:
+            self.modes['motion'] = motion
+        elif axis_words:
+            motion = self.modes['motion']
+
+        if (motion is None) or not axis_words:
+            if motion in ('G2', 'G3'):
+                raise GRBLSimulatorError(32)
+            return  # no motion
+
+        if motion == 'G80':
+            raise GRBLSimulatorError(31)
+        if (motion != 'G0') and (not self.feed_rate):
+            raise GRBLSimulatorError(22)
+        if (motion in ('G2', 'G3')) and not any(k in params for k in 'IJKR'):
+            raise GRBLSimulatorError(35)
+
+        # Plan motion
+        target = list(self._planned_position)
+        for (i, axis) in enumerate(AXES):
+            if axis in params:
+                if non_modal == 'G53':  # machine coordinates
+                    target[i] = params[axis] * scale
+                elif self.modes['distance'] == 'G91':
+                    target[i] += params[axis] * scale
+                else:
+                    target[i] = (params[axis] * scale) + self.work_offset[i]
+        distance = sum((a - b) ** 2 for (a, b) in zip(target, self._planned_position)) ** 0.5
+        self._planned_position = target
+
+        if self.check_mode:
+            return
+        duration = self.block_time
+        if callable(duration):
+            duration = duration(distance, self.feed_rate)
+        if self._starved_since is not None:
+            self.stats['starved_time'] += time.time() - self._starved_since
+            self._starved_since = None
+        self.planner.append(self.Block(target, duration, jog=jog))
+        self._update_state()
+
+
+# ----------------- Command Line -----------------
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Simulated GRBL device; connect to the printed device "
+                    "(eg: grbl-stream --device /dev/pts/5 file.gcode)",
+    )
+    parser.add_argument(
+        '--planner-size', dest='planner_size', type=int, default=GRBLSimulator.DEFAULT_PLANNER_SIZE,
+        help="planner blocks (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--rx-buffer-size', dest='rx_buffer_size', type=int, default=GRBLSimulator.DEFAULT_RX_BUFFER_SIZE,
+        help="serial RX buffer size (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--block-time', dest='block_time', type=float, default=0.0,
+        help="time (seconds) to execute each motion block (default: %(default)s)",
+    )
+    parser.add_argument(
+        '--baudrate', dest='baudrate', type=int, default=None,
+        help="if given, link speed is simulated",
+    )
+    args = parser.parse_args(args)
+
+    simulator = GRBLSimulator(
+        rx_buffer_size=args.rx_buffer_size,
+        planner_size=args.planner_size,
+        block_time=args.block_time,
+        baudrate=args.baudrate,
+    )
+    with simulator:
+        print(simulator.device)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
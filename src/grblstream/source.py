@@ -0,0 +1,193 @@
+import os
+import six
+import mmap
+import time
+import array
+import datetime
+
+try:
+    import numpy  # optional: indexes large files much faster
+except ImportError:
+    numpy = None
+
+
+# Indexed gcode file
+#
+# Description:
+#   A gcode file is read with mmap, and the offset of each line is found in
+#   a single pass (a vectorized scan for newlines with numpy, if installed,
+#   otherwise with mmap's find()), so:
+#       - the total number of lines is known before streaming starts
+#         (for progress, and estimated time remaining; see Progress)
+#       - streaming can start from any line, without reading those before it
+#
+#   FileSource is file-like (has readline()), so it can be read by a
+#   pipeline.Pipeline (to be prepared in the background).
+#
+#   Given a runtime estimate (see estimate.Estimate), Progress' estimated
+#   time remaining is that of the lines left, scaled by how long the lines
+#   streamed so far took compared to their estimate (so it corrects itself
+#   if the machine's slower, or faster, than estimated).
+
+
+def index_lines(data):
+    """
+    Offsets of each line in data
+    :param data: buffer (eg: mmap.mmap instance)
+    :return: sequence of offsets; the start of each line, then the end of data
+    """
+    size = len(data)
+    if numpy is not None:
+        newlines = numpy.flatnonzero(numpy.frombuffer(data, dtype=numpy.uint8) == ord('\n'))
+        offsets = numpy.empty(len(newlines) + 2, dtype=numpy.int64)
+        offsets[0] = 0
+        offsets[1:-1] = newlines + 1
+        offsets[-1] = size
+    else:
+        offsets = array.array('l', [0])
+        i = data.find(b'\n')
+        while i >= 0:
+            offsets.append(i + 1)
+            i = data.find(b'\n', i + 1)
+        offsets.append(size)
+
+    if (len(offsets) > 1) and (offsets[-2] == size):
+        offsets = offsets[:-1]  # file ends with a newline, no line after it
+    return offsets
+
+
+class FileSource(object):
+    """
+    gcode file, with an index of where each line starts.
+    Lines are numbered from 1 (like an editor)
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fh:
+            if os.fstat(fh.fileno()).st_size:
+                self._data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b''  # an empty file can't be mapped
+        self._offsets = index_lines(self._data)
+        self._lineno = 1  # next line returned by readline()
+
+    @property
+    def line_count(self):
+        return len(self._offsets) - 1
+
+    def __len__(self):
+        return self.line_count
+
+    def offset(self, lineno):
+        """
+        :return: offset of the given line in the file (unit: bytes)
+        """
+        if not (1 <= lineno <= self.line_count + 1):
+            raise IndexError("line number out of range: %r" % lineno)
+        return int(self._offsets[lineno - 1])
+
+    def line(self, lineno):
+        """
+        :return: text of the given line (including newline)
+        """
+        data = self._data[self.offset(lineno):self.offset(lineno + 1)]
+        return data.decode('utf-8', 'replace') if six.PY3 else data
+
+    def seek(self, lineno):
+        """
+        Set the next line returned by readline()
+        :param lineno: line number, first line is 1
+        """
+        if not (1 <= lineno <= self.line_count + 1):
+            raise IndexError("line number out of range: %r" % lineno)
+        self._lineno = lineno
+
+    def tell(self):
+        """
+        :return: line number of the next line returned by readline()
+        """
+        return self._lineno
+
+    def readline(self):
+        """
+        :return: next line, or '' when there are no more (like a file object)
+        """
+        if self._lineno > self.line_count:
+            return ''
+        line = self.line(self._lineno)
+        self._lineno += 1
+        return line
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Progress(object):
+    """
+    Progress through the lines of a file; fraction complete, and estimated
+    time remaining (from the rate lines have been streamed so far, or from
+    a runtime estimate, if one's been set)
+    """
+    # estimated time of lines streamed before the estimate is corrected by
+    # actual progress (unit: sec); the first lines fill GRBL's buffers faster
+    # than they're executed
+    MIN_CORRECTION_TIME = 5.0
+
+    def __init__(self, line_count, start_line=1, estimate=None):
+        """
+        :param line_count: total lines in file
+        :param start_line: first line streamed (see FileSource.seek)
+        :param estimate: estimate.Estimate instance (may be set later)
+        """
+        self.line_count = line_count
+        self.start_line = start_line
+        self.estimate = estimate
+        self.lineno = start_line - 1  # last line streamed
+        self.start_time = None  # time first line was streamed
+
+    def update(self, lineno):
+        """
+        :param lineno: line number of the line being streamed
+        """
+        if self.start_time is None:
+            self.start_time = time.time()
+        self.lineno = lineno
+
+    @property
+    def fraction(self):
+        if not self.line_count:
+            return 1.0
+        return min(1.0, float(self.lineno) / self.line_count)
+
+    @property
+    def eta(self):
+        """
+        :return: estimated time remaining (unit: sec), None if not yet known
+        """
+        elapsed = None if (self.start_time is None) else (time.time() - self.start_time)
+        if self.estimate is not None:
+            remaining = self.estimate.remaining(self.lineno)
+            expected = self.estimate.time_at(self.lineno) - self.estimate.time_at(self.start_line - 1)
+            if (elapsed is None) or (expected < self.MIN_CORRECTION_TIME):
+                return remaining
+            return remaining * (elapsed / expected)
+
+        done = self.lineno - self.start_line + 1
+        if (elapsed is None) or (done < 1):
+            return None
+        return elapsed * (self.line_count - self.lineno) / done
+
+    def __str__(self):
+        eta = self.eta
+        return "{percent:.1f}% ETA {eta}".format(
+            percent=self.fraction * 100,
+            eta='?' if eta is None else datetime.timedelta(seconds=int(eta)),
+        )
@@ -0,0 +1,128 @@
+# GRBL 1.1 status report parsing
+#
+# Description:
+#   Status reports are received in response to '?', eg:
+#       <Idle|MPos:0.000,0.000,0.000|FS:0,0|WCO:-8.393,100.000,2.063>
+#       <Hold:0|WPos:1.000,2.000,3.000|Bf:15,128|F:500|Ov:100,100,100|A:SF>
+#
+#   They're received often (several times a second), and most fields don't
+#   change between reports, so StatusReport keeps the latest value of each
+#   field, and each update() returns the names of the fields that changed;
+#   only those need to be processed (or re-drawn).
+#
+#   Not all fields are sent in every report; those that aren't are either:
+#       - cleared: state, pins, line number, etc (only sent when relevant)
+#       - retained: WCO & Ov (only sent intermittently to save bandwidth),
+#                   and A (sent along with Ov)
+#   MPos & WPos are calculated from one another (using WCO) so both are
+#   always available.
+#
+# ref: https://github.com/gnea/grbl/wiki/Grbl-v1.1-Interface#real-time-status-reports
+
+
+class StatusReport(object):
+    """
+    Latest values of all fields reported by GRBL's real-time status reports.
+    """
+    __slots__ = (
+        'state',  # str (eg: 'Idle', 'Hold')
+        'substate',  # int, or None (eg: 0 for 'Hold:0')
+        'mpos',  # (x, y, z) machine position
+        'wpos',  # (x, y, z) work position
+        'wco',  # (x, y, z) work coordinate offset (wpos = mpos - wco)
+        'feed_rate',  # float
+        'spindle_speed',  # float, or None (if not reported: 'F:' field)
+        'planner_free',  # int: available blocks in planner buffer (Bf:)
+        'rx_free',  # int: available bytes in serial RX buffer (Bf:)
+        'line_number',  # int, or None (Ln:)
+        'overrides',  # (feed, rapid, spindle) percentages (Ov:)
+        'pins',  # str: triggered input pins (eg: 'XP'), '' if none (Pn:)
+        'accessories',  # str: accessory states (eg: 'SF'), '' if none (A:)
+    )
+    FIELDS = __slots__
+
+    # Fields set to None at the start of each update (if not reported)
+    TRANSIENT_FIELDS = frozenset(['substate', 'spindle_speed', 'line_number'])
+
+    def __init__(self, report=None):
+        for name in self.FIELDS:
+            setattr(self, name, None)
+        self.pins = ''
+        self.accessories = ''
+        if report is not None:
+            self.update(report)
+
+    def __repr__(self):
+        return "<{cls}: {state}>".format(cls=self.__class__.__name__, state=self.state_text)
+
+    @property
+    def state_text(self):
+        """State as reported by GRBL (eg: 'Hold:0')"""
+        if self.substate is None:
+            return self.state
+        return "{}:{}".format(self.state, self.substate)
+
+    @staticmethod
+    def _coords(value):
+        return tuple(float(x) for x in value.split(','))
+
+    def update(self, report):
+        """
+        Update fields from a status report
+        :param report: status report line (eg: '<Idle|MPos:0.000,0.000,0.000|FS:0,0>')
+        :return: set of field names whose value changed
+        """
+        report = report.strip()
+        if not (report.startswith('<') and report.endswith('>')):
+            raise ValueError("not a status report: %r" % report)
+        fields = report[1:-1].split('|')
+
+        values = {'pins': ''}  # {<field name>: <value>, ...}
+        (state, _, substate) = fields[0].partition(':')
+        values['state'] = state
+        if substate:
+            values['substate'] = int(substate)
+
+        for field in fields[1:]:
+            (key, _, value) = field.partition(':')
+            if key == 'MPos':
+                values['mpos'] = self._coords(value)
+            elif key == 'WPos':
+                values['wpos'] = self._coords(value)
+            elif key == 'WCO':
+                values['wco'] = self._coords(value)
+            elif key == 'FS':
+                (values['feed_rate'], values['spindle_speed']) = self._coords(value)
+            elif key == 'F':
+                values['feed_rate'] = float(value)
+            elif key == 'Bf':
+                (values['planner_free'], values['rx_free']) = (int(x) for x in value.split(','))
+            elif key == 'Ln':
+                values['line_number'] = int(value)
+            elif key == 'Ov':
+                values['overrides'] = tuple(int(x) for x in value.split(','))
+                values['accessories'] = ''  # A: is only sent (along with Ov:) if any are on
+            elif key == 'Pn':
+                values['pins'] = value
+            elif key == 'A':
+                values['accessories'] = value
+            # unknown fields are ignored (eg: from a newer GRBL version)
+
+        # Derive position (reported as either MPos, or WPos)
+        wco = values.get('wco', self.wco)
+        if wco is not None:
+            if 'mpos' in values:
+                values['wpos'] = tuple(m - o for (m, o) in zip(values['mpos'], wco))
+            elif 'wpos' in values:
+                values['mpos'] = tuple(w + o for (w, o) in zip(values['wpos'], wco))
+
+        # Apply values, noting changes
+        changed = set()
+        for name in self.TRANSIENT_FIELDS:
+            values.setdefault(name, None)
+        for (name, value) in values.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed.add(name)
+
+        return changed
@@ -1,74 +1,146 @@
 import re
+import collections
 import time
+import threading
 import serial
+import six
 
 from .widget import ConsoleLine, GCodeContent
+from .grbl import REALTIME_COMMAND_MAP
+from .seriallog import SerialLogger, SENT, RECEIVED
+
+
+def _native_str(data):
+    """Serial bytes as a native str (str is bytes in python 2.x)"""
+    if six.PY3:
+        return data.decode('latin-1')
+    return data
+
+
+def _native_bytes(data):
+    """Native str as serial bytes"""
+    if six.PY3 and isinstance(data, str):
+        return data.encode('latin-1')
+    return data
 
 
 class SerialPort(object):
-    def __init__(self, device, baudrate, logfilename=None):
+    REALTIME_COMMANDS = frozenset(REALTIME_COMMAND_MAP.values())
+
+    def __init__(self, device, baudrate, logfilename=None, log=None):
+        """
+        :param device: serial device (eg: /dev/ttyACM0)
+        :param baudrate: serial baud rate
+        :param logfilename: if given, traffic is logged here (see seriallog)
+        :param log: seriallog.SerialLogger instance (instead of logfilename)
+        """
         self.device = device
         self.baudrate = baudrate
-        self.serial = serial.Serial(self.device, self.baudrate)
-        self.logfilename = logfilename
-        self.log = None
+        # (exclusive: so it's not probed while in use, see discovery.py)
+        self.serial = serial.Serial(self.device, self.baudrate, exclusive=True)
+        self.log = log
+        if (log is None) and logfilename:
+            self.log = SerialLogger(logfilename)
 
-        self._cur_line = ''  # buffered line chars before '\n' received
-
-        if self.logfilename:
-            self.log = open(self.logfilename, 'w')
+        self._write_lock = threading.Lock()  # serializes writes from multiple threads
+        self._rx_buffer = bytearray()  # received data not yet split into lines
+        self._rx_lines = collections.deque()  # received lines not yet yielded
 
     def __del__(self):
         self.serial.close()
         if self.log:
             self.log.close()
 
-    def _log_write(self, prefix, msg):
+    def write(self, data):
+        data = _native_bytes(data)
+        with self._write_lock:
+            if self.log:
+                self.log.log(SENT, data)  # queued; written in the background
+            self.serial.write(data)
+
+    def realtime(self, command):
+        """
+        Send a real-time command.
+        Real-time commands don't occupy GRBL's RX buffer, so they bypass any
+        lines queued by a GCodeStreamer, and may be sent from any thread
+        (writes are serialized, so a command is never sent mid-write).
+        :param command: name from grbl.REALTIME_COMMAND_MAP (eg: 'hold'),
+                        or the command's character (eg: '!')
+        """
+        data = REALTIME_COMMAND_MAP.get(command, command)
+        if data not in self.REALTIME_COMMANDS:
+            raise ValueError("unknown real-time command: %r" % command)
+        self.write(data)
+
+    def _split_lines(self):
+        """Move completed lines from the receive buffer to the line queue"""
+        buf = self._rx_buffer
+        end = buf.rfind(b'\n')
+        if end < 0:
+            return
+        chunk = bytes(buf[:end + 1])
+        del buf[:end + 1]
         if self.log:
-            self.log.write("[{time:.2f}] {prefix} {msg}\n".format(
-                time=time.time(),
-                prefix=prefix,
-                msg=msg.replace('\n', r'\n').replace('\r', r'\r'),
-            ))
+            self.log.log(RECEIVED, chunk)
+        self._rx_lines.extend(
+            _native_str(l[:-1] if l.endswith(b'\r') else l)
+            for l in chunk[:-1].split(b'\n')
+        )
 
-    def write(self, data):
-        self._log_write('>>', data)
-        self.serial.write(data)
+    def fileno(self):
+        """:return: serial device's file descriptor (to select() on)"""
+        return self.serial.fileno()
+
+    def read_available(self):
+        """
+        Read whatever has been received, without blocking.
+        :return: list of completed lines (partial lines are kept for later)
+        """
+        waiting = self.serial.in_waiting
+        if waiting:
+            self._rx_buffer += self.serial.read(waiting)
+            self._split_lines()
+        lines = list(self._rx_lines)
+        self._rx_lines.clear()
+        return lines
 
     def readlines(self, timeout=None):
-        start_time = time.time()
-        orig_timeout = self.serial.timeout
-
-        def _new_timeout():
-            """Return linearly diminished timeout (with realtime)"""
-            if timeout is None:
-                return None
-            cur_time = time.time()
-            if cur_time - start_time >= timeout:
-                return 0.0
-            return timeout - (cur_time - start_time)
+        """
+        Yield lines received from the serial device until timeout.
+
+        Everything waiting in the serial input is read at once, and lines are
+        split from a persistent buffer (partial lines, and lines not yet
+        consumed are kept for the next call).
+        A blocking read waits no longer than the time remaining (the serial
+        timeout is left set for subsequent calls, and only changed when it
+        differs); a blocking read that returns nothing ends the call.
+
+        :param timeout: time (in seconds) to spend reading (None: forever)
+        """
+        end_time = None if timeout is None else (time.time() + timeout)
 
         while True:
-            # Set read timeout
-            time_remaining = _new_timeout()
-            if time_remaining == 0:
-                break
-            self.serial.timeout = time_remaining
+            while self._rx_lines:
+                yield self._rx_lines.popleft()
+
+            read_timeout = None
+            if end_time is not None:
+                read_timeout = end_time - time.time()
+                if read_timeout <= 0:
+                    break
 
             # read
-            # FIXME: char by char (a bit clunky, but easy to write)
             try:
-                received_chr = self.serial.read()
+                waiting = self.serial.in_waiting
+                if not waiting and (self.serial.timeout != read_timeout):
+                    self.serial.timeout = read_timeout  # (blocking read)
+                data = self.serial.read(waiting or 1)
             except serial.serialutil.SerialException:
-                continue # terminal resize interrupts serial read
-            self._cur_line += received_chr
-            if self._cur_line.endswith('\n'):
-                self._log_write('<<', self._cur_line)
-                received_line = re.sub(r'\r?\n$', '', self._cur_line)
-                self._cur_line = ''
-                yield received_line
-
-        self.serial.timeout = orig_timeout
+                continue  # terminal resize interrupts serial read
+            if not data:
+                break  # timed out
+            self._rx_buffer += data
+            self._split_lines()
 
 
 class GCodeStreamException(Exception):
@@ -91,7 +163,17 @@ class GCodeStreamer(object):
         # - set status
         #   - publish status on screen
         #   - report bad status back to streamer
-        def __init__(self, gcode, widget=None):
+        __slots__ = ('gcode', 'widget', 'data', 'size', 'lineno')
+
+        NORMALIZE_REGEX = re.compile(r'\(.*?\)|;.*|\s')
+
+        def __init__(self, gcode, widget=None, data=None, lineno=None):
+            """
+            :param gcode: gcode text (as displayed)
+            :param widget: ConsoleLine instance (to display progress)
+            :param data: wire data, if already normalized (see Line.normalize)
+            :param lineno: line number in file, None if not from a file (eg: jogging)
+            """
             # verify parameter(s)
             if widget is not None:
                 assert isinstance(widget, ConsoleLine), "bad widget type: %r" % widget
@@ -100,6 +182,11 @@ class GCodeStreamer(object):
             # initialize
             self.gcode = gcode
             self.widget = widget
+            self.lineno = lineno
+
+            # bytes to be sent over serial (including newline), normalized once
+            self.data = data if data is not None else self.normalize(gcode)
+            self.size = len(self.data)
 
         def set_sent(self, value=True):
             if self.widget:
@@ -109,22 +196,28 @@ class GCodeStreamer(object):
             if self.widget:
                 self.widget.content.status = msg
 
-        def _normalized(self):
-            return re.sub(r'\(.*?\)|;.*|\s', '', self.gcode).upper()
+        def release(self):
+            """Drop reference to widget (once it needs no more updates)"""
+            self.widget = None
+
+        @classmethod
+        def normalize(cls, gcode):
+            """
+            :return: bytes to send over serial for the given gcode (including newline)
+            """
+            return _native_bytes(cls.NORMALIZE_REGEX.sub('', gcode).upper() + "\n")
 
         def __str__(self):
             """
             :return: str to be sent over serial (including newline)
             """
-            return self._normalized() + "\n"
+            return _native_str(self.data)
 
         def __len__(self):
-            return len(str(self))
+            return self.size
 
         def __bool__(self):
-            if self._normalized():
-                return True
-            return False
+            return self.size > 1  # more than just a newline
 
         __nonzero__ = __bool__  # python 2.x compatability
 
@@ -132,20 +225,39 @@ class GCodeStreamer(object):
     DEFAULT_MAX_BUFFER = 128
     RESPONSE_REGEX = re.compile(r'^(?P<keyword>(ok|error))', re.I)
 
-    def __init__(self, serial, max_buffer=None):
+    def __init__(self, serial, max_buffer=None, fill_buffer=False, journal=None, monitor=None):
+        """
+        :param serial: SerialPort instance
+        :param max_buffer: GRBL's serial RX buffer size (bytes)
+        :param fill_buffer: if True, each transmission sends as many pending
+                            lines as will fit in GRBL's buffer (in one write),
+                            otherwise one line is sent at a time
+        :param journal: journal.Journal instance; line numbers of lines
+                        acknowledged are recorded (so a job can be resumed)
+        :param monitor: instrument.StreamMonitor instance; told of lines sent
+                        & acknowledged
+        """
         assert isinstance(serial, SerialPort), "bad serial type: %r" % serial
         self.serial = serial
         self.max_buffer = max_buffer if max_buffer is not None else self.DEFAULT_MAX_BUFFER
+        self.fill_buffer = fill_buffer
+        self.journal = journal
+        self.monitor = monitor
 
         # --- Lines
         # Description:
         #    a moving window buffer of GCodeStreamer.Line instances sent to GRBL.
         #    this moving window stretches between:
         #       [0]  oldest sent gcode that has not yet received a GRBL response.
-        #            once status is received, [0] is removed: self.sent_lines.pop(0)
+        #            once status is received, [0] is removed: self.sent_lines.popleft()
         #       [-1] most recent gcode sent to GRBL device.
-        self.sent_lines = []
-        self.pending_lines = []
+        self.sent_lines = collections.deque()
+        self.pending_lines = collections.deque()
+        self._used_buffer = 0  # sum of len(l) for l in self.sent_lines
+
+        # --- Transmission Counters
+        self.write_count = 0  # serial writes (of gcode lines)
+        self.lines_per_write = collections.Counter()  # {<lines in write>: <count>, ...}
 
     def is_valid_response(self, response_msg):  # TODO: delete if not used
         """returns truthy: regex match if valid, None otherwise"""
@@ -160,8 +272,14 @@ class GCodeStreamer(object):
         match = self.RESPONSE_REGEX.search(response)
         if match:  # received text is a valid response to a line
             # Pop oldest line
-            line = self.sent_lines.pop(0)
+            line = self.sent_lines.popleft()
+            self._used_buffer -= line.size
             line.set_status(response)
+            line.release()  # widget's final state; window may now discard it
+            if self.journal and (line.lineno is not None) and (response[0] in 'oO'):
+                self.journal.acknowledged(line.lineno)  # buffered; not written now
+            if self.monitor:
+                self.monitor.acknowledged(line)
 
             # Send next line (if possible)
             self.poll_transmission()
@@ -177,38 +295,85 @@ class GCodeStreamer(object):
         else:
             raise GCodeStreamException("unidentified message: %s" % response)
 
+    def discard_sent(self, count):
+        """
+        Stop counting the oldest sent lines; for lines GRBL will never
+        acknowledge (eg: their response was lost, see flowcontrol)
+        :param count: number of lines to discard
+        :return: list of lines discarded
+        """
+        lines = []
+        while self.sent_lines and (len(lines) < count):
+            line = self.sent_lines.popleft()
+            self._used_buffer -= line.size
+            line.release()
+            lines.append(line)
+        self.poll_transmission()
+        return lines
+
     def can_send(self, line):
         """
         Can the given line be transmitted?
         :return: True if line will not push GRBL's buffer over it's limit
         """
         assert isinstance(line, GCodeStreamer.Line)
-        return (self.used_buffer + len(line)) <= self.max_buffer
+        return (self._used_buffer + line.size) <= self.max_buffer
 
-    def send(self, line):
-        """Add to pending lines, then poll transmission (once)"""
+    def send(self, line, poll=True):
+        """
+        Add to pending lines, then poll transmission (once)
+        :param poll: if False, line is only queued (call poll_transmission() to send)
+        """
         assert isinstance(line, GCodeStreamer.Line)
         self.pending_lines.append(line)
-        self.poll_transmission()
+        if poll:
+            self.poll_transmission()
 
-    def _transmit(self, line):
-        assert isinstance(line, GCodeStreamer.Line)
-        self.serial.write(str(line)) # Send to GRBL device
+    def _transmit(self, lines):
+        """Send lines to GRBL device (in a single write)"""
+        if len(lines) == 1:
+            self.serial.write(lines[0].data)
+        else:
+            self.serial.write(b''.join(l.data for l in lines))
+        self.write_count += 1
+        self.lines_per_write[len(lines)] += 1
+        if self.monitor:
+            self.monitor.transmitted(lines)
 
     def poll_transmission(self):
         """
-        Send next line if there's enough room in GRBL's buffer.
+        Send next line (or as many lines as will fit, if fill_buffer is set)
+        if there's enough room in GRBL's buffer.
         :return: True if there's data to transmit, False if it's all been sent
         """
-        if not self.pending_lines:
+        pending = self.pending_lines
+        if not pending:
             return False
-        elif self.can_send(self.pending_lines[0]):
-            line = self.pending_lines.pop(0)
-            self._transmit(line)
-            self.sent_lines.append(line) # Add to line buffer
-            line.set_sent()
+
+        lines = []
+        used = self._used_buffer
+        while pending and ((used + pending[0].size) <= self.max_buffer):
+            line = pending.popleft()
+            used += line.size
+            lines.append(line)
+            if not self.fill_buffer:
+                break
+
+        if lines:
+            self._transmit(lines)
+            self.sent_lines.extend(lines)  # Add to line buffer
+            self._used_buffer = used
+            for line in lines:
+                line.set_sent()
         return True
 
+    @property
+    def mean_lines_per_write(self):
+        """:return: average number of lines transmitted in each write"""
+        if not self.write_count:
+            return 0.0
+        return float(sum(n * c for (n, c) in self.lines_per_write.items())) / self.write_count
+
     @property
     def finished(self):
         if self.sent_lines or self.pending_lines:
@@ -217,7 +382,7 @@ class GCodeStreamer(object):
 
     @property
     def used_buffer(self):
-        return sum(len(l) for l in self.sent_lines)
+        return self._used_buffer
 
     @property
     def pending_count(self):
@@ -2,6 +2,8 @@ import curses
 import time
 
 class Widget(object):
+    __slots__ = ()
+
     def render(self, *largs, **kwargs):
         raise NotImplementedError("render() function not implemented for %r" % self.__class__)
 
@@ -26,8 +28,9 @@ class Label(Widget):
 
     @text.setter
     def text(self, val):
-        self._text = val
-        self.render()
+        if val != self._text:  # only re-draw if changed
+            self._text = val
+            self.render()
 
 
 class NumberLabel(Widget):
@@ -48,8 +51,9 @@ class NumberLabel(Widget):
 
     @value.setter
     def value(self, v):
-        self._value = v
-        self.render()
+        if v != self._value:  # only re-draw if changed
+            self._value = v
+            self.render()
 
 
 class Button(Widget):
@@ -116,6 +120,8 @@ class Banner(Widget):
 #   info:   <'>' if cur> <info text>
 
 class GCodeContent(object):
+    __slots__ = ('gcode', 'sent', 'status', 'tree_chr')
+
     def __init__(self, gcode, sent=False, status='', tree_chr=None):
         self.gcode = gcode
         self.sent = sent
@@ -158,6 +164,8 @@ class GCodeContent(object):
 
 
 class ConsoleLine(Widget):
+    __slots__ = ('window', 'content', '_cur')
+
     def __init__(self, window, content, cur=False):
         self.window = window
         self.content = content
@@ -1,4 +1,7 @@
+import time
 import curses
+import itertools
+import collections
 
 # local
 from .widget import Banner, Button, NumberLabel, Label
@@ -87,7 +90,7 @@ class StatusWindow(object):
         'Jog: [xxxx.yyy ]       MPos      WPos',
         '   [Y+]    [Z+]   X |xxxx.yyy |xxxx.yyy |   Feed Rate: ?',
         '[X-]  [X+]        Y |xxxx.yyy |xxxx.yyy |   Spindle:   ?',
-        '   [Y-]    [Z-]   Z |xxxx.yyy |xxxx.yyy |   ',
+        '   [Y-]    [Z-]   Z |xxxx.yyy |xxxx.yyy |   Progress:  ?',
     ]
 
     def __init__(self, screen):
@@ -114,6 +117,7 @@ class StatusWindow(object):
             'WPosZ': NumberLabel(self.window, 4, 31),
             'feed_rate': Label(self.window, 2, 44, len=20, text='?', prefix='Feed Rate: '),
             'spindle': Label(self.window, 3, 44, len=20, text='?', prefix='Spindle:   '),
+            'progress': Label(self.window, 4, 44, len=20, text='?', prefix='Progress:  '),
         }
 
         self.render()
@@ -127,12 +131,14 @@ class StatusWindow(object):
             widget.render()
 
     def set_status(self, status, color_index=0):
+        if (status, color_index) == (self.status, self.banner.color_index):
+            return  # no change, nothing to re-draw
         self.status = status
+        self.banner.color_index = color_index  # set first; label setter re-draws
         self.banner.label = "{prefix}{label}".format(
             prefix=self.banner_prefix,
             label=status,
         )
-        self.banner.color_index = color_index
         self.refresh()
 
     @property
@@ -152,14 +158,22 @@ class AccordionWindow(object):
     below it down, and make it smaller.
     """
 
-    def __init__(self, screen, title, soft_height=2, min_height=0):
+    DEFAULT_SCROLLBACK = 1000
+
+    def __init__(self, screen, title, soft_height=2, min_height=0, scrollback=None):
+        """
+        :param scrollback: max number of lines retained (oldest are discarded)
+        """
         self.screen = screen
         self.title = title
         self.soft_height = soft_height
         self.min_height = min_height
+        self.scrollback = scrollback if scrollback is not None else self.DEFAULT_SCROLLBACK
 
         self.focus = False
-        self.lines = []  # list of ConsoleLine instances (first are at the top)
+        # ConsoleLine instances (first are at the top)
+        #   bounded, so memory use doesn't grow with length of a stream
+        self.lines = collections.deque(maxlen=self.scrollback)
 
         self.window = None
         self.banner = None
@@ -170,8 +184,7 @@ class AccordionWindow(object):
         self.banner = Banner(self.window, self.title)
 
     def _add_line(self, line):
-        i = len(self.lines)
-        self.lines.append(line)
+        self.lines.append(line)  # oldest line is dropped if full
         if self.add_line_callback:
             self.add_line_callback(self)
 
@@ -183,13 +196,17 @@ class AccordionWindow(object):
         #self.window.addstr(0, 5, self.title)
 
     def render(self, active=False):
+        """
+        Draw content to window (screen is updated on curses.doupdate(), or refresh())
+        """
         #self.window.clear()  # FIXME: start fresh every render?, inefficient
         self.banner.render(strong=active)
         (rows, cols) = self.window.getmaxyx()
         if rows > 1: # we have room to render lines
-            for (i, line) in enumerate(self.lines[-(rows - 1):]):
+            start = max(0, len(self.lines) - (rows - 1))
+            for (i, line) in enumerate(itertools.islice(self.lines, start, None)):
                 line.render(i + 1)
-        self.refresh()
+        self.window.noutrefresh()
 
     def __eq__(self, other):
         return self.title == other.title
@@ -198,7 +215,7 @@ class AccordionWindow(object):
         self.window.refresh()
 
     def clear(self):
-        self.lines = []
+        self.lines.clear()
         self.window.clear()
 
 
@@ -228,21 +245,34 @@ class StreamWindow(AccordionWindow):
 
 
 class AccordionWindowManager(object):
-    def __init__(self, screen, windows, header_height, footer_height=0):
+    """
+    Arranges AccordionWindow instances vertically, and draws them.
+
+    Changes are not drawn straight away; windows are marked as dirty, then
+    drawn together by draw(), at most max_frame_rate times a second.
+    Layout is only re-calculated when a window's height needs to change
+    (or when forced by update_distrobution(), eg: on terminal resize).
+    """
+    def __init__(self, screen, windows, header_height, footer_height=0,
+                 max_frame_rate=None):
 
         self.screen = screen
         self.windows = windows
         self.header_height = header_height
         self.footer_height = footer_height
+        self.frame_period = (1.0 / max_frame_rate) if max_frame_rate else 0.0
 
         self._focus_index = 0
+        self._heights = None  # window heights of current layout
+        self._dirty = set()  # indexes of windows to render on next draw()
+        self._last_draw = 0.0
 
         self._log = []
 
         # Initialize accordion window's curses.Window instance
         def _add_line_cb(window):
-            self.update_distrobution()
-            window.render()
+            self.mark_dirty(window)
+            self.draw()
 
         cur_row = self.header_height
         for (i, window) in enumerate(self.windows):
@@ -260,7 +290,36 @@ class AccordionWindowManager(object):
         self._focus_index = self.windows.index(value)
         self.update_distrobution()
 
-    def update_distrobution(self):
+    def mark_dirty(self, *windows):
+        """Flag windows' content as changed; they're rendered on next draw()"""
+        for window in windows:
+            self._dirty.add(self.windows.index(window))
+
+    def draw(self, force=False):
+        """
+        Render dirty windows to screen (re-calculating layout if needed)
+        :param force: if False, nothing is drawn if the last frame was drawn
+                      less than 1/max_frame_rate ago
+        :return: True if a frame was drawn
+        """
+        now = time.time()
+        if not force and (now - self._last_draw) < self.frame_period:
+            return False  # too soon; dirty windows are drawn next time
+        self._last_draw = now
+
+        if self._distribution() != self._heights:
+            self._layout()  # renders all windows
+        else:
+            for i in sorted(self._dirty):
+                self.windows[i].render(active=(i == self._focus_index))
+        self._dirty.clear()
+        curses.doupdate()
+        return True
+
+    def _distribution(self):
+        """
+        :return: list of window heights (in the same order as self.windows)
+        """
         # rows available across space
         rows = self.screen.getmaxyx()[0] - (self.header_height + self.footer_height)
         min_occupied = sum(w.min_height for w in self.windows)
@@ -275,7 +334,7 @@ class AccordionWindowManager(object):
         height_f = min(available, extra_alocate) + self.focus.min_height
         available -= height_f - self.focus.min_height
 
-        cur_row = self.header_height
+        heights = []
         for w in self.windows:
             if w == self.focus:
                 height = height_f
@@ -283,11 +342,24 @@ class AccordionWindowManager(object):
                 extra_alocate = max(0, (len(w.lines) + 1) - w.min_height)
                 height = min(available, extra_alocate) + w.min_height
                 available -= height - w.min_height
+            heights.append(height)
+
+        return heights
 
+    def _layout(self):
+        # move, resize & render all windows
+        self._heights = self._distribution()
+        cur_row = self.header_height
+        for (w, height) in zip(self.windows, self._heights):
             w.move_window(cur_row, height)
             w.render(active=True if w == self.focus else False)
             cur_row += height
 
+    def update_distrobution(self):
+        """Re-calculate layout, and draw all windows now"""
+        self._layout()
+        self._dirty.clear()
+        self._last_draw = time.time()
         self.refresh()
 
     def refresh(self):
@@ -0,0 +1,37 @@
+import unittest
+
+# add relative libraries to path
+import testutils
+
+from grblstream import benchmark
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_workloads(self):
+        for (name, workload) in benchmark.WORKLOADS.items():
+            self.assertEqual(len(workload(lines=100)), 102, name)  # + footer
+
+    def test_run(self):
+        result = benchmark.run_benchmark(benchmark.surfacing_workload(lines=30), pending_count=50)
+        self.assertEqual(result['lines'], 32)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['rx_overflow'], 0)
+        self.assertGreater(result['lines_per_sec'], 0)
+        self.assertLessEqual(result['buffer_fill_max'], 128)
+
+    def test_format_no_latency(self):
+        result = {
+            'name': 'a', 'lines_per_sec': 10.0, 'bytes_per_sec': 100.0,
+            'latency_mean': None, 'latency_p99': None,  # (no samples)
+            'planner_starved_ratio': 0.0, 'lines_per_write': 1.0,
+        }
+        self.assertIn("latency(mean/p99): n/a/n/a ", benchmark.format_result(result))
+        result.update({'latency_mean': 0.001, 'latency_p99': 0.002})
+        self.assertIn("latency(mean/p99): 0.00100s/0.00200s ", benchmark.format_result(result))
+
+    def test_compare(self):
+        baseline = {'runs': [{'name': 'a', 'lines_per_sec': 100.0}]}
+        results = {'runs': [{'name': 'a', 'lines_per_sec': 95.0}]}
+        self.assertEqual(benchmark.compare(results, baseline, tolerance=0.1), [])
+        results['runs'][0]['lines_per_sec'] = 80.0
+        self.assertEqual(len(benchmark.compare(results, baseline, tolerance=0.1)), 1)
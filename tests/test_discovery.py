@@ -0,0 +1,92 @@
+import unittest
+import os
+import pty
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream import discovery
+from grblstream.discovery import DeviceCache, discover, port_identity, probe
+from grblstream.simulator import GRBLSimulator
+
+
+class _Port(object):
+    # like serial.tools.list_ports_common.ListPortInfo
+    def __init__(self, device, serial_number=None, vid=0x1a86, pid=0x7523, location='1-1.2:1.0'):
+        self.device = device
+        self.serial_number = serial_number
+        self.vid = vid
+        self.pid = pid
+        self.location = location
+
+
+class DiscoveryTests(unittest.TestCase):
+    def setUp(self):
+        self.simulator = GRBLSimulator()
+        self.simulator.start()
+        (self.master, self.slave) = pty.openpty()  # a device that never responds
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tempdir, 'devices.json')
+        self.ports = [
+            _Port(self.simulator.device, serial_number='55639303235351c071b0'),
+            _Port(os.ttyname(self.slave), location='1-1.3:1.0'),  # (no serial number, eg: a CH340 clone)
+            _Port('/dev/ttyS0', vid=None),  # not USB
+        ]
+        self.probed = []
+        self._probe_all = discovery.probe_all
+        discovery.probe_all = self.probe_all
+
+    def tearDown(self):
+        discovery.probe_all = self._probe_all
+        shutil.rmtree(self.tempdir)
+        os.close(self.master)
+        os.close(self.slave)
+        self.simulator.stop()
+
+    def probe_all(self, devices, **kwargs):
+        self.probed.append(sorted(devices))
+        return self._probe_all(devices, **kwargs)
+
+    def test_identity(self):
+        self.assertEqual(port_identity(self.ports[0]), '55639303235351C071B0')
+        self.assertEqual(port_identity(self.ports[1]), 'usb:1a86:7523@1-1.3:1.0')
+        self.assertIsNone(port_identity(self.ports[2]))
+
+    def test_probe(self):
+        self.assertTrue(probe(self.simulator.device, timeout=1).startswith('Grbl 1.1f'))
+        self.assertIsNone(probe(os.ttyname(self.slave), timeout=0.2))
+        self.assertIsNone(probe('/dev/nonexistent', timeout=0.2))
+
+    def test_cached(self):
+        found = discover(cache_file=self.cache_file, timeout=0.5, ports=self.ports)
+        self.assertEqual([d.device for d in found], [self.simulator.device])
+        self.assertEqual(len(self.probed[0]), 2)  # (not the non-USB port)
+
+        # nothing probed; both ports are cached
+        self.probed = []
+        found = discover(cache_file=self.cache_file, timeout=0.5, ports=self.ports)
+        self.assertEqual([d.device for d in found], [self.simulator.device])
+        self.assertEqual(self.probed, [[]])
+
+        # by serial number
+        found = discover(serial_number='55639303235351C071B0', cache_file=self.cache_file, ports=self.ports)
+        self.assertEqual([d.serial_number for d in found], ['55639303235351c071b0'])
+
+    def test_stale(self):
+        # cached as not GRBL (eg: it was busy when probed)
+        cache = DeviceCache(self.cache_file)
+        cache.set(self.ports[0], None)
+        cache.set(self.ports[1], None)
+        cache.save()
+        found = discover(cache_file=self.cache_file, timeout=0.5, ports=self.ports)
+        self.assertEqual([d.device for d in found], [self.simulator.device])
+        self.assertEqual([len(p) for p in self.probed], [0, 2])  # (nothing new, then all)
+
+        # a port that's moved (to another device) is probed again
+        self.probed = []
+        self.ports[0].device = os.ttyname(self.slave)
+        found = discover(cache_file=self.cache_file, timeout=0.2, ports=self.ports[:1])
+        self.assertEqual(found, [])
+        self.assertEqual(self.probed, [[os.ttyname(self.slave)]])  # (only once)
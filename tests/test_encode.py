@@ -0,0 +1,89 @@
+import unittest
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.encode import WireEncoder, trim_number
+from grblstream.pipeline import Pipeline
+
+
+def encode(lines, precision=4):
+    encoder = WireEncoder(precision)
+    return ([encoder.encode(l + b'\n').rstrip(b'\n') for l in lines], encoder)
+
+
+class WireEncoderTests(unittest.TestCase):
+    def test_trim_number(self):
+        self.assertEqual(trim_number(10.0, 4), b'10')
+        self.assertEqual(trim_number(-0.5, 4), b'-.5')
+        self.assertEqual(trim_number(0.123456, 4), b'.1235')
+        self.assertEqual(trim_number(-0.00001, 4), b'0')
+        self.assertEqual(trim_number(100, 0), b'100')
+
+    def test_modal(self):
+        (encoded, encoder) = encode([
+            b'N10G01X10.0000Y5.5000F300.0',
+            b'N20G01X10.0000Y6.0000F300.0',
+            b'G1X11F200',  # feed rate changed
+            b'G0Z5',  # motion mode changed
+            b'G0X0Y0',
+            b'G53G0X0',  # (G0 kept with non-modal axis commands)
+            b'$H',
+            b'G0Z1',
+        ])
+        self.assertEqual(encoded, [
+            b'G1X10Y5.5F300',
+            b'X10Y6',
+            b'X11F200',
+            b'G0Z5',
+            b'X0Y0',
+            b'G53G0X0',
+            b'$H',
+            b'Z1',
+        ])
+        self.assertEqual(encoder.line_count, 8)
+        saved = sum(len(a) - len(b) for (a, b) in zip([
+            b'N10G01X10.0000Y5.5000F300.0', b'N20G01X10.0000Y6.0000F300.0', b'G1X11F200',
+            b'G0Z5', b'G0X0Y0', b'G53G0X0', b'$H', b'G0Z1',
+        ], encoded))
+        self.assertAlmostEqual(encoder.bytes_saved_per_line, saved / 8.)
+
+    def test_feed_mode(self):
+        (encoded, _) = encode([
+            b'G93G1X1F10',
+            b'X2F10',  # inverse time: every move needs a feed rate
+            b'G94X3F300',
+            b'X4F300',
+        ])
+        self.assertEqual(encoded, [b'G93G1X1F10', b'X2F10', b'G94X3F300', b'X4'])
+
+    def test_units(self):
+        (encoded, _) = encode([
+            b'G21',
+            b'G1X10F100',
+            b'G20',
+            b'G1X1F100',  # 100 inch/min, not 100 mm/min
+            b'X2F100',
+            b'G21X3F100',
+        ])
+        self.assertEqual(encoded, [b'G21', b'G1X10F100', b'G20', b'X1F100', b'X2', b'G21X3F100'])
+
+    def test_unknown(self):
+        # modes are forgotten after lines that aren't understood
+        (encoded, _) = encode([b'G1X1F100', b'#1=2', b'G1X2F100', b'X1X2', b'G1X3'])
+        self.assertEqual(encoded, [b'G1X1F100', b'#1=2', b'G1X2F100', b'X1X2', b'G1X3'])
+
+    def test_pipeline(self):
+        gcode = 'G1 X1.000 F100\nG1 X2.000 F100 (comment)\nG1 F100\n'
+        with Pipeline(six.StringIO(gcode), encode_precision=3) as pipeline:
+            items = [(i.gcode, i.data) for i in pipeline]
+            self.assertEqual(items, [
+                ('G1 X1.000 F100', b'G1X1F100\n'),
+                ('G1 X2.000 F100 (comment)', b'X2\n'),  # displayed as it is
+                ('G1 F100', b'\n'),  # (blank lines aren't sent)
+            ])
+
+
+if __name__ == '__main__':
+    unittest.main()
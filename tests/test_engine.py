@@ -0,0 +1,87 @@
+import unittest
+import time
+
+# add relative libraries to path
+import testutils
+
+from grblstream.engine import EventLoop, StreamEngine, NOT_READY
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort
+from grblstream.streamer import GCodeStreamer, GCodeStreamException
+
+
+class EventLoopTests(unittest.TestCase):
+    def test_timers(self):
+        loop = EventLoop()
+        calls = []
+        loop.call_later(0.02, lambda: calls.append('b'))
+        loop.call_later(0.01, lambda: calls.append('a'))
+        loop.call_later(0.01, lambda: calls.append('x')).cancel()
+        loop.call_soon(lambda: calls.append('soon'))
+        self.assertTrue(loop.run_until(lambda: len(calls) == 3, timeout=1))
+        self.assertEqual(calls, ['soon', 'a', 'b'])
+
+    def test_timeout(self):
+        loop = EventLoop()
+        start = time.time()
+        self.assertFalse(loop.run_until(lambda: False, timeout=0.05))
+        self.assertLess(time.time() - start, 0.5)
+
+
+class StreamEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.simulator = GRBLSimulator(block_time=0.001)
+        self.simulator.start()
+        self.serialport = SerialPort(self.simulator.device, 115200)
+        self.serialport.write('\r\n\r\n')  # wake up
+        self.streamer = GCodeStreamer(self.serialport)
+        self.engine = StreamEngine(self.serialport, self.streamer, pending_count=5)
+        self.messages = []
+        self.engine.message_callback = self.messages.append
+        self.engine.start()
+
+    def tearDown(self):
+        self.engine.stop()
+        self.serialport.serial.close()
+        self.simulator.stop()
+
+    def test_stream(self):
+        statuses = []
+        self.engine.status_callback = statuses.append
+        self.engine.loop.run_until(lambda: self.messages, timeout=1)
+        self.assertEqual(self.messages, ["Grbl 1.1f ['$' for help]"])
+
+        self.engine.stream(GCodeStreamer.Line('G1 X%i F1000' % i) for i in range(100))
+        self.assertTrue(self.engine.run(timeout=5))
+        self.assertEqual(self.simulator.stats['lines'], 100)
+
+        self.serialport.write('?')
+        self.engine.loop.run_until(lambda: statuses, timeout=1)
+        self.assertTrue(statuses[0].startswith('<'))
+
+    def test_error(self):
+        errors = []
+        self.engine.error_callback = errors.append
+        self.engine.loop.run_until(lambda: self.messages, timeout=1)
+        self.engine.stream([GCodeStreamer.Line('G0 X1'), GCodeStreamer.Line('M6'), GCodeStreamer.Line('G0 X2')])
+        self.assertTrue(self.engine.run(timeout=5))
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], GCodeStreamException)
+
+    def test_not_ready(self):
+        # a source that isn't ready doesn't block the loop; it's tried again
+        self.engine.loop.run_until(lambda: self.messages, timeout=1)
+        ticks = []
+        self.engine.loop.call_later(0.01, lambda: ticks.append(1))
+
+        def lines():
+            for i in range(3):
+                ready_time = time.time() + 0.05
+                while time.time() < ready_time:
+                    yield NOT_READY
+                yield GCodeStreamer.Line('G0 X%i' % i)
+
+        self.engine.stream(lines())
+        self.assertTrue(self.engine.run(timeout=5))
+        self.assertEqual(self.simulator.stats['lines'], 3)
+        self.assertEqual(ticks, [1])  # (loop kept running while waiting)
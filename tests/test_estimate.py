@@ -0,0 +1,118 @@
+import unittest
+import os
+import math
+import time
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.estimate import Toolpath, MachineLimits, Estimate, EstimateThread, tokenize
+from grblstream.estimate import COL_LENGTH, COL_SPEED, COL_RADIUS, COL_STOP
+from grblstream.source import Progress
+
+
+# $110-$112: 600 mm/min (10 mm/sec), $120-$122: 10 mm/sec^2
+SETTINGS = {'110': 600, '111': 600, '112': 600, '120': 10, '121': 10, '122': 10}
+
+
+def estimate(*lines):
+    return Estimate(Toolpath.from_lines(lines), MachineLimits(SETTINGS))
+
+
+class ToolpathTests(unittest.TestCase):
+    def test_tokenize(self):
+        # fast path (letters followed by numbers) matches the slow path
+        (count, lineno, letter, value) = tokenize(b'G1X10 y-2.5 (comment) ; more\n$H\nG0 Z.5')
+        self.assertEqual(count, 3)
+        self.assertEqual(list(lineno), [1, 1, 1, 3, 3])
+        self.assertEqual(bytearray(letter), bytearray(b'GXYGZ'))
+        self.assertEqual(list(value), [1, 10, -2.5, 0, 0.5])
+        (count, lineno, letter, value) = tokenize(b'G1 X 10 Y-2.5\n#1=2\nG0 Z.5')
+        self.assertEqual(list(lineno), [1, 1, 1, 3, 3])
+        self.assertEqual(list(value), [1, 10, -2.5, 0, 0.5])
+
+    def test_modal(self):
+        toolpath = Toolpath.from_lines([
+            'G20 G91',
+            'G1 X1 F10',  # 25.4 mm, at 10 inch/min
+            'X1',  # (G1 is modal)
+            'G90 G21 X10',  # back to 10 mm
+            'G92 X0',  # position defined (no motion)
+            'X0',  # no motion
+            'M3 S1000',
+            'G0 Y10',
+        ])
+        seg = toolpath.segments
+        self.assertEqual(list(seg[:, 0]), [2, 3, 4, 8])
+        self.assertEqual(list(seg[:, COL_LENGTH]), [25.4, 25.4, 40.8, 10])
+        self.assertAlmostEqual(seg[0, COL_SPEED], 254 / 60.)
+        self.assertEqual(seg[3, COL_SPEED], 0)  # rapid
+        self.assertEqual(list(seg[:, COL_STOP]), [1, 0, 0, 1])
+
+    def test_arcs(self):
+        toolpath = Toolpath.from_lines([
+            'G0 X10',
+            'G2 X20 I5',  # half circle (radius: 5)
+            'G3 X10 R-5',  # half circle back
+            'G18 G2 X10 K5',  # full circle (ZX plane)
+        ])
+        seg = toolpath.segments
+        for (i, length) in enumerate([5 * math.pi, 5 * math.pi, 10 * math.pi], 1):
+            self.assertAlmostEqual(seg[i, COL_LENGTH], length)
+            self.assertAlmostEqual(seg[i, COL_RADIUS], 5)
+
+
+class EstimateTests(unittest.TestCase):
+    def test_trapezoid(self):
+        # accelerate to 10 mm/sec (1 sec, 5 mm), cruise 90 mm (9 sec), decelerate (1 sec)
+        self.assertAlmostEqual(estimate('G1 X100 F600').total, 11)
+
+    def test_triangle(self):
+        # accelerate (5 mm), decelerate (5 mm); never reaches full speed
+        self.assertAlmostEqual(estimate('G1 X8 F600').total, 2 * math.sqrt(2 * 4 / 10.))
+
+    def test_junctions(self):
+        # straight: no need to slow down between moves
+        self.assertAlmostEqual(estimate('G1 X50 F600', 'X100').total, 11)
+        # reversal: stops between moves
+        self.assertAlmostEqual(estimate('G1 X50 F600', 'X0').total, 12)
+        # stops for spindle changes, and dwells
+        est = estimate('G1 X50 F600', 'M3 S1000', 'G4 P2.5', 'X100')
+        self.assertAlmostEqual(est.total, 14.5)
+        self.assertAlmostEqual(est.time_at(2), 6)
+        self.assertAlmostEqual(est.remaining(3), 6)
+
+    def test_progress(self):
+        est = estimate('G1 X100 F600', 'X200', 'X300', 'X400')
+        progress = Progress(4, estimate=est)
+        self.assertAlmostEqual(progress.eta, est.total)
+        progress.update(1)
+        progress.start_time -= 2 * est.time_at(2)  # twice as slow as estimated
+        progress.update(2)
+        self.assertAlmostEqual(progress.eta, 2 * est.remaining(2), places=1)
+
+
+    def test_thread(self):
+        (fd, filename) = tempfile.mkstemp(suffix='.nc')
+        try:
+            os.write(fd, b'G1 X100 F600\n')
+            os.close(fd)
+            estimator = EstimateThread(filename, SETTINGS)
+            end_time = time.time() + 5
+            while not estimator.done and (time.time() < end_time):
+                time.sleep(0.01)
+            self.assertAlmostEqual(estimator.result().total, 11)
+        finally:
+            os.remove(filename)
+
+        # failure is kept (not raised)
+        estimator = EstimateThread('/nonexistent.nc', SETTINGS)
+        estimator._thread.join()
+        self.assertTrue(estimator.done)
+        self.assertIsNone(estimator.result())
+        self.assertIsNotNone(estimator.failed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import json
+import os
+import six
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.config import DEFAULT_SETTINGS
+from grblstream.engine import EventLoop
+from grblstream import farm
+from grblstream.farm import Farm, FarmDevice, FarmJobSpec, JobConfig, parse_job
+from grblstream.simulator import GRBLSimulator
+
+
+class _Settings(object):
+    # default settings (without a settings file, or command-line arguments)
+    def __getattr__(self, key):
+        return DEFAULT_SETTINGS.get(key)
+
+
+class ParseJobTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_job('/dev/ttyACM0=a=b.nc'), FarmJobSpec('/dev/ttyACM0', 'a=b.nc', 'ttyACM0'))
+        with self.assertRaises(Exception):
+            parse_job('/dev/ttyACM0')
+
+
+class FarmTests(unittest.TestCase):
+    def setUp(self):
+        self.simulators = [GRBLSimulator(block_time=0.001) for i in range(2)]
+        for simulator in self.simulators:
+            simulator.start()
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+        for simulator in self.simulators:
+            simulator.stop()
+
+    def write_files(self):
+        files = []
+        for (i, gcode) in enumerate(["G21\nG1 X1 F100\nG0 X2\n", "G21\nG1 Y1 F100\nG1 Y2 Z3\nG0 X0\n"]):
+            filename = os.path.join(self.tempdir, 'job%i.nc' % i)
+            with open(filename, 'w') as fh:
+                fh.write(gcode)
+            files.append(filename)
+        return files
+
+    def test_farm(self):
+        files = self.write_files()
+        stream = six.StringIO()
+        loop = EventLoop()
+        devices = [
+            FarmDevice(
+                'dev%i' % i,
+                JobConfig(
+                    _Settings(), serial_device=simulator.device, infile=files[i],
+                    start_line=1, journal=False, job_cache=False,
+                ),
+                loop, stream,
+            )
+            for (i, simulator) in enumerate(self.simulators)
+        ]
+        self.assertEqual(Farm(devices, loop).run(), 0)
+
+        events = [json.loads(l) for l in stream.getvalue().splitlines()]
+        done = dict((e['device'], e) for e in events if e['event'] == 'done')
+        self.assertEqual(sorted(done.keys()), ['dev0', 'dev1'])
+        self.assertTrue(all(e['success'] for e in done.values()))
+        self.assertEqual(done['dev0']['lines'], 3)
+        self.assertEqual(done['dev1']['lines'], 4)
+
+    def test_run(self):
+        # events are named by the devices given (not the simulators' ptys)
+        files = self.write_files()
+        event_file = os.path.join(self.tempdir, 'events.json')
+        config = JobConfig(_Settings(), event_file=event_file, journal=False, job_cache=False)
+        jobs = [
+            FarmJobSpec(simulator.device, files[i], name)
+            for (i, (simulator, name)) in enumerate(zip(self.simulators, ['left', 'right']))
+        ]
+        self.assertEqual(farm.run(config, jobs), 0)
+
+        with open(event_file, 'r') as fh:
+            events = [json.loads(l) for l in fh]
+        self.assertEqual(
+            sorted(e['device'] for e in events if e['event'] == 'done'),
+            ['left', 'right'],
+        )
+        self.assertEqual(events[-1]['event'], 'farm')
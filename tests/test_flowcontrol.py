@@ -0,0 +1,117 @@
+import unittest
+import os
+import pty
+import tty
+import json
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.flowcontrol import BufferCalibrator
+from grblstream.status import StatusReport
+from grblstream.streamer import SerialPort, GCodeStreamer
+from grblstream.headless import EventWriter, HeadlessStreamer, read_lines
+from grblstream.pipeline import Pipeline
+from grblstream.polling import StatusPoller
+from grblstream.simulator import GRBLSimulator
+
+
+def report(state, rx_free):
+    return StatusReport('<%s|MPos:0.000,0.000,0.000|Bf:15,%i>' % (state, rx_free))
+
+
+class BufferCalibratorTests(unittest.TestCase):
+    def setUp(self):
+        (self.master, slave) = pty.openpty()
+        tty.setraw(slave)
+        self.serialport = SerialPort(os.ttyname(slave), 115200)
+        os.close(slave)
+        self.streamer = GCodeStreamer(self.serialport, 128)
+        self.warnings = []
+        self.calibrator = BufferCalibrator(self.streamer, warning_callback=self.warnings.append)
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        os.close(self.master)
+
+    def send(self, count):
+        for i in range(count):
+            self.streamer.send(GCodeStreamer.Line('G1X%i' % i))  # 5 bytes each
+
+    def test_size(self):
+        self.calibrator.update(report('Idle', 128))
+        self.assertEqual((self.streamer.max_buffer, self.warnings), (128, []))
+        # smaller buffer
+        self.calibrator.update(report('Idle', 64))
+        self.assertEqual(self.streamer.max_buffer, 64)
+        # larger buffer (nothing in flight)
+        self.calibrator.update(report('Idle', 256))
+        self.assertEqual(self.streamer.max_buffer, 256)
+        self.assertEqual(self.calibrator.corrections, 2)
+        self.assertEqual(len(self.warnings), 2)
+
+    def test_drift(self):
+        self.calibrator.update(report('Idle', 128))
+        self.send(4)
+        self.assertEqual(self.streamer.used_buffer, 20)
+        self.calibrator.update(report('Run', 100))  # 28 bytes in GRBL's buffer
+        self.assertEqual(self.calibrator.drift, 8)
+        self.assertEqual(self.streamer.max_buffer, 120)
+        self.assertIn('unaccounted', self.warnings[-1])
+        self.calibrator.update(report('Run', 110))  # consistent
+        self.assertEqual(self.calibrator.drift, 0)
+        self.assertEqual(self.streamer.max_buffer, 120)
+
+    def test_never_acknowledged(self):
+        self.calibrator.update(report('Idle', 128))
+        self.send(2)
+        for i in range(BufferCalibrator.STALE_REPORTS):
+            self.calibrator.update(report('Idle', 128))
+        self.assertEqual(self.calibrator.drift, -10)
+        self.assertIn('never acknowledged', self.warnings[-1])
+        # no longer counted; limit isn't raised beyond GRBL's buffer
+        self.assertEqual(self.streamer.used_buffer, 0)
+        self.assertEqual(len(self.streamer.sent_lines), 0)
+        self.assertEqual(self.streamer.max_buffer, 128)
+
+    def test_dwell(self):
+        # GRBL reports Idle (buffer empty) during a dwell; its 'ok' is held back
+        self.calibrator.update(report('Idle', 128))
+        self.streamer.send(GCodeStreamer.Line('G4 P10'))
+        self.send(2)
+        for i in range(BufferCalibrator.STALE_REPORTS * 2):
+            self.calibrator.update(report('Idle', 128))
+        self.assertEqual(self.warnings, [])
+        self.assertEqual(self.streamer.used_buffer, 16)  # G4P10, G1X0, G1X1
+        self.assertEqual(self.streamer.max_buffer, 128)
+        for i in range(3):
+            self.streamer.process_response('ok')
+        self.assertEqual(self.streamer.used_buffer, 0)
+
+
+class CalibratedStreamTests(unittest.TestCase):
+    def test_headless(self):
+        # GRBL's buffer is smaller than configured
+        with GRBLSimulator(rx_buffer_size=64, settings={10: 3}) as simulator:
+            serialport = SerialPort(simulator.device, 115200)
+            stream = six.StringIO()
+            events = EventWriter(stream)
+            headless = HeadlessStreamer(
+                serialport, events, max_buffer=128,
+                status_poller=StatusPoller(serialport),
+                calibrate=True,
+            )
+            gcode = ''.join('G1 X%i F100\n' % i for i in range(20))
+            with Pipeline(six.StringIO(gcode)) as pipeline:
+                code = headless.run(read_lines(pipeline, events))
+            serialport.serial.close()
+
+        self.assertEqual(code, 0)
+        events = [json.loads(l) for l in stream.getvalue().splitlines()]
+        self.assertEqual(len([e for e in events if e['event'] == 'warning']), 1)
+        self.assertEqual(headless.streamer.max_buffer, 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
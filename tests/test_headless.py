@@ -0,0 +1,74 @@
+import unittest
+import json
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.headless import EventWriter, HeadlessStreamer, read_lines
+from grblstream.pipeline import Pipeline
+from grblstream.polling import StatusPoller
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort
+
+
+class EventWriterTests(unittest.TestCase):
+    def test_status_rate(self):
+        stream = six.StringIO()
+        events = EventWriter(stream, status_interval=10)
+        events.emit_status(state='Idle')
+        events.emit('ok', line=1)
+        events.emit_status(state='Run')  # rate limited
+        events.emit_status(state='Hold')  # replaces 'Run'
+        events.flush()
+        self.assertEqual(stream.getvalue().count('\n'), 2)
+        events.flush(force=True)
+        lines = [json.loads(l) for l in stream.getvalue().splitlines()]
+        self.assertEqual([(e['event'], e.get('state')) for e in lines], [
+            ('status', 'Idle'), ('ok', None), ('status', 'Hold'),
+        ])
+        self.assertEqual(events.status_dropped, 1)
+
+
+class HeadlessStreamerTests(unittest.TestCase):
+    def setUp(self):
+        self.simulator = GRBLSimulator(block_time=0.001)
+        self.simulator.start()
+        self.serialport = SerialPort(self.simulator.device, 115200)
+        self.stream = six.StringIO()
+        self.events = EventWriter(self.stream)
+        self.headless = HeadlessStreamer(
+            self.serialport, self.events,
+            status_poller=StatusPoller(self.serialport),
+        )
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        self.simulator.stop()
+
+    def run_headless(self, gcode):
+        with Pipeline(six.StringIO(gcode)) as pipeline:
+            code = self.headless.run(read_lines(pipeline, self.events))
+        return (code, [json.loads(l) for l in self.stream.getvalue().splitlines()])
+
+    def test_stream(self):
+        (code, events) = self.run_headless("G21\n(comment)\nG1 X1 F100\nG0 X2\n")
+        self.assertEqual(code, 0)
+        self.assertEqual([e['event'] for e in events][:3], ['init', 'init', 'init'])
+        self.assertEqual([e['line'] for e in events if e['event'] == 'ok'], [1, 3, 4])
+        self.assertEqual(events[-2]['state'], 'Idle')
+        self.assertEqual(events[-2]['mpos'], [2.0, 0.0, 0.0])
+        self.assertEqual(events[-1]['event'], 'done')
+        self.assertEqual(events[-1]['lines'], 3)
+
+    def test_settings(self):
+        self.assertTrue(self.headless.initialize())
+        self.assertEqual(float(self.headless.grbl_settings['12']), self.simulator.settings[12])  # arc tolerance
+
+    def test_error(self):
+        (code, events) = self.run_headless("G1 X1 F100\nM6\nG0 X2\nG0 X3\n")
+        self.assertEqual(code, 1)
+        errors = [e for e in events if e['event'] == 'error']
+        self.assertEqual([(e['line'], e['code']) for e in errors], [(2, 'error:20')])
+        self.assertIn('hold', [e['event'] for e in events])
+        self.assertFalse(events[-1]['success'])
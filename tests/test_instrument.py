@@ -0,0 +1,95 @@
+import unittest
+import json
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.instrument import StreamMonitor
+from grblstream.status import StatusReport
+from grblstream.streamer import GCodeStreamer
+from grblstream.headless import EventWriter, HeadlessStreamer, read_lines
+from grblstream.pipeline import Pipeline
+from grblstream.polling import StatusPoller
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort
+
+
+def report(state, planner_free, rx_free):
+    status = StatusReport()
+    status.update('<%s|MPos:0.000,0.000,0.000|Bf:%i,%i>' % (state, planner_free, rx_free))
+    return status
+
+
+class StreamMonitorTests(unittest.TestCase):
+    def test_starvation(self):
+        monitor = StreamMonitor()
+        monitor.status(report('Idle', 15, 128))  # sizes (before the job)
+        monitor.start()
+        lines = [GCodeStreamer.Line('G1 X%i' % i, lineno=i) for i in range(1, 5)]
+
+        monitor.transmitted(lines[:2])
+        monitor.status(report('Run', 14, 128))  # 1 block queued: starved
+        monitor.acknowledged(lines[0])
+        monitor.status(report('Run', 5, 100))  # recovered
+        monitor.acknowledged(lines[1])
+        monitor.status(report('Run', 15, 128))  # nothing in flight
+        monitor.transmitted(lines[2:])
+        monitor.status(report('Run', 14, 120))  # still waiting on GRBL
+        monitor.acknowledged(lines[2])
+        monitor.acknowledged(lines[3])
+        monitor.stop()
+        monitor.status(report('Idle', 15, 128))  # after the job; ignored
+
+        periods = monitor.periods
+        self.assertEqual([(p.first_line, p.last_line, p.cause) for p in periods], [
+            (None, 1, 'link'),
+            (2, 4, 'host'),  # most frequent cause (first reported on a tie)
+        ])
+        summary = monitor.summary()
+        json.dumps(summary)  # serializable
+        self.assertEqual(summary['responses'], 4)
+        self.assertEqual(summary['status_reports'], 4)
+        self.assertEqual(summary['planner_blocks']['min'], 0)
+        self.assertEqual(summary['rx_used']['max'], 28)
+        self.assertEqual(monitor.used_buffer, 0)
+
+    def test_no_buffer_state(self):
+        monitor = StreamMonitor()
+        monitor.start()
+        status = StatusReport()
+        status.update('<Run|MPos:0.000,0.000,0.000>')
+        monitor.status(status)
+        monitor.stop()
+        self.assertEqual(monitor.summary()['buffer_reports'], 0)
+        self.assertIn('$10', monitor.report()[-1])
+
+
+class InstrumentedStreamTests(unittest.TestCase):
+    def test_headless(self):
+        with GRBLSimulator(block_time=0.005, settings={10: 3}) as simulator:
+            serialport = SerialPort(simulator.device, 115200)
+            stream = six.StringIO()
+            events = EventWriter(stream)
+            monitor = StreamMonitor()
+            headless = HeadlessStreamer(
+                serialport, events,
+                status_poller=StatusPoller(serialport, interval=0.01, min_interval=0.01),
+                monitor=monitor,
+            )
+            gcode = ''.join('G1 X%i F100\n' % i for i in range(40))
+            with Pipeline(six.StringIO(gcode)) as pipeline:
+                code = headless.run(read_lines(pipeline, events))
+            serialport.serial.close()
+
+        self.assertEqual(code, 0)
+        events = [json.loads(l) for l in stream.getvalue().splitlines()]
+        self.assertEqual([e['event'] for e in events][-2:], ['instrument', 'done'])
+        summary = events[-2]
+        self.assertEqual(summary['responses'], 40)
+        self.assertGreater(summary['buffer_reports'], 0)
+        self.assertEqual(monitor.planner_size, 15)
+
+
+if __name__ == '__main__':
+    unittest.main()
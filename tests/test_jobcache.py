@@ -0,0 +1,103 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.jobcache import JobCache, CompiledJob, CompiledJobWriter, CachingPipeline
+from grblstream.pipeline import Pipeline, PreparedLine
+
+
+class JobCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = JobCache(os.path.join(self.directory, 'cache'))
+        self.gcode_filename = os.path.join(self.directory, 'part.gcode')
+        with open(self.gcode_filename, 'w') as fh:
+            fh.write("G21 (mm)\nG1 X1 F100 S1000\n\nG0 X2\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_compiled_job(self):
+        lines = [
+            PreparedLine(1, 'G1 X1 F100 S1000', False, None, None),
+            PreparedLine(1, 'F100', True, 'branch', b'F100\n'),
+            PreparedLine(1, 'G01 X1', True, 'last', b'G01X1\n'),
+            PreparedLine(2, '', True, None, b'\n'),
+        ]
+        filename = os.path.join(self.directory, 'job')
+        writer = CompiledJobWriter(filename)
+        for line in lines:
+            writer.add(line)
+        writer.commit()
+        with CompiledJob(filename) as job:
+            self.assertEqual(len(job), 4)
+            self.assertEqual(job[2], lines[2])
+            self.assertEqual(list(job), lines)
+            self.assertTrue(job.finished)
+
+    def test_source(self):
+        # first time: prepared by a pipeline (and cached)
+        with self.cache.source(self.gcode_filename, split_gcodes=True) as source:
+            self.assertIsInstance(source, CachingPipeline)
+            prepared = list(source)
+        self.assertEqual(len(self.cache.entries()), 1)
+
+        # second time: from cache
+        with self.cache.source(self.gcode_filename, split_gcodes=True) as source:
+            self.assertIsInstance(source, CompiledJob)
+            self.assertEqual(list(source), prepared)
+
+        # different settings: different key
+        with self.cache.source(self.gcode_filename, split_gcodes=False) as source:
+            self.assertIsInstance(source, CachingPipeline)
+            with Pipeline(open(self.gcode_filename), close_stream=True) as pipeline:
+                self.assertEqual(list(source), list(pipeline))
+
+    def test_start_line(self):
+        with self.cache.source(self.gcode_filename, split_gcodes=True) as source:
+            prepared = list(source)
+        with self.cache.source(self.gcode_filename, split_gcodes=True, start_line=2) as source:
+            self.assertIsInstance(source, CompiledJob)
+            self.assertEqual(source.line_count, 4)
+            self.assertEqual(list(source), [p for p in prepared if p.lineno >= 2])
+
+        # not cached; partially streamed jobs aren't cached either
+        with self.cache.source(self.gcode_filename, start_line=4) as source:
+            self.assertEqual(source.line_count, 4)
+            self.assertEqual([p.gcode for p in source], ['G0 X2'])
+        self.assertEqual(len(self.cache.entries()), 1)
+
+    def test_start_line_encoded(self):
+        # modal words dropped by encoding are sent when starting mid-job
+        with open(self.gcode_filename, 'w') as fh:
+            fh.write("G0 X0 Y0\nG1 X1 F300\nG1 X2 F300\nG1 X3 F300\nG0 Z5\n")
+        kwargs = {'encode_precision': 4, 'merge_tolerance': None}
+        with self.cache.source(self.gcode_filename, start_line=3, **kwargs) as source:
+            uncached = [p.data for p in source]
+        with self.cache.source(self.gcode_filename, **kwargs) as source:
+            self.assertIn(b'X2\n', [p.data for p in source])  # (cached, encoded)
+        with self.cache.source(self.gcode_filename, start_line=3, **kwargs) as source:
+            self.assertEqual([p.data for p in source], uncached)
+        self.assertEqual(uncached[0], b'G1X2F300\n')
+
+    def test_incomplete(self):
+        # nothing cached if not all lines are consumed
+        with self.cache.source(self.gcode_filename) as source:
+            source.get()
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_evict(self):
+        for i in range(3):
+            with open(self.cache.filename('job%i' % i), 'wb') as fh:
+                fh.write(b'x' * 100)
+            os.utime(self.cache.filename('job%i' % i), (time.time() - 3 + i,) * 2)
+        self.cache.max_size = 250
+        self.assertEqual(self.cache.evict(), 1)  # oldest removed
+        self.cache.max_age = 1.5
+        self.assertEqual(self.cache.evict(), 1)  # too old
+        self.assertEqual([os.path.basename(f) for (_, _, f) in self.cache.entries()], ['job2.gsjob'])
@@ -0,0 +1,75 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.journal import Journal, JournalState, resume_gcodes
+from grblstream.status import StatusReport
+
+
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'job.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_journal(self):
+        journal = Journal(self.filename, sync_interval=10)
+        journal.start(100)
+        for lineno in (1, 2, 2, 2, 5):  # line 2 split into 3 gcodes
+            journal.acknowledged(lineno)
+        journal.position(StatusReport('<Run|MPos:1.000,2.000,-0.500|FS:100,0>'))
+        self.assertEqual(journal.sync_count, 1)  # only the 'job' record (so far)
+        journal.close()
+
+        state = JournalState.read(self.filename)
+        self.assertEqual(state.line_count, 100)
+        self.assertEqual(list(state.acknowledged), [1, 2, 5])
+        self.assertEqual(state.position, ('Run', (1.0, 2.0, -0.5)))
+        self.assertFalse(state.complete)
+        self.assertEqual(state.resume_line(), 3)  # line 5 may only be partly acknowledged
+        self.assertEqual(state.resume_line(backoff=1), 2)
+        self.assertEqual(state.resume_line(backoff=2), 1)  # start_line
+
+        # resumed; then completed
+        journal = Journal(self.filename)
+        journal.start(100, start_line=2)
+        journal.acknowledged(2)
+        journal.close()
+        state = JournalState.read(self.filename)
+        self.assertEqual(list(state.acknowledged), [1, 2])
+        self.assertEqual(state.sessions, 2)
+        journal = Journal(self.filename)
+        journal.close(complete=True)
+        self.assertTrue(JournalState.read(self.filename).complete)
+
+    def test_partial_write(self):
+        with open(self.filename, 'w') as fh:
+            fh.write('job 10 1\nok 1\nok 2\nok 3\nok 4')  # last record is incomplete
+        self.assertEqual(list(JournalState.read(self.filename).acknowledged), [1, 2, 3])
+
+
+class ResumeTests(unittest.TestCase):
+    def test_resume_gcodes(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'part.gcode')
+            with open(filename, 'w') as fh:
+                fh.write("G20 G90 G55\nG0 X1 Y1\nM3 S5000\nG1 Z-0.1 F20\nG91 X1\nX1\n")
+            self.assertEqual(resume_gcodes(filename, 6, safe_z=-2, spindle_delay=1), [
+                'G21 G53 G0 Z-2.000',
+                'G20 G17 G55 G94 G90',
+                'S5000 M03',
+                'G4 P1',
+                'M09',
+                'G0 X2.0000 Y1.0000',
+                'G1 Z-0.1000 F20',
+                'G91',
+            ])
+        finally:
+            shutil.rmtree(directory)
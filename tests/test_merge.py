@@ -0,0 +1,78 @@
+import unittest
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.merge import LineMerger
+from grblstream.pipeline import Pipeline
+
+
+def merge(lines, tolerance=0.002):
+    merger = LineMerger(tolerance)
+    merged = []
+    for (i, line) in enumerate(lines, 1):
+        merged += merger.feed(i, line)
+    merged += merger.flush()
+    return (merged, merger)
+
+
+class LineMergerTests(unittest.TestCase):
+    def test_collinear(self):
+        (merged, merger) = merge([
+            'G21 G90 G1 X0 Y0 Z0 F300',
+            'X0.01 Y0.01',
+            'X0.02 Y0.0201',  # within tolerance
+            'X0.03 Y0.03',
+            'X0.03 Y0.04',  # corner
+            'X0.03 Y0.05',
+        ])
+        self.assertEqual(merged, [
+            (1, 'G21 G90 G1 X0 Y0 Z0 F300'),
+            (4, 'X0.03 Y0.03'),
+            (6, 'X0.03 Y0.05'),
+        ])
+        self.assertEqual(merger.lines_removed, 3)
+        self.assertEqual(merger.bytes_removed, len('X0.01 Y0.01\nX0.02 Y0.0201\nX0.03 Y0.04\n'))
+
+    def test_axes_added(self):
+        # last line doesn't give Y; it's only given by a dropped line
+        (merged, _) = merge(['G90 G1 X0 Y0 Z0 F300', 'X1 Y1', 'X2'], tolerance=1)
+        self.assertEqual(merged, [(1, 'G90 G1 X0 Y0 Z0 F300'), (3, 'G1 X2 Y1')])
+
+    def test_boundaries(self):
+        lines = [
+            'G90 G0 X0 Y0 Z0',
+            'G1 X1 F300',  # sets G1 (not dropped)
+            'X2',
+            'X3 (comment)',
+            'X4',
+            'M8',
+            'X5',
+            'X6 F400',  # feed rate changed
+            'X7',
+            'G91 X1',
+            'X1',
+            'X1',
+        ]
+        (merged, merger) = merge(lines, tolerance=1)
+        self.assertEqual(merger.lines_removed, 0)
+        self.assertEqual([l for (_, l) in merged], lines)
+
+    def test_unknown_position(self):
+        # position before the first move isn't known (nothing's merged into it)
+        (merged, _) = merge(['G90 G1 F300', 'X1', 'X2', 'X3'], tolerance=1)
+        self.assertEqual(merged, [(1, 'G90 G1 F300'), (2, 'X1'), (4, 'X3')])
+
+    def test_pipeline(self):
+        gcode = 'G90 G1 X0 Y0 Z0 F300\nX1\nX2\nX3\nM5\n'
+        with Pipeline(six.StringIO(gcode), merge_tolerance=0.002, chunk_size=2) as pipeline:
+            items = [(i.lineno, i.gcode) for i in pipeline]
+            self.assertEqual(items, [(1, 'G90 G1 X0 Y0 Z0 F300'), (4, 'X3'), (5, 'M5')])
+            self.assertEqual(pipeline.merger.lines_removed, 2)
+        with Pipeline(six.StringIO(gcode), merge_tolerance=0.002, start_line=2) as pipeline:
+            self.assertIsNone(pipeline.merger)  # modes before start line aren't known
+
+
+if __name__ == '__main__':
+    unittest.main()
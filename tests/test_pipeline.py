@@ -0,0 +1,38 @@
+import unittest
+import six
+
+# add relative libraries to path
+import testutils
+
+from grblstream.pipeline import Pipeline, PreparedLine, prepare_line
+
+
+class PipelineTests(unittest.TestCase):
+    def test_prepare(self):
+        self.assertEqual(prepare_line(1, 'g1 x1 (move)\n'), [
+            PreparedLine(1, 'g1 x1 (move)', True, None, b'G1X1\n'),
+        ])
+        self.assertEqual(prepare_line(2, 'G1 X1 F100 M3 S1000', split_gcodes=True), [
+            PreparedLine(2, 'G1 X1 F100 M3 S1000', False, None, None),
+            PreparedLine(2, 'F100', True, 'branch', b'F100\n'),
+            PreparedLine(2, 'S1000', True, 'branch', b'S1000\n'),
+            PreparedLine(2, 'M03', True, 'branch', b'M03\n'),
+            PreparedLine(2, 'G01 X1', True, 'last', b'G01X1\n'),
+        ])
+
+    def test_order(self):
+        gcode = ''.join('G1 X%i Y1 F100 S%i\n' % (i, i) for i in range(500))
+        for processes in (0, 2):
+            with Pipeline(six.StringIO(gcode), split_gcodes=True, processes=processes,
+                          chunk_size=16, max_chunks=2) as pipeline:
+                items = list(pipeline)
+            self.assertEqual([i.lineno for i in items if not i.send], list(range(1, 501)))
+            self.assertEqual(len(items), 500 * 4)  # line, F, S, G1
+            self.assertTrue(pipeline.finished)
+
+    def test_get(self):
+        with Pipeline(six.StringIO('G0 X1\nG0 X2\n')) as pipeline:
+            self.assertEqual(pipeline.get(timeout=1).gcode, 'G0 X1')
+            self.assertEqual(pipeline.get(timeout=1).gcode, 'G0 X2')
+            self.assertIsNone(pipeline.get(timeout=1))
+            self.assertTrue(pipeline.finished)
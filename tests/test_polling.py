@@ -0,0 +1,90 @@
+import unittest
+import os
+import pty
+import tty
+import time
+
+# add relative libraries to path
+import testutils
+
+from grblstream.engine import StreamEngine
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort, GCodeStreamer
+from grblstream.polling import StatusPoller
+
+
+class StatusPollerTests(unittest.TestCase):
+    def setUp(self):
+        (self.master, slave) = pty.openpty()
+        tty.setraw(slave)
+        self.serialport = SerialPort(os.ttyname(slave), 115200)
+        os.close(slave)
+        self.poller = StatusPoller(
+            self.serialport,
+            interval=0.25, min_interval=0.05, max_interval=1.0, boost_time=0.5,
+        )
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        os.close(self.master)
+
+    def test_interval(self):
+        self.assertEqual(self.poller.current_interval, 0.25)  # unknown state
+        self.poller.report_received('<Idle|MPos:0.000,0.000,0.000|FS:0,0>')
+        self.assertEqual(self.poller.state, 'idle')
+        self.assertEqual(self.poller.current_interval, 1.0)
+        self.poller.report_received('Hold:0')
+        self.assertEqual(self.poller.current_interval, 0.05)
+        self.poller.report_received('Run')
+        self.assertEqual(self.poller.current_interval, 0.25)
+
+        self.poller.report_received('Idle')
+        self.poller.boost()
+        self.assertEqual(self.poller.current_interval, 0.05)
+
+    def test_poll(self):
+        self.poller.report_received('Idle')
+        self.assertEqual(self.poller.poll(), 1.0)  # first poll is immediate
+        self.assertGreater(self.poller.poll(), 0.9)  # not due yet
+        self.assertEqual(os.read(self.master, 10), b'?')
+        self.assertEqual(self.poller.poll_count, 1)
+
+    def test_outstanding(self):
+        self.poller.report_received('Jog')
+        self.poller.poll()
+        self.assertEqual(os.read(self.master, 10), b'?')
+        time.sleep(0.06)
+        self.poller.poll()  # skipped; no report received
+        self.assertEqual((self.poller.poll_count, self.poller.skip_count), (1, 1))
+        self.poller.report_received('Jog')
+        self.poller.poll()
+        self.assertEqual(self.poller.poll_count, 2)
+        self.assertEqual(os.read(self.master, 10), b'?')
+
+
+class EnginePollingTests(unittest.TestCase):
+    def test_stream(self):
+        simulator = GRBLSimulator(block_time=0.01)
+        simulator.start()
+        serialport = SerialPort(simulator.device, 115200)
+        try:
+            serialport.write('\r\n\r\n')  # wake up
+            streamer = GCodeStreamer(serialport)
+            poller = StatusPoller(serialport, min_interval=0.02, max_interval=5.0)
+            engine = StreamEngine(serialport, streamer, status_poller=poller)
+            messages = []
+            engine.message_callback = messages.append
+            engine.start()
+            engine.loop.run_until(lambda: messages, timeout=1)  # banner
+            engine.stream(GCodeStreamer.Line('G1 X%i F1000' % i) for i in range(20))
+            self.assertTrue(engine.run(timeout=5))
+
+            # job's end is boosted, so idle state is seen promptly
+            start = time.time()
+            self.assertTrue(engine.loop.run_until(lambda: poller.state == 'idle', timeout=1))
+            self.assertLess(time.time() - start, 0.5)
+            self.assertGreater(simulator.stats['status_reports'], 0)
+            engine.stop()
+        finally:
+            serialport.serial.close()
+            simulator.stop()
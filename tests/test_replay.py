@@ -0,0 +1,98 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.replay import SessionReplay, ReplayDevice, Response
+from grblstream.replay import load_session
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort, GCodeStreamer
+
+GCODE = ['G21', 'G1 X1 F100', 'G0 X2', 'M6', 'G0 X3']  # M6: error
+
+
+def stream(device, logfilename=None):
+    """:return: responses to GCODE (str)"""
+    serialport = SerialPort(device, 115200, logfilename=logfilename)
+    try:
+        serialport.write('\r\n\r\n')
+        list(serialport.readlines(timeout=0.2))  # banner
+        streamer = GCodeStreamer(serialport)
+        lines = [GCodeStreamer.Line(g) for g in GCODE]
+        for line in lines:
+            streamer.send(line)
+        responses = []
+        end_time = time.time() + 5
+        while (not streamer.finished) and (time.time() < end_time):
+            serialport.realtime('status')  # (varies with timing; not replayed by count)
+            for response in serialport.readlines(timeout=0.01):
+                if not response.startswith('<'):
+                    responses.append(response)
+                    try:
+                        streamer.process_response(response)
+                    except Exception:
+                        pass  # error:N
+        return responses
+    finally:
+        serialport.serial.close()
+        if serialport.log:
+            serialport.log.close()
+
+
+class SessionReplayTests(unittest.TestCase):
+    def test_timing(self):
+        replay = SessionReplay([
+            Response(0, 0.0, b'\r\nGrbl 1.1f\r\n'),
+            Response(4, 0.5, b'ok\r\n'),
+            Response(8, 0.1, b'ok\r\n'),
+        ], expected=b'G0X1G0X2', speed=2.0)
+        replay.start(now=100.0)
+        self.assertEqual(replay.due(now=100.0), b'\r\nGrbl 1.1f\r\n')
+        self.assertIsNone(replay.next_time())  # waiting for the host
+        replay.receive(b'G0X1?', now=101.0)  # ('?' isn't counted)
+        self.assertEqual(replay.next_time(), 101.25)
+        self.assertEqual(replay.due(now=101.2), b'')
+        replay.receive(b'G0X3', now=101.0)
+        self.assertEqual(replay.due(now=101.3), b'ok\r\nok\r\n')  # second is overdue
+        self.assertTrue(replay.finished)
+        self.assertEqual(replay.diverged_at, 7)
+
+    def test_text_log(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tempdir, 'session.log')
+            with open(filename, 'w') as fh:
+                fh.write("[100.00] >> \\r\\n\\r\\n\n")
+                fh.write("[100.10] << \\r\\nGrbl 1.1f ['$' for help]\\r\\n\n")
+                fh.write("[101.00] >> G0 X1\\n?\n")
+                fh.write("[101.50] << ok\\r\\n<Idle|MPos:1.000,0.000,0.000>\\r\\n\n")
+            (responses, expected) = load_session(filename)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(expected, b'\r\n\r\nG0 X1\n')
+        self.assertEqual([r.trigger for r in responses], [4, 10])
+        self.assertAlmostEqual(responses[1].delay, 0.5)
+
+
+class ReplayDeviceTests(unittest.TestCase):
+    def test_replay(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tempdir, 'session.log')
+            with GRBLSimulator(block_time=0.002) as simulator:
+                recorded = stream(simulator.device, logfilename=filename)
+            with ReplayDevice(filename, speed=0) as device:
+                replayed = stream(device.device)
+                self.assertIsNone(device.replay.diverged_at)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(recorded, ['ok', 'ok', 'ok', 'error:20', 'ok'])
+        self.assertEqual(replayed, recorded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import pty
+import tty
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream.seriallog import SerialLogger, read_log, format_record
+from grblstream.seriallog import SENT, RECEIVED
+from grblstream.streamer import SerialPort
+
+
+class SerialLoggerTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'serial.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_records(self):
+        log = SerialLogger(self.filename)
+        log.log(SENT, b'G1 X10 F100\n')
+        log.log(RECEIVED, b'ok\r\n')
+        log.log(SENT, b'?')
+        log.close()
+
+        records = list(read_log(self.filename))
+        self.assertEqual([(d, data) for (_, d, data) in records], [
+            (SENT, b'G1 X10 F100\n'), (RECEIVED, b'ok\r\n'), (SENT, b'?'),
+        ])
+        self.assertTrue(log.start_time <= records[0][0] <= records[-1][0])
+        text = format_record(records[1])
+        self.assertTrue(text.startswith('['))
+        self.assertTrue(text.endswith('] << ok\\r\\n'))
+        self.assertEqual(log.record_count, 3)
+
+    def test_rotate(self):
+        log = SerialLogger(self.filename, max_size=100, backup_count=2, compress=True)
+        for i in range(50):
+            log.log(SENT, ('G1 X%i\n' % i).encode('ascii'))
+        log.close()
+        self.assertTrue(os.path.exists(self.filename + '.1.gz'))
+        self.assertFalse(os.path.exists(self.filename + '.3.gz'))
+        # rotated logs are decoded (compressed, or not)
+        decoded = list(read_log(self.filename + '.1.gz')) + list(read_log(self.filename))
+        self.assertTrue(all(d == SENT for (_, d, _) in decoded))
+
+    def test_serialport(self):
+        (master, slave) = pty.openpty()
+        tty.setraw(slave)
+        serialport = SerialPort(os.ttyname(slave), 115200, logfilename=self.filename)
+        os.close(slave)
+        try:
+            serialport.write('G0 X1\n')
+            os.write(master, b'ok\r\n')
+            self.assertEqual(list(serialport.readlines(timeout=0.05)), ['ok'])
+        finally:
+            serialport.serial.close()
+            serialport.log.close()
+            os.close(master)
+        self.assertEqual([data for (_, _, data) in read_log(self.filename)], [b'G0 X1\n', b'ok\r\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
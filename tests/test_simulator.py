@@ -0,0 +1,124 @@
+import unittest
+import time
+
+# add relative libraries to path
+import testutils
+
+from grblstream.simulator import GRBLSimulator
+from grblstream.streamer import SerialPort
+from grblstream.streamer import GCodeStreamer, GCodeStreamException
+
+
+class SimulatorTestCase(unittest.TestCase):
+    simulator_kwargs = {}
+
+    def setUp(self):
+        self.simulator = GRBLSimulator(**self.simulator_kwargs)
+        self.simulator.start()
+        self.serialport = SerialPort(self.simulator.device, 115200)
+        self.serialport.write('\r\n\r\n')  # wake up
+        self.assertIn("Grbl 1.1f ['$' for help]", self.readlines(until='Grbl'))
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        self.simulator.stop()
+
+    def readlines(self, timeout=0.2, until='ok'):
+        lines = []
+        for line in self.serialport.readlines(timeout=timeout):
+            if line:
+                lines.append(line)
+            if until and line.startswith(until):
+                break
+        return lines
+
+    def query(self, data):
+        self.serialport.write(data)
+        return self.readlines()
+
+
+class SimulatorTests(SimulatorTestCase):
+    def test_system_commands(self):
+        self.assertEqual(self.query('$I\n'), ['[VER:1.1f.20170801:]', '[OPT:V,15,128]', 'ok'])
+        self.assertEqual(self.query('$G\n'), ['[GC:G0 G54 G17 G21 G90 G94 M5 M9 T0 F0 S0]', 'ok'])
+        settings = self.query('$$\n')
+        self.assertIn('$110=500.000', settings)
+        self.assertEqual(settings[-1], 'ok')
+        self.assertEqual(self.query('$110=1000\n'), ['ok'])
+        self.assertIn('$110=1000.000', self.query('$$\n'))
+        self.assertEqual(self.query('$Y\n'), ['error:3'])
+
+    def test_status(self):
+        self.serialport.write('?')
+        self.assertEqual(self.readlines(until='<'), ['<Idle|MPos:0.000,0.000,0.000|FS:0,0|WCO:0.000,0.000,0.000>'])
+        self.assertEqual(self.query('G0 X10 Y-2.5\n'), ['ok'])
+        time.sleep(0.05)
+        self.serialport.write('?')
+        self.assertEqual(self.readlines(until='<'), ['<Idle|MPos:10.000,-2.500,0.000|FS:0,0|Ov:100,100,100>'])
+
+    def test_errors(self):
+        self.assertEqual(self.query('X\n'), ['error:2'])
+        self.assertEqual(self.query('10\n'), ['error:1'])
+        self.assertEqual(self.query('G1 X10\n'), ['error:22'])  # no feed rate
+        self.assertEqual(self.query('M6\n'), ['error:20'])
+        self.assertEqual(self.query('G0 G1 X1\n'), ['error:21'])
+        self.assertEqual(self.query('G0 X1 X2\n'), ['error:25'])
+        self.assertEqual(self.query('G0 X%s\n' % ('1' * 80)), ['error:11'])
+        self.assertEqual(self.simulator.stats['errors'], 7)
+
+
+class SimulatorBufferTests(SimulatorTestCase):
+    simulator_kwargs = {'planner_size': 2, 'block_time': 0.2, 'settings': {10: 3}}
+
+    def test_planner(self):
+        for i in range(4):
+            self.serialport.write('G1 X%i F100\n' % (i + 1))
+        self.assertEqual(self.readlines(timeout=0.05, until=None), ['ok', 'ok'])  # planner full
+        self.serialport.write('?')
+        self.assertEqual(self.readlines(until='<'), ['<Run|MPos:0.000,0.000,0.000|Bf:0,117|FS:100,0|WCO:0.000,0.000,0.000>'])
+
+        # hold & resume
+        self.serialport.write('!')
+        time.sleep(0.3)
+        self.assertEqual(self.simulator.state, 'Hold:0')
+        self.assertEqual(self.simulator.stats['blocks'], 0)
+        self.serialport.write('~')
+        self.assertEqual(self.readlines(timeout=0.5, until=None), ['ok', 'ok'])
+
+    def test_rx_overflow(self):
+        self.simulator.hold = True  # nothing will leave the planner
+        for i in range(20):
+            self.serialport.write('G1 X%i F100\n' % (i + 1))  # 11 or 12 bytes each
+        end_time = time.time() + 1
+        while (not self.simulator.stats['rx_overflow']) and (time.time() < end_time):
+            time.sleep(0.01)
+        self.assertGreater(self.simulator.stats['rx_overflow'], 0)
+        self.assertLessEqual(self.simulator.rx_free, 12)  # no room for many more lines
+
+
+class StreamToSimulatorTests(SimulatorTestCase):
+    simulator_kwargs = {'block_time': 0.001}
+
+    def test_stream(self):
+        streamer = GCodeStreamer(self.serialport)
+        gcodes = ['G1 X%i Y%i F500 (move %i)' % (i, i % 7, i) for i in range(200)]
+        gcodes_iter = iter(gcodes)
+        while True:
+            gcode = next(gcodes_iter, None)
+            if gcode is not None:
+                streamer.send(GCodeStreamer.Line(gcode))
+            for line in self.serialport.readlines(timeout=0.01):
+                streamer.process_response(line)
+            if gcode is None and streamer.finished:
+                break
+        self.assertEqual(self.simulator.stats['lines'], 200)
+        self.assertEqual(self.simulator.stats['rx_overflow'], 0)
+
+    def test_stream_error(self):
+        streamer = GCodeStreamer(self.serialport)
+        streamer.send(GCodeStreamer.Line('G1 X1 F100'))
+        streamer.send(GCodeStreamer.Line('M6 T1'))
+        responses = self.readlines(until='error')
+        streamer.process_response(responses[0])
+        with self.assertRaises(GCodeStreamException):
+            streamer.process_response(responses[1])
@@ -0,0 +1,72 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+
+# add relative libraries to path
+import testutils
+
+from grblstream import source
+from grblstream.source import FileSource, Progress, index_lines
+from grblstream.pipeline import Pipeline
+
+
+class FileSourceTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def source(self, content):
+        filename = os.path.join(self.directory, 'part.gcode')
+        with open(filename, 'wb') as fh:
+            fh.write(content)
+        return FileSource(filename)
+
+    def test_index(self):
+        with self.source(b'G21\nG1 X1 F100\n\nG0 X2\n') as src:
+            self.assertEqual(src.line_count, 4)
+            self.assertEqual([src.offset(i) for i in range(1, 6)], [0, 4, 15, 16, 22])
+            self.assertEqual(src.line(2), 'G1 X1 F100\n')
+        with self.source(b'G21\nG0 X2') as src:  # no trailing newline
+            self.assertEqual(src.line_count, 2)
+            self.assertEqual(src.line(2), 'G0 X2')
+        with self.source(b'') as src:
+            self.assertEqual(src.line_count, 0)
+            self.assertEqual(src.readline(), '')
+
+    def test_index_without_numpy(self):
+        data = b'G21\n\nG1 X1\nG0 X2'
+        numpy = source.numpy
+        try:
+            source.numpy = None
+            self.assertEqual(list(index_lines(data)), [0, 4, 5, 11, 16])
+        finally:
+            source.numpy = numpy
+        self.assertEqual(list(index_lines(data)), [0, 4, 5, 11, 16])
+
+    def test_seek(self):
+        content = b''.join(b'G0 X%i\n' % i for i in range(1, 101))
+        with self.source(content) as src:
+            src.seek(90)
+            self.assertEqual(src.readline(), 'G0 X90\n')
+            self.assertEqual(src.tell(), 91)
+            with Pipeline(src, start_line=src.tell()) as pipeline:
+                items = list(pipeline)
+            self.assertEqual([i.lineno for i in items], list(range(91, 101)))
+            self.assertEqual(items[0].gcode, 'G0 X91')
+            self.assertRaises(IndexError, src.seek, 102)
+
+
+class ProgressTests(unittest.TestCase):
+    def test_progress(self):
+        progress = Progress(100, start_line=51)
+        self.assertIsNone(progress.eta)
+        self.assertEqual(str(progress), '50.0% ETA ?')
+        progress.update(51)
+        progress.start_time -= 10  # 1st line took 10 seconds
+        progress.update(60)
+        self.assertEqual(progress.fraction, 0.6)
+        self.assertAlmostEqual(progress.eta, 40, places=1)  # 10 lines in 10 sec
@@ -0,0 +1,43 @@
+import unittest
+
+# add relative libraries to path
+import testutils
+
+from grblstream.status import StatusReport
+
+
+class StatusReportTests(unittest.TestCase):
+    def test_parse(self):
+        report = StatusReport('<Hold:0|MPos:1.000,2.000,3.000|Bf:15,128|Ln:99|FS:500,8000|WCO:1.000,0.000,-1.000|Ov:100,50,120|A:SF|Pn:XP>')
+        self.assertEqual((report.state, report.substate, report.state_text), ('Hold', 0, 'Hold:0'))
+        self.assertEqual(report.mpos, (1.0, 2.0, 3.0))
+        self.assertEqual(report.wpos, (0.0, 2.0, 4.0))  # derived from WCO
+        self.assertEqual(report.wco, (1.0, 0.0, -1.0))
+        self.assertEqual((report.feed_rate, report.spindle_speed), (500.0, 8000.0))
+        self.assertEqual((report.planner_free, report.rx_free), (15, 128))
+        self.assertEqual(report.line_number, 99)
+        self.assertEqual(report.overrides, (100, 50, 120))
+        self.assertEqual((report.accessories, report.pins), ('SF', 'XP'))
+
+    def test_changes(self):
+        report = StatusReport()
+        changed = report.update('<Idle|WPos:1.000,2.000,3.000|F:100|WCO:0.000,0.000,1.000>')
+        self.assertEqual(changed, set(['state', 'wpos', 'mpos', 'feed_rate', 'wco']))
+        self.assertEqual(report.mpos, (1.0, 2.0, 4.0))
+
+        # nothing changed (WCO retained)
+        self.assertEqual(report.update('<Idle|WPos:1.000,2.000,3.000|F:100>'), set())
+
+        changed = report.update('<Run|WPos:1.500,2.000,3.000|F:100|Pn:Z>')
+        self.assertEqual(changed, set(['state', 'wpos', 'mpos', 'pins']))
+        self.assertEqual(report.update('<Run|WPos:1.500,2.000,3.000|F:100>'), set(['pins']))
+
+        # accessories cleared when overrides are reported without them
+        report.update('<Run|WPos:1.500,2.000,3.000|F:100|Ov:100,100,100|A:F>')
+        self.assertEqual(report.accessories, 'F')
+        self.assertEqual(report.update('<Run|WPos:1.500,2.000,3.000|F:100>'), set())
+        self.assertEqual(report.update('<Run|WPos:1.500,2.000,3.000|F:100|Ov:100,100,100>'), set(['accessories']))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            StatusReport().update('[MSG:not a report]')
@@ -1,11 +1,144 @@
 import unittest
+import os
+import pty
+import tty
+import time
+import threading
 
 # add relative libraries to path
 import testutils
 
 import pygcode
 import grblstream
+from grblstream.streamer import SerialPort
+from grblstream.streamer import GCodeStreamer, GCodeStreamException
+from grblstream.widget import ConsoleLine, GCodeContent
+
+
+class SerialPortTests(unittest.TestCase):
+    def setUp(self):
+        (self.master, slave) = pty.openpty()
+        tty.setraw(slave)
+        self.serialport = SerialPort(os.ttyname(slave), 115200)
+        os.close(slave)
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        os.close(self.master)
+
+    def test_readlines(self):
+        os.write(self.master, b'Grbl 1.1f\r\nok\r\nerror:20\r\n<Idle|MPos')
+        lines = list(self.serialport.readlines(timeout=0.05))
+        self.assertEqual(lines, ['Grbl 1.1f', 'ok', 'error:20'])
+
+        # partial line is completed by subsequent data
+        os.write(self.master, b':0.000,0.000,0.000>\n')
+        lines = list(self.serialport.readlines(timeout=0.05))
+        self.assertEqual(lines, ['<Idle|MPos:0.000,0.000,0.000>'])
+
+    def test_readlines_timeout(self):
+        start = time.time()
+        self.assertEqual(list(self.serialport.readlines(timeout=0.05)), [])
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_readlines_deadline(self):
+        # data arriving just before the timeout doesn't extend it
+        timer = threading.Timer(0.15, os.write, (self.master, b'<Idle'))
+        timer.start()
+        start = time.time()
+        self.assertEqual(list(self.serialport.readlines(timeout=0.2)), [])
+        self.assertLess(time.time() - start, 0.3)
+        timer.join()
+
+    def test_readlines_resume(self):
+        # lines not consumed are yielded by the next call
+        os.write(self.master, b'ok\r\nok\r\n[GC:G0 G54]\r\n')
+        time.sleep(0.01)
+        for line in self.serialport.readlines(timeout=0.05):
+            break
+        self.assertEqual(line, 'ok')
+        lines = list(self.serialport.readlines(timeout=0.05))
+        self.assertEqual(lines, ['ok', '[GC:G0 G54]'])
+
+    def test_realtime(self):
+        self.serialport.realtime('hold')
+        self.serialport.realtime('~')
+        self.serialport.realtime('feed_override_plus_10')
+        time.sleep(0.01)  # all written
+        self.assertEqual(os.read(self.master, 100), b'!~\x91')
+        with self.assertRaises(ValueError):
+            self.serialport.realtime('G0 X1\n')  # not a real-time command
+
 
 class StreamerTests(unittest.TestCase):
-    def test_stuff(self):
-        pass  # I'm getting there
+    def setUp(self):
+        (self.master, slave) = pty.openpty()
+        tty.setraw(slave)
+        self.serialport = SerialPort(os.ttyname(slave), 115200)
+        os.close(slave)
+        self.streamer = GCodeStreamer(self.serialport, max_buffer=20)
+
+    def tearDown(self):
+        self.serialport.serial.close()
+        os.close(self.master)
+
+    def test_line(self):
+        line = GCodeStreamer.Line('g1 x1 (comment) y2 ; more')
+        self.assertEqual(str(line), 'G1X1Y2\n')
+        self.assertEqual(len(line), 7)
+        self.assertTrue(line)
+        self.assertFalse(GCodeStreamer.Line('  (just a comment)'))
+
+    def test_used_buffer(self):
+        for gcode in ['G0 X1', 'G0 X2', 'G0 X3', 'G0 X4', 'G0 X5']:  # 5 bytes each
+            self.streamer.send(GCodeStreamer.Line(gcode))
+        self.assertEqual(self.streamer.used_buffer, 20)  # buffer full
+        self.assertEqual(self.streamer.pending_count, 1)
+
+        self.streamer.process_response('ok')  # sends next line
+        self.assertEqual(self.streamer.used_buffer, 20)
+        self.assertEqual(self.streamer.pending_count, 0)
+        for i in range(4):
+            self.streamer.process_response('ok')
+        self.assertEqual(self.streamer.used_buffer, 0)
+        self.assertTrue(self.streamer.finished)
+        self.assertEqual(os.read(self.master, 100), b'G0X1\nG0X2\nG0X3\nG0X4\nG0X5\n')
+
+    def test_realtime_not_buffered(self):
+        for gcode in ['G0 X1', 'G0 X2', 'G0 X3', 'G0 X4', 'G0 X5']:
+            self.streamer.send(GCodeStreamer.Line(gcode))
+        self.serialport.realtime('status')  # sent, though buffer is full
+        self.assertEqual(self.streamer.used_buffer, 20)
+        self.assertEqual(self.streamer.pending_count, 1)
+        self.assertEqual(os.read(self.master, 100), b'G0X1\nG0X2\nG0X3\nG0X4\n?')
+
+    def test_release_widget(self):
+        widget = ConsoleLine(None, GCodeContent('G0 X1'))
+        line = GCodeStreamer.Line('G0 X1', widget)
+        self.streamer.send(line)
+        self.assertEqual(widget.content.sent, True)
+        self.streamer.process_response('ok')
+        self.assertEqual(widget.content.status, 'ok')
+        self.assertIsNone(line.widget)  # no longer referenced by line
+
+    def test_error_response(self):
+        self.streamer.send(GCodeStreamer.Line('G4 P1'))
+        with self.assertRaises(GCodeStreamException):
+            self.streamer.process_response('error:20')
+        self.assertEqual(self.streamer.used_buffer, 0)
+
+    def test_fill_buffer(self):
+        streamer = GCodeStreamer(self.serialport, max_buffer=20, fill_buffer=True)
+        for gcode in ['G0 X1', 'G0 X2', 'G0 X3', 'G0 X4', 'G0 X5', 'G0 X6']:  # 5 bytes each
+            streamer.send(GCodeStreamer.Line(gcode), poll=False)
+        streamer.poll_transmission()
+        self.assertEqual(streamer.used_buffer, 20)
+        self.assertEqual(streamer.write_count, 1)
+        self.assertEqual(os.read(self.master, 100), b'G0X1\nG0X2\nG0X3\nG0X4\n')
+
+        streamer.process_response('ok')
+        streamer.process_response('ok')  # nothing left to send
+        self.assertEqual(streamer.pending_count, 0)
+        self.assertEqual(streamer.write_count, 3)
+        self.assertEqual(dict(streamer.lines_per_write), {4: 1, 1: 2})
+        self.assertEqual(streamer.mean_lines_per_write, 2.0)
@@ -0,0 +1,90 @@
+import unittest
+import time
+
+# add relative libraries to path
+import testutils
+
+from grblstream import window as window_module
+from grblstream.window import AccordionWindow, AccordionWindowManager
+
+
+class AccordionWindowTests(unittest.TestCase):
+    def test_scrollback(self):
+        window = AccordionWindow(screen=None, title='Stream', scrollback=3)
+        for i in range(10):
+            window._add_line('line %i' % i)
+        self.assertEqual(list(window.lines), ['line 7', 'line 8', 'line 9'])
+
+
+class _Screen(object):
+    def __init__(self, rows=30):
+        self.rows = rows
+
+    def getmaxyx(self):
+        return (self.rows, 80)
+
+
+class _Window(object):
+    # stands in for an AccordionWindow (records what's drawn)
+    min_height = 3
+    soft_height = 3
+    add_line_callback = None
+
+    def __init__(self):
+        self.lines = []
+        self.rendered = 0
+        self.moves = []
+
+    def init_window(self, row, height):
+        pass
+
+    def refresh(self):
+        pass
+
+    def render(self, active=False):
+        self.rendered += 1
+
+    def move_window(self, row, height):
+        self.moves.append((row, height))
+
+
+class AccordionWindowManagerTests(unittest.TestCase):
+    def setUp(self):
+        self._doupdate = window_module.curses.doupdate
+        window_module.curses.doupdate = lambda: None  # (no terminal)
+        self.windows = [_Window(), _Window()]
+        self.manager = AccordionWindowManager(
+            _Screen(), self.windows, header_height=2, max_frame_rate=10,
+        )
+        self.assertTrue(self.manager.draw(force=True))  # initial layout
+        for w in self.windows:
+            (w.rendered, w.moves) = (0, [])
+
+    def tearDown(self):
+        window_module.curses.doupdate = self._doupdate
+
+    def test_frame_rate(self):
+        self.manager.mark_dirty(self.windows[0])
+        self.assertFalse(self.manager.draw())  # within frame_period
+        self.assertEqual(self.windows[0].rendered, 0)
+        self.assertEqual(self.manager._dirty, set([0]))  # still dirty
+        # forced
+        self.assertTrue(self.manager.draw(force=True))
+        self.assertEqual(self.windows[0].rendered, 1)
+        self.assertEqual(self.manager._dirty, set())
+
+    def test_dirty_only(self):
+        time.sleep(self.manager.frame_period)
+        self.manager.mark_dirty(self.windows[1])
+        self.assertTrue(self.manager.draw())
+        self.assertEqual([w.rendered for w in self.windows], [0, 1])
+        self.assertEqual([w.moves for w in self.windows], [[], []])  # no layout
+
+    def test_layout(self):
+        # focussed window grows to fit its lines
+        self.windows[0].lines.extend(['line'] * 5)
+        self.manager.mark_dirty(self.windows[0])
+        self.assertTrue(self.manager.draw(force=True))
+        self.assertEqual(self.windows[0].moves, [(2, 6)])
+        self.assertEqual(self.windows[1].moves, [(8, 3)])
+        self.assertEqual([w.rendered for w in self.windows], [1, 1])  # (all rendered)